@@ -0,0 +1,172 @@
+"""Send a JSONL file of questions to `/questions/batch` and save the answers.
+
+Each input line is a JSON object with `question` and `document_ids`, and
+optionally `id`, `llm_provider`, `model` and `retrieval_mode`. Answers are
+written as JSONL in input order as the API streams them back, followed by a
+summary on stderr.
+
+Usage (from the api/ directory, with the API running):
+    python batch_questions.py questions.jsonl -o answers.jsonl
+    python batch_questions.py questions.jsonl --model gpt-4.1 --document-ids a,b
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+def load_questions(path: str, document_ids: Optional[List[str]]) -> bytes:
+    """Read the input JSONL, filling in `document_ids` where a line has none."""
+    lines = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            if document_ids:
+                try:
+                    fields = json.loads(line)
+                except ValueError:
+                    fields = None  # sent as is; the API reports the bad line
+                if isinstance(fields, dict):
+                    fields.setdefault("document_ids", document_ids)
+                    line = json.dumps(fields, ensure_ascii=False)
+            lines.append(line.rstrip("\n"))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> str:
+    failed = sum(1 for result in results if "error" in result)
+    cached = sum(
+        1
+        for result in results
+        if ((result.get("metadata") or {}).get("answer_cache") or {}).get("hit")
+    )
+    totals = sorted(
+        result["timing"]["total_ms"] for result in results if "timing" in result
+    )
+    latency = ""
+    if totals:
+        latency = (
+            f", per question p50 {statistics.median(totals):.0f} ms, "
+            f"p95 {totals[int(0.95 * (len(totals) - 1))]:.0f} ms"
+        )
+    return (
+        f"{len(results)} questions in {elapsed:.1f} s "
+        f"({len(results) / elapsed if elapsed else 0:.1f}/s): "
+        f"{len(results) - failed} answered ({cached} from cache), {failed} failed"
+        f"{latency}"
+    )
+
+
+async def stream_answers(
+    url: str,
+    params: Dict[str, str],
+    body: bytes,
+    out,
+    results: List[Dict[str, Any]],
+) -> bool:
+    """POST the batch and write each answer line as it arrives.
+
+    Answers are appended to `results` as they come, so a caller that cancels
+    this coroutine keeps the ones already received.
+
+    Returns:
+        False if the API rejected the batch
+    """
+    async with httpx.AsyncClient(timeout=httpx.Timeout(None, connect=10)) as client:
+        async with client.stream(
+            "POST",
+            f"{url.rstrip('/')}/questions/batch",
+            params=params,
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                print(
+                    f"Batch rejected ({response.status_code}): {response.text}",
+                    file=sys.stderr,
+                )
+                return False
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                out.write(line + "\n")
+                out.flush()
+                results.append(json.loads(line))
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("-o", "--output", help="answers JSONL (default: stdout)")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--llm-provider", help="default provider for lines without one")
+    parser.add_argument("--model", help="default model for lines without one")
+    parser.add_argument(
+        "--retrieval-mode", choices=["auto", "dense", "lexical", "hybrid"]
+    )
+    parser.add_argument(
+        "--document-ids", help="comma-separated documents for lines without any"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=3600,
+        help="seconds for the whole batch; answers received by then are kept",
+    )
+    args = parser.parse_args()
+
+    document_ids = (
+        [d.strip() for d in args.document_ids.split(",") if d.strip()]
+        if args.document_ids
+        else None
+    )
+    body = load_questions(args.input, document_ids)
+    params = {
+        name: value
+        for name, value in (
+            ("llm_provider", args.llm_provider),
+            ("model", args.model),
+            ("retrieval_mode", args.retrieval_mode),
+        )
+        if value
+    }
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        # A total deadline: httpx timeouts only bound each connect or read
+        accepted = asyncio.run(
+            asyncio.wait_for(
+                stream_answers(args.url, params, body, out, results), args.timeout
+            )
+        )
+        if not accepted:
+            return 1
+    except asyncio.TimeoutError:
+        timed_out = True
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(summarize(results, time.perf_counter() - started), file=sys.stderr)
+    if timed_out:
+        print(
+            f"Timed out after {args.timeout:g} s with {len(results)} answers",
+            file=sys.stderr,
+        )
+        return 3
+    return 0 if all("error" not in result for result in results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
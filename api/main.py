@@ -1,8 +1,12 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from routes.main import api as api_router
+from routes.main import warm_up_llm_clients
+from services.metrics import ServerTimingMiddleware
 
 # Configure root logger
 logging.basicConfig(
@@ -11,12 +15,24 @@ logging.basicConfig(
 )
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In the background, so startup does not wait on the provider
+    warm_up = asyncio.create_task(warm_up_llm_clients())
+    yield
+    warm_up.cancel()
+
+
 app = FastAPI(
     title="RAG System",
     version="0.0.1",
     description="Developed by Leticia",
+    lifespan=lifespan,
 )
 
+# Server-Timing header with per-stage durations on every response
+app.add_middleware(ServerTimingMiddleware)
+
 
 app.include_router(api_router)
 
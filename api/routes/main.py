@@ -1,15 +1,77 @@
-from typing import List, Optional
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Set, Tuple, Union
 
-from fastapi import APIRouter, File, UploadFile
-from pydantic import BaseModel
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from services.answer_cache import AnswerCache
+from services.context_packing import ContextPacker
 from services.embeddings import EmbeddingsService
-from services.llm import LLMService
+from services.hedging import HedgePolicy
+from services.ingestion_jobs import IngestionJobs
+from services.llm_registry import LLMRegistry
+from services.metrics import metrics, stage_timer
 
 api = APIRouter()
 
 # Initialize services
 embeddings_service = EmbeddingsService()
-llm_service = None  # Will be initialized based on user choice
+# One pooled client per (provider, model), shared by all requests
+llm_registry = LLMRegistry.from_env()
+
+# Merges overlapping chunks and fits the prompt context into a token budget
+context_packer = ContextPacker.from_env()
+
+# Semantic cache of generated answers, scoped by provider/model/document versions
+answer_cache = AnswerCache.from_env()
+
+# Backup model raced against slow answers (opt-in, see LLM_HEDGE*)
+hedge_policy = HedgePolicy.from_env()
+
+
+def ingest_document(path: str, filename: str, progress) -> dict:
+    """Ingest one spooled file, then drop cached answers that referenced its old version."""
+    try:
+        result = embeddings_service.process_pdf(path, filename, progress)
+    finally:
+        os.remove(path)
+    if not result.get("skipped") and result.get("document_id"):
+        answer_cache.invalidate_documents([result["document_id"]])
+    return result
+
+
+# Uploads are copied here and ingested from disk, never held in memory whole
+UPLOAD_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", tempfile.gettempdir())
+
+
+async def spool_upload(file: UploadFile) -> str:
+    """Copy an upload to a temporary file in blocks and return its path."""
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="upload-", dir=UPLOAD_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, fh, 1 << 20)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+# Uploads are ingested in the background by a bounded worker pool so they cannot
+# starve the request threads serving /question. Job records are shared through
+# files so any worker process can answer GET /jobs/{job_id}
+ingestion_jobs = IngestionJobs(
+    ingest_document,
+    max_workers=int(os.getenv("INGEST_MAX_CONCURRENCY", "1")),
+    state_dir=os.getenv(
+        "INGEST_JOBS_DIR", os.path.join(embeddings_service.index_path, "jobs")
+    ),
+)
 
 
 class QuestionRequest(BaseModel):
@@ -17,6 +79,11 @@ class QuestionRequest(BaseModel):
     llm_provider: str = "openai"
     model: Optional[str] = None
     document_ids: List[str]
+    stream: bool = False
+    # Defaults to RETRIEVAL_MODE (dense unless configured)
+    retrieval_mode: Optional[Literal["auto", "dense", "lexical", "hybrid"]] = None
+    # Defaults to LLM_HEDGE; needs LLM_HEDGE_BACKUP, ignored for streamed answers
+    hedge: Optional[bool] = None
 
 
 class Model_Options:
@@ -24,29 +91,78 @@ class Model_Options:
     GEMINI = ["gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-pro"]
 
 
+async def warm_up_llm_clients() -> None:
+    """Create the clients (and a pooled OpenAI connection) before the first question.
+
+    Called from the app's startup on the serving event loop when LLM_WARMUP is set.
+    """
+    if os.getenv("LLM_WARMUP", "false").lower() not in ("1", "true", "yes"):
+        return
+    warm_models = [("openai", model) for model in Model_Options.OPENAI]
+    if os.getenv("GOOGLE_API_KEY"):
+        warm_models += [("gemini", model) for model in Model_Options.GEMINI]
+    await llm_registry.warm_up(warm_models)
+
+
 @api.get("/models")
 def get_models() -> dict:
     return {"openai": Model_Options.OPENAI, "gemini": Model_Options.GEMINI}
 
 
 @api.post("/documents")
-def generate_embeddings(files: List[UploadFile] = File(...)) -> dict:
-    """Upload one or more PDF documents and generate embeddings for each.
+async def generate_embeddings(
+    files: List[UploadFile] = File(...), wait: bool = False
+) -> dict:
+    """Upload one or more PDF documents and queue embedding generation for each.
 
-    Each file is processed into its own FAISS index folder under `vector_store/<filename-stem>`.
-    If an index for a given filename already exists, it is skipped.
+    Each file becomes a background ingestion job that indexes it under its
+    filename stem. Unchanged re-uploads are skipped and revised files only
+    re-index their changed pages. Poll `GET /jobs/{job_id}` for per-file
+    progress, or pass `wait=true` to block until every file is processed and get the
+    processing summary back.
     """
+    jobs = [
+        ingestion_jobs.submit(await spool_upload(file), file.filename) for file in files
+    ]
+
+    if not wait:
+        return {
+            "message": "Documents queued",
+            "total": len(jobs),
+            "jobs": [
+                {
+                    "job_id": job["job_id"],
+                    "filename": job["filename"],
+                    "status": job["status"],
+                    "status_url": f"/jobs/{job['job_id']}",
+                }
+                for job in jobs
+            ],
+        }
+
+    finished = [await ingestion_jobs.wait_async(job["job_id"]) for job in jobs]
+    return summarize_ingestion(finished)
+
+
+def summarize_ingestion(jobs: List[dict]) -> dict:
+    """Aggregate finished ingestion jobs into the /documents processing summary."""
     results: List[dict] = []
     processed_count = 0
     skipped_count = 0
+    failed_count = 0
     total_chunks = 0
+    cache_hits = 0
+    cache_misses = 0
 
-    for file in files:
-        content = file.file.read()
-        res = embeddings_service.process_pdf(content, file.filename)
+    for job in jobs:
+        if job["status"] == "failed":
+            failed_count += 1
+            results.append({"filename": job["filename"], "error": job["error"]})
+            continue
+        res = job["result"] or {}
         results.append(
             {
-                "filename": file.filename,
+                "filename": job["filename"],
                 **res,
             }
         )
@@ -55,37 +171,549 @@ def generate_embeddings(files: List[UploadFile] = File(...)) -> dict:
         else:
             processed_count += 1
             total_chunks += res.get("total_chunks", 0)
+            cache_hits += res.get("embedding_cache", {}).get("hits", 0)
+            cache_misses += res.get("embedding_cache", {}).get("misses", 0)
 
     return {
         "message": "Documents processed",
         "processed": processed_count,
         "skipped": skipped_count,
+        "failed": failed_count,
         "total": len(results),
         "total_chunks": total_chunks,
+        "embedding_cache": {"hits": cache_hits, "misses": cache_misses},
         "results": results,
     }
 
 
-@api.post("/question")
-def prompt_llm_rag(request: QuestionRequest) -> dict:
-    """Generates the answer for the question using RAG"""
-    global llm_service
+@api.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """Per-stage latency histograms and counters in Prometheus text format."""
+    components = {
+        "answer_cache": answer_cache.stats(),
+        "index_cache": embeddings_service.store.cache_stats(),
+        "document_router": embeddings_service.router.stats(),
+        "query_batcher": embeddings_service.embeddings.query_batcher.stats(),
+        "llm_registry": llm_registry.stats(),
+    }
+    for component, stats in components.items():
+        for name, value in stats.items():
+            if isinstance(value, (int, float)):
+                metrics.set_gauge(f"rag_{component}_{name}", value)
+    # Workers serving the same index converge on the same manifest version
+    embeddings_service.refresh()
+    metrics.set_gauge("rag_index_manifest_version", embeddings_service.store.version())
+    # Recent answer latencies per model, as used for the hedge delay
+    for (provider, model), stats in llm_registry.latency.stats().items():
+        labels = {"provider": provider, "model": model}
+        samples = stats.pop("samples")
+        metrics.set_gauge("rag_llm_recent_latency_samples", samples, **labels)
+        metrics.set_gauge(
+            "rag_llm_recent_latency_censored", stats.pop("censored"), **labels
+        )
+        for quantile, seconds in stats.items():
+            metrics.set_gauge(
+                "rag_llm_recent_latency_seconds", seconds, quantile=quantile, **labels
+            )
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@api.get("/jobs/{job_id}")
+def get_job(job_id: str) -> dict:
+    """Report the status and per-stage progress of one ingestion job."""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    # Initialize or update LLM service if provider or model changed
-    if (
-        llm_service is None
-        or getattr(llm_service, "provider", None) != request.llm_provider
-        or getattr(llm_service, "model", None) != request.model
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@api.post("/question", response_model=None)
+async def prompt_llm_rag(request: QuestionRequest) -> Union[dict, StreamingResponse]:
+    """Generates the answer for the question using RAG
+
+    With `stream=true` the answer is sent as Server-Sent Events: a `citations`
+    event with the retrieved snippets, `token` events as the model generates
+    text, and a final `done` event (or `error` if generation fails).
+    """
+    try:
+        llm_service = llm_registry.get(request.llm_provider, request.model)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    started = time.perf_counter()
+
+    # Answers are reused only for the same provider, model, format, retrieval
+    # mode (after the server default) and documents at the same index versions
+    versions = embeddings_service.document_versions(request.document_ids)
+    retrieval_mode = embeddings_service.effective_mode(request.retrieval_mode)
+    scope = AnswerCache.scope(
+        llm_service.provider,
+        llm_service.model,
+        "stream" if request.stream else "json",
+        retrieval_mode,
+        versions,
+    )
+    use_cache = answer_cache.enabled and bool(versions)
+    query_vector = None
+    embedding_calls = 0
+    if use_cache and embeddings_service.query_needs_embedding(
+        request.question, request.retrieval_mode
     ):
-        llm_service = LLMService(request.llm_provider, request.model)
+        # Embedded once: used for the cache lookup and reused by retrieval
+        with stage_timer("retrieval", "embed_query"):
+            query_vector = await embeddings_service.embeddings.aembed_query(
+                request.question
+            )
+        embedding_calls = 1
+    cached = None
+    if use_cache:
+        with stage_timer("answer", "cache_lookup"):
+            cached = answer_cache.lookup(scope, request.question, query_vector)
+
+    if cached is not None:
+        metadata = {
+            "retrieval": {
+                "embedding_calls": embedding_calls,
+                "segments_searched": 0,
+                "retrieval_mode": None,
+            },
+            "answer_cache": {
+                "hit": True,
+                "similarity": round(cached["similarity"], 4),
+                "saved_ms": round(cached["saved_ms"], 1),
+                **answer_cache.stats(),
+            },
+        }
+        answer = cached["answer"]
+        if request.stream:
+
+            async def cached_events() -> AsyncIterator[str]:
+                yield sse_event("citations", answer["citations"])
+                yield sse_event("token", {"text": answer["answer"]})
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield sse_event(
+                    "done",
+                    {
+                        "answer": answer["answer"],
+                        "time_to_first_token_ms": elapsed_ms,
+                        "metadata": metadata,
+                    },
+                )
+
+            return StreamingResponse(
+                cached_events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        answer["metadata"] = metadata
+        return answer
 
     # Get relevant documents using embeddings, constrained to uploaded docs
-    relevant_docs = embeddings_service.similarity_search(
-        request.question,
-        document_ids=request.document_ids,
+    relevant_docs, retrieval_stats = (
+        await embeddings_service.asimilarity_search_with_stats(
+            request.question,
+            document_ids=request.document_ids,
+            mode=request.retrieval_mode,
+            query_vector=query_vector,
+        )
     )
+    retrieval_stats["embedding_calls"] += embedding_calls
+    with stage_timer("retrieval", "pack"):
+        relevant_docs, context_stats = context_packer.pack(relevant_docs)
+    cache_metadata = {"hit": False, **answer_cache.stats()} if use_cache else None
+
+    if request.stream:
+
+        async def stream_events() -> AsyncIterator[str]:
+            try:
+                async for event, data in llm_service.astream_answer(
+                    request.question, relevant_docs
+                ):
+                    if event == "done":
+                        if use_cache and relevant_docs:
+                            answer_cache.put(
+                                scope,
+                                request.question,
+                                query_vector,
+                                {"answer": data["answer"], "citations": relevant_docs},
+                                (time.perf_counter() - started) * 1000,
+                            )
+                        data = {
+                            **data,
+                            "metadata": {
+                                "retrieval": retrieval_stats,
+                                "context": context_stats,
+                                "answer_cache": cache_metadata,
+                            },
+                        }
+                    yield sse_event(event, data)
+            except Exception as exc:
+                logging.exception("[question] streaming generation failed")
+                yield sse_event("error", {"error": str(exc)})
 
-    # Generate answer using LLM
-    result = llm_service.generate_answer(request.question, relevant_docs)
+        return StreamingResponse(
+            stream_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # Generate answer using LLM, racing the backup model if this one is slow
+    backup_service = None
+    if hedge_policy.should_hedge(request.hedge):
+        try:
+            backup_service = llm_registry.get(*hedge_policy.backup)
+        except Exception as exc:
+            logging.warning("[question] hedging skipped, backup unavailable: %s", exc)
+    hedge_metadata = None
+    if backup_service is not None:
+        delay = hedge_policy.hedge_delay(
+            llm_registry.latency, llm_service.provider, llm_service.model
+        )
+        result, hedge_metadata = await llm_service.agenerate_hedged(
+            request.question, relevant_docs, backup_service, delay
+        )
+        if hedge_metadata["winner"] == "backup":
+            # Cached under the model that actually wrote the answer
+            scope = AnswerCache.scope(
+                backup_service.provider,
+                backup_service.model,
+                "json",
+                retrieval_mode,
+                versions,
+            )
+    else:
+        result = await llm_service.agenerate_answer(request.question, relevant_docs)
+    if use_cache and relevant_docs:
+        answer_cache.put(
+            scope,
+            request.question,
+            query_vector,
+            result,
+            (time.perf_counter() - started) * 1000,
+        )
+    result["metadata"] = {
+        "retrieval": retrieval_stats,
+        "context": context_stats,
+        "answer_cache": cache_metadata,
+        "hedge": hedge_metadata,
+    }
 
     return result
+
+
+class BatchQuestion(BaseModel):
+    # Echoed back next to the line number to match answers with questions
+    id: Optional[Union[str, int]] = None
+    question: str
+    llm_provider: str = "openai"
+    model: Optional[str] = None
+    document_ids: List[str]
+    retrieval_mode: Optional[Literal["auto", "dense", "lexical", "hybrid"]] = None
+
+
+# Bulk question runs: most questions per batch and LLM calls in flight at once
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "10000"))
+BATCH_LLM_CONCURRENCY = max(1, int(os.getenv("BATCH_LLM_CONCURRENCY", "8")))
+
+
+def parse_batch(
+    body: str, defaults: Dict[str, Any]
+) -> List[Tuple[int, Union[BatchQuestion, str]]]:
+    """Parse JSONL questions into (line number, question or error message)."""
+    entries: List[Tuple[int, Union[BatchQuestion, str]]] = []
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+            if not isinstance(fields, dict):
+                raise ValueError("expected a JSON object")
+            entry = BatchQuestion(
+                **{
+                    **{k: v for k, v in defaults.items() if v is not None},
+                    **fields,
+                }
+            )
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            entry = f"Invalid question: {location}: {error['msg']}"
+        except ValueError as exc:
+            entry = f"Invalid question: {exc}"
+        entries.append((line_number, entry))
+    return entries
+
+
+async def answer_batch(
+    entries: List[Tuple[int, Union[BatchQuestion, str]]],
+) -> AsyncIterator[str]:
+    """Answer parsed batch questions and yield one JSON line each, in input order.
+
+    Queries are embedded in bulk, answer cache hits are served first,
+    retrieval runs one document set at a time so the segments of a set are
+    loaded once, and generation runs as soon as a question's context is
+    ready, at most BATCH_LLM_CONCURRENCY at a time.
+    """
+    loop = asyncio.get_running_loop()
+    outputs: List[asyncio.Future] = []
+    items: List[Dict[str, Any]] = []
+    for line_number, entry in entries:
+        output = loop.create_future()
+        outputs.append(output)
+        if isinstance(entry, str):
+            output.set_result({"line": line_number, "id": None, "error": entry})
+            continue
+        item = {
+            "line": line_number,
+            "request": entry,
+            "output": output,
+            "query_vector": None,
+            "embedding_calls": 0,
+            "timing": {
+                "embed_ms": 0.0,
+                "retrieval_ms": 0.0,
+                "queue_ms": 0.0,
+                "llm_ms": 0.0,
+            },
+        }
+        try:
+            item["llm"] = llm_registry.get(entry.llm_provider, entry.model)
+        except ValueError as exc:
+            finish_batch_item(item, error=str(exc))
+            continue
+        items.append(item)
+
+    generations: Set[asyncio.Task] = set()
+    semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def generate(item: Dict[str, Any], relevant_docs: List[dict]) -> None:
+        request = item["request"]
+        try:
+            queued = time.perf_counter()
+            async with semaphore:
+                llm_started = time.perf_counter()
+                item["timing"]["queue_ms"] = (llm_started - queued) * 1000
+                result = await item["llm"].agenerate_answer(
+                    request.question, relevant_docs
+                )
+                item["timing"]["llm_ms"] = (time.perf_counter() - llm_started) * 1000
+        except Exception as exc:
+            logging.exception("[questions/batch] generation failed")
+            finish_batch_item(item, error=str(exc))
+            return
+        if item["use_cache"] and relevant_docs:
+            answer_cache.put(
+                item["scope"],
+                request.question,
+                item["query_vector"],
+                result,
+                sum(item["timing"].values()),
+            )
+        finish_batch_item(item, result)
+
+    async def embed_all() -> None:
+        # Every query in one go (identical questions once), in concurrent batches
+        to_embed = [
+            item
+            for item in items
+            if item["versions"]
+            and embeddings_service.query_needs_embedding(
+                item["request"].question, item["request"].retrieval_mode
+            )
+        ]
+        questions = list(dict.fromkeys(item["request"].question for item in to_embed))
+        if not questions:
+            return
+        embed_started = time.perf_counter()
+        try:
+            with stage_timer("retrieval", "embed_query"):
+                vectors = await asyncio.to_thread(
+                    embeddings_service.embeddings.embed_queries, questions
+                )
+            error = None
+        except Exception as exc:
+            logging.exception("[questions/batch] query embedding failed")
+            vectors, error = [], f"Query embedding failed: {exc}"
+        by_question = dict(zip(questions, vectors))
+        share_ms = (time.perf_counter() - embed_started) * 1000 / len(to_embed)
+        for item in to_embed:
+            item["timing"]["embed_ms"] = share_ms
+            if error is not None:
+                finish_batch_item(item, error=error)
+            else:
+                item["query_vector"] = by_question[item["request"].question]
+                item["embedding_calls"] = 1
+
+    async def run() -> None:
+        for item in items:
+            item["versions"] = embeddings_service.document_versions(
+                item["request"].document_ids
+            )
+            item["scope"] = AnswerCache.scope(
+                item["llm"].provider,
+                item["llm"].model,
+                "json",
+                embeddings_service.effective_mode(item["request"].retrieval_mode),
+                item["versions"],
+            )
+            item["use_cache"] = answer_cache.enabled and bool(item["versions"])
+        await embed_all()
+
+        # Retrieval grouped by document set: consecutive searches reuse segments
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for item in items:
+            if item["output"].done():
+                continue
+            if item["use_cache"]:
+                with stage_timer("answer", "cache_lookup"):
+                    cached = answer_cache.lookup(
+                        item["scope"], item["request"].question, item["query_vector"]
+                    )
+                if cached is not None:
+                    finish_batch_item(item, cached["answer"], cached=cached)
+                    continue
+            key = tuple(sorted(set(item["request"].document_ids)))
+            groups.setdefault(key, []).append(item)
+
+        for group in groups.values():
+            searched = await asyncio.to_thread(search_batch_group, group)
+            for item, (relevant_docs, retrieval_stats, error) in zip(group, searched):
+                if error is not None:
+                    finish_batch_item(item, error=error)
+                    continue
+                retrieval_stats["embedding_calls"] += item["embedding_calls"]
+                with stage_timer("retrieval", "pack"):
+                    relevant_docs, item["context"] = context_packer.pack(relevant_docs)
+                item["retrieval"] = retrieval_stats
+                task = asyncio.create_task(generate(item, relevant_docs))
+                generations.add(task)
+                task.add_done_callback(generations.discard)
+
+    async def run_or_fail() -> None:
+        try:
+            await run()
+        except Exception as exc:
+            # Questions not answered yet fail instead of hanging the stream
+            logging.exception("[questions/batch] batch failed")
+            for item in items:
+                if not item["output"].done():
+                    finish_batch_item(item, error=f"Batch failed: {exc}")
+
+    runner = asyncio.create_task(run_or_fail())
+    try:
+        for output in outputs:
+            yield json.dumps(await output, ensure_ascii=False) + "\n"
+    finally:
+        # Client went away or the batch is done: stop any remaining work
+        runner.cancel()
+        for task in list(generations):
+            task.cancel()
+
+
+def search_batch_group(
+    group: List[Dict[str, Any]],
+) -> List[Tuple[Optional[List[dict]], Optional[dict], Optional[str]]]:
+    """Retrieve the context of questions sharing one document set, one by one."""
+    searched = []
+    for item in group:
+        request = item["request"]
+        search_started = time.perf_counter()
+        try:
+            relevant_docs, retrieval_stats = (
+                embeddings_service.similarity_search_with_stats(
+                    request.question,
+                    document_ids=request.document_ids,
+                    mode=request.retrieval_mode,
+                    query_vector=item["query_vector"],
+                )
+            )
+            searched.append((relevant_docs, retrieval_stats, None))
+        except Exception as exc:
+            logging.exception("[questions/batch] retrieval failed")
+            searched.append((None, None, f"Retrieval failed: {exc}"))
+        item["timing"]["retrieval_ms"] = (time.perf_counter() - search_started) * 1000
+    return searched
+
+
+def finish_batch_item(
+    item: Dict[str, Any],
+    result: Optional[dict] = None,
+    error: Optional[str] = None,
+    cached: Optional[dict] = None,
+) -> None:
+    """Complete one batch question with its answer line or error line."""
+    output: Dict[str, Any] = {"line": item["line"], "id": item["request"].id}
+    if error is not None:
+        output["error"] = error
+        status = "failed"
+    elif cached is not None:
+        output.update(result)
+        output["metadata"] = {
+            "retrieval": {
+                "embedding_calls": item["embedding_calls"],
+                "segments_searched": 0,
+                "retrieval_mode": None,
+            },
+            "answer_cache": {
+                "hit": True,
+                "similarity": round(cached["similarity"], 4),
+                "saved_ms": round(cached["saved_ms"], 1),
+            },
+        }
+        status = "cached"
+    else:
+        output.update(result)
+        output["metadata"] = {
+            "retrieval": item["retrieval"],
+            "context": item["context"],
+            "answer_cache": {"hit": False} if item["use_cache"] else None,
+        }
+        status = "answered"
+    timing = item["timing"]
+    output["timing"] = {
+        **{name: round(ms, 1) for name, ms in timing.items()},
+        "total_ms": round(sum(timing.values()), 1),
+    }
+    metrics.increment("rag_batch_questions_total", status=status)
+    item["output"].set_result(output)
+
+
+@api.post("/questions/batch")
+async def answer_questions_batch(
+    http_request: Request,
+    llm_provider: Optional[str] = None,
+    model: Optional[str] = None,
+    retrieval_mode: Optional[Literal["auto", "dense", "lexical", "hybrid"]] = None,
+) -> StreamingResponse:
+    """Answer a JSONL file of questions, streaming JSONL answers in input order.
+
+    The request body has one JSON object per line with the `/question` fields
+    `question` and `document_ids`, and optionally `id`, `llm_provider`,
+    `model` and `retrieval_mode`; the query parameters are defaults for lines
+    that leave those out. Each output line is the `/question` answer plus
+    `line`, `id` and `timing` (`embed_ms`, the question's share of the bulk
+    embedding call, `retrieval_ms`, `queue_ms` waiting for a generation slot,
+    `llm_ms` and their sum `total_ms`), or `line`, `id` and `error` for a question that failed.
+    """
+    body = (await http_request.body()).decode("utf-8")
+    entries = parse_batch(
+        body,
+        {
+            "llm_provider": llm_provider,
+            "model": model,
+            "retrieval_mode": retrieval_mode,
+        },
+    )
+    if len(entries) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch",
+        )
+    return StreamingResponse(answer_batch(entries), media_type="application/x-ndjson")
@@ -0,0 +1,52 @@
+import threading
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limiter for calls to a rate-limited upstream API.
+
+    The limit grows by one after `limit` consecutive successes (additive
+    increase) and is halved whenever the upstream throttles or times out
+    (multiplicative decrease), so in-flight requests converge on what the
+    provider currently accepts.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16) -> None:
+        """
+        Args:
+            initial: Starting number of concurrent calls
+            minimum: Lower bound the limit never drops below
+            maximum: Upper bound the limit never grows above
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.in_flight = 0
+        self.throttled = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until a slot under the current limit is free."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        """Free a slot and adapt the limit to the outcome of the call.
+
+        Args:
+            throttled: True when the call failed with a rate limit or timeout
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self._successes = 0
+                self.limit = max(self.minimum, self.limit // 2)
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
@@ -0,0 +1,411 @@
+"""Index selection for vector store segments: index type and vector compression.
+
+Segments always keep their (optionally compressed) vectors in `vectors.npy`,
+used for exact scans, merges and highly selective filters. Larger segments
+also get an approximate FAISS index (`index.faiss`) chosen from their size:
+
+    flat     exact scan only                      (< ANN_FLAT_MAX_VECTORS)
+    hnsw     graph index, best latency/recall     (< ANN_HNSW_MAX_VECTORS)
+    ivf      inverted lists over k-means cells
+    ivfpq    inverted lists + product quantization, smallest memory
+
+Vector storage can be float32, float16 (half the size) or sq8 (8-bit scalar
+quantization, a quarter of the size).
+
+Run `python -m services.ann_index --root ./vector_store` for a recall@k vs
+latency report of every configuration against the exact index.
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+STORAGE_TYPES = ("float32", "float16", "sq8")
+# numpy dtype of the stored rows for each storage type
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "sq8": np.uint8}
+
+# Rows decoded per block when scanning compressed vectors
+SCAN_BLOCK_ROWS = 8192
+
+
+class IndexSettings:
+    """Index type and compression settings for newly written segments."""
+
+    def __init__(
+        self,
+        index_type: str = "auto",
+        storage: str = "float32",
+        flat_max_vectors: int = 20000,
+        hnsw_max_vectors: int = 1000000,
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 64,
+        ivf_nprobe: int = 16,
+        exact_filter_fraction: float = 0.1,
+        rerank_factor: int = 4,
+    ) -> None:
+        """
+        Args:
+            index_type: "auto" or one of INDEX_TYPES
+            storage: One of STORAGE_TYPES
+            flat_max_vectors: Auto mode keeps segments below this size exact
+            hnsw_max_vectors: Auto mode uses HNSW below this size, IVF-PQ above
+            hnsw_m: HNSW graph degree
+            hnsw_ef_search: HNSW search breadth
+            ivf_nprobe: Number of IVF cells visited per query
+            exact_filter_fraction: Below this fraction of allowed rows a filtered
+                query scans the allowed rows exactly instead of using the ANN index
+            rerank_factor: IVF-PQ fetches k * rerank_factor candidates and re-scores
+                them against the stored vectors
+        """
+        if index_type != "auto" and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unsupported vector storage: {storage}")
+        self.index_type = index_type
+        self.storage = storage
+        self.flat_max_vectors = flat_max_vectors
+        self.hnsw_max_vectors = hnsw_max_vectors
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_nprobe = ivf_nprobe
+        self.exact_filter_fraction = exact_filter_fraction
+        self.rerank_factor = max(1, rerank_factor)
+
+    @classmethod
+    def from_env(cls) -> "IndexSettings":
+        return cls(
+            index_type=os.getenv("VECTOR_INDEX_TYPE", "auto").lower(),
+            storage=os.getenv("VECTOR_STORAGE", "float32").lower(),
+            flat_max_vectors=int(os.getenv("ANN_FLAT_MAX_VECTORS", "20000")),
+            hnsw_max_vectors=int(os.getenv("ANN_HNSW_MAX_VECTORS", "1000000")),
+            hnsw_m=int(os.getenv("HNSW_M", "32")),
+            hnsw_ef_search=int(os.getenv("HNSW_EF_SEARCH", "64")),
+            ivf_nprobe=int(os.getenv("IVF_NPROBE", "16")),
+            exact_filter_fraction=float(os.getenv("ANN_EXACT_FILTER_FRACTION", "0.1")),
+            rerank_factor=int(os.getenv("IVFPQ_RERANK_FACTOR", "4")),
+        )
+
+    def choose_index_type(self, n_vectors: int, dimensions: int) -> str:
+        """Pick the index type for a segment of `n_vectors` rows."""
+        index_type = self.index_type
+        if index_type == "auto":
+            if n_vectors < self.flat_max_vectors:
+                index_type = "flat"
+            elif n_vectors < self.hnsw_max_vectors:
+                index_type = "hnsw"
+            else:
+                index_type = "ivfpq"
+        # k-means training needs enough points per centroid
+        if index_type in ("ivf", "ivfpq") and n_vectors < 39 * 16:
+            index_type = "flat"
+        if index_type == "ivfpq" and (
+            n_vectors < 39 * 256 or _pq_subquantizers(dimensions) == 0
+        ):
+            index_type = "ivf"
+        return index_type
+
+
+def _ivf_nlist(n_vectors: int) -> int:
+    # ~4 * sqrt(n) cells, with at least 39 training points per cell
+    return max(1, min(65536, int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _pq_subquantizers(dimensions: int) -> int:
+    # About 8 dimensions per one-byte sub-quantizer; it must divide the dimensions
+    for m in range(max(1, dimensions // 8), 0, -1):
+        if dimensions % m == 0:
+            return m
+    return 0
+
+
+def encode_vectors(
+    matrix: np.ndarray, storage: str, sq_params: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Compress a float32 matrix for storage.
+
+    Args:
+        matrix: Rows to encode
+        storage: "float32", "float16" or "sq8"
+        sq_params: sq8 [minimum, scale] rows to reuse, e.g. when encoding a
+            large matrix block by block (computed from `matrix` by default)
+
+    Returns:
+        Tuple of (stored array, sq8 parameters as [minimum, scale] rows or None)
+    """
+    if storage == "float16":
+        return matrix.astype(np.float16), None
+    if storage == "sq8":
+        if sq_params is None:
+            sq_params = sq8_params(
+                matrix.min(axis=0) if len(matrix) else np.zeros(matrix.shape[1]),
+                matrix.max(axis=0) if len(matrix) else np.ones(matrix.shape[1]),
+            )
+        minimum, scale = sq_params
+        codes = np.clip(np.rint((matrix - minimum) / scale), 0, 255).astype(np.uint8)
+        return codes, sq_params
+    return matrix.astype(np.float32), None
+
+
+def sq8_params(minimum: np.ndarray, maximum: np.ndarray) -> np.ndarray:
+    """sq8 [minimum, scale] rows mapping each dimension's range onto 0..255."""
+    scale = np.maximum(maximum - minimum, 1e-12) / 255.0
+    return np.vstack([minimum, scale]).astype(np.float32)
+
+
+def decode_vectors(stored: np.ndarray, sq_params: Optional[np.ndarray]) -> np.ndarray:
+    """Decode stored rows back to float32."""
+    if sq_params is not None:
+        return sq_params[0] + stored.astype(np.float32) * sq_params[1]
+    return np.asarray(stored, dtype=np.float32)
+
+
+def exact_scan(
+    stored: np.ndarray,
+    norms: np.ndarray,
+    sq_params: Optional[np.ndarray],
+    query: np.ndarray,
+) -> np.ndarray:
+    """Squared L2 distances from `query` to every stored row."""
+    if stored.dtype == np.float32:
+        dots = stored @ query
+    else:
+        # Decode compressed rows block by block to bound temporary memory
+        dots = np.empty(stored.shape[0], dtype=np.float32)
+        for start in range(0, stored.shape[0], SCAN_BLOCK_ROWS):
+            block = decode_vectors(stored[start : start + SCAN_BLOCK_ROWS], sq_params)
+            dots[start : start + SCAN_BLOCK_ROWS] = block @ query
+    distances = norms - 2.0 * dots + float(query @ query)
+    np.maximum(distances, 0.0, out=distances)
+    return distances
+
+
+def build_ann_index(
+    matrix: np.ndarray, index_type: str, storage: str, settings: IndexSettings
+) -> Optional[faiss.Index]:
+    """Build the approximate index for a segment; None for flat segments."""
+    if index_type == "flat" or len(matrix) == 0:
+        return None
+    dimensions = matrix.shape[1]
+    quantizer_type = {
+        "float16": faiss.ScalarQuantizer.QT_fp16,
+        "sq8": faiss.ScalarQuantizer.QT_8bit,
+    }.get(storage)
+
+    if index_type == "hnsw":
+        if quantizer_type is None:
+            index = faiss.IndexHNSWFlat(dimensions, settings.hnsw_m)
+        else:
+            index = faiss.IndexHNSWSQ(dimensions, quantizer_type, settings.hnsw_m)
+        index.hnsw.efConstruction = max(40, 2 * settings.hnsw_m)
+    else:
+        nlist = _ivf_nlist(len(matrix))
+        coarse = faiss.IndexFlatL2(dimensions)
+        if index_type == "ivfpq":
+            index = faiss.IndexIVFPQ(
+                coarse, dimensions, nlist, _pq_subquantizers(dimensions), 8
+            )
+        elif quantizer_type is None:
+            index = faiss.IndexIVFFlat(coarse, dimensions, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(
+                coarse, dimensions, nlist, quantizer_type
+            )
+        # The coarse quantizer is owned by the IVF index from here on
+        index.own_fields = True
+        coarse.this.disown()
+
+    if not index.is_trained:
+        sample = matrix
+        if len(matrix) > 256 * 256:
+            rng = np.random.default_rng(0)
+            sample = matrix[rng.choice(len(matrix), 256 * 256, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+    index.add(np.ascontiguousarray(matrix))
+    return index
+
+
+def search_ann(
+    index: faiss.Index,
+    query: np.ndarray,
+    k: int,
+    settings: IndexSettings,
+    allowed_rows: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Search an ANN index, optionally restricted to `allowed_rows`.
+
+    Returns:
+        Tuple of (distances, row positions) for up to k hits; missing hits are dropped
+    """
+    selector = faiss.IDSelectorBatch(allowed_rows) if allowed_rows is not None else None
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(efSearch=max(settings.hnsw_ef_search, k))
+    else:
+        params = faiss.SearchParametersIVF(nprobe=settings.ivf_nprobe)
+    if selector is not None:
+        params.sel = selector
+    distances, positions = index.search(query.reshape(1, -1), k, params=params)
+    keep = positions[0] >= 0
+    return distances[0][keep], positions[0][keep]
+
+
+def search_vectors(
+    stored: np.ndarray,
+    norms: np.ndarray,
+    sq_params: Optional[np.ndarray],
+    index: Optional[faiss.Index],
+    query: np.ndarray,
+    k: int,
+    settings: IndexSettings,
+    allowed_rows: Optional[np.ndarray] = None,
+    exact: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k rows of one segment, choosing between the ANN index and an exact scan.
+
+    The exact scan is used when there is no index, when `exact` is set, or when
+    the filter keeps so few rows that scanning them is cheaper and exact.
+
+    Returns:
+        Tuple of (squared L2 distances, row positions), ascending by distance
+    """
+    use_ann = (
+        index is not None
+        and not exact
+        and (
+            allowed_rows is None
+            or allowed_rows.size >= settings.exact_filter_fraction * stored.shape[0]
+        )
+    )
+    if use_ann:
+        if not isinstance(index, faiss.IndexIVFPQ):
+            return search_ann(index, query, k, settings, allowed_rows)
+        # PQ distances are coarse: re-score a wider candidate list exactly
+        _, candidates = search_ann(
+            index, query, k * settings.rerank_factor, settings, allowed_rows
+        )
+        allowed_rows = np.sort(candidates)
+    # Only the allowed rows are read from the memory-mapped matrix
+    rows_stored = stored if allowed_rows is None else stored[allowed_rows]
+    rows_norms = norms if allowed_rows is None else norms[allowed_rows]
+    distances = exact_scan(rows_stored, rows_norms, sq_params, query)
+    k = min(k, distances.shape[0])
+    if k == 0:
+        return distances[:0], np.empty(0, dtype=np.int64)
+    top = np.argpartition(distances, k - 1)[:k]
+    top = top[np.argsort(distances[top], kind="stable")]
+    positions = top if allowed_rows is None else allowed_rows[top]
+    return distances[top], positions
+
+
+def recall_report(
+    matrix: np.ndarray,
+    k: int = 5,
+    queries: int = 200,
+    settings: Optional[IndexSettings] = None,
+) -> List[Dict[str, Any]]:
+    """Measure recall@k and latency of every index/storage pair against exact search.
+
+    Queries are perturbed copies of sampled stored vectors.
+
+    Returns:
+        One row per configuration with recall_at_k, mean/p95 latency, build
+        time and on-disk size (stored vectors plus index)
+    """
+    settings = settings or IndexSettings()
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(matrix), min(queries, len(matrix)), replace=False)
+    noise = rng.standard_normal((len(picks), matrix.shape[1])).astype(np.float32)
+    probes = matrix[picks] + 0.05 * noise * matrix.std()
+
+    truth_norms = np.einsum("ij,ij->i", matrix, matrix)
+    truth = []
+    for probe in probes:
+        distances = exact_scan(matrix, truth_norms, None, probe)
+        truth.append(set(np.argsort(distances)[:k].tolist()))
+
+    auto_choice = IndexSettings(
+        flat_max_vectors=settings.flat_max_vectors,
+        hnsw_max_vectors=settings.hnsw_max_vectors,
+    ).choose_index_type(len(matrix), matrix.shape[1])
+    report: List[Dict[str, Any]] = []
+    for index_type in INDEX_TYPES:
+        for storage in STORAGE_TYPES:
+            if index_type == "ivfpq" and storage != "float32":
+                continue  # PQ already compresses; storage only affects re-ranking
+            forced = IndexSettings(index_type=index_type)
+            if forced.choose_index_type(len(matrix), matrix.shape[1]) != index_type:
+                report.append(
+                    {
+                        "index_type": index_type,
+                        "storage": storage,
+                        "skipped": "too few vectors to train this index",
+                    }
+                )
+                continue
+            built_start = time.perf_counter()
+            stored, sq_params = encode_vectors(matrix, storage)
+            decoded = decode_vectors(stored, sq_params)
+            norms = np.einsum("ij,ij->i", decoded, decoded)
+            index = build_ann_index(matrix, index_type, storage, settings)
+            build_s = time.perf_counter() - built_start
+            latencies, recalls = [], []
+            for probe, expected in zip(probes, truth):
+                started = time.perf_counter()
+                _, found = search_vectors(
+                    stored, norms, sq_params, index, probe, k, settings
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(expected & set(found.tolist())) / k)
+            memory = stored.nbytes
+            if index is not None:
+                memory += faiss.serialize_index(index).nbytes
+            report.append(
+                {
+                    "index_type": index_type,
+                    "storage": storage,
+                    "recall_at_k": round(float(np.mean(recalls)), 4),
+                    "latency_ms_mean": round(float(np.mean(latencies)), 3),
+                    "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+                    "build_s": round(build_s, 3),
+                    "disk_bytes": int(memory),
+                    "auto_choice": auto_choice == index_type,
+                }
+            )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recall@k vs latency of each index type against exact search"
+    )
+    parser.add_argument("--root", default="./vector_store")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    # Imported here: vector_store itself depends on this module
+    from services.index_cache import IndexCache
+    from services.vector_store import SegmentedVectorStore
+
+    store = SegmentedVectorStore(
+        args.root, IndexCache(max_entries=0), background_merge=False, preload=False
+    )
+    matrices = [
+        store.load_segment(segment_id).decoded_vectors()
+        for segment_id in store.segment_ids()
+    ]
+    if not matrices:
+        print("No vectors found under", args.root)
+        return
+    report = recall_report(np.vstack(matrices), k=args.k, queries=args.queries)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class Scope(NamedTuple):
+    """Answers are only shared between questions of the same scope."""
+
+    provider: str
+    model: str
+    response_format: str
+    retrieval_mode: str
+    # Sorted, with the index version of each at the same position
+    document_ids: Tuple[str, ...]
+    versions: Tuple[int, ...]
+
+
+class AnswerCache:
+    """Semantic cache of generated answers.
+
+    Answers are grouped by scope: provider, model, response format, retrieval
+    mode and the exact set of documents with their index versions. Inside a scope a new
+    question reuses a cached answer when its query embedding has a cosine
+    similarity of at least `threshold` with a cached question (or, when no
+    embedding is available, when the normalized text is identical).
+    Re-indexing a document bumps its version, so stale answers never match;
+    `invalidate_documents` also frees them right away.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 1000,
+    ) -> None:
+        """
+        Args:
+            threshold: Minimum cosine similarity between query embeddings for a hit
+            ttl_seconds: Lifetime of an entry (0 means no expiry)
+            max_entries: Maximum number of cached answers (0 disables the cache)
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._scopes: Dict[Scope, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_ms = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        enabled = os.getenv("ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+        return cls(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+            max_entries=(
+                int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")) if enabled else 0
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def scope(
+        provider: str,
+        model: Optional[str],
+        response_format: str,
+        retrieval_mode: str,
+        versions: Dict[str, int],
+    ) -> Scope:
+        document_ids = tuple(sorted(versions))
+        return Scope(
+            provider=provider,
+            model=model or "",
+            response_format=response_format,
+            retrieval_mode=retrieval_mode,
+            document_ids=document_ids,
+            versions=tuple(versions[d] for d in document_ids),
+        )
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    @staticmethod
+    def _unit(vector: Optional[Iterable[float]]) -> Optional[np.ndarray]:
+        if vector is None:
+            return None
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm > 0 else None
+
+    def lookup(
+        self,
+        scope: Scope,
+        question: str,
+        query_vector: Optional[Iterable[float]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Find a cached answer for a question within a scope.
+
+        Returns:
+            None on a miss, otherwise {"answer": deep copy of the cached answer,
+            "similarity", "saved_ms"}
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        unit = self._unit(query_vector)
+        text = self._normalize_text(question)
+        now = time.time()
+        with self._lock:
+            best_id, best_similarity = None, -1.0
+            for entry_id in list(self._scopes.get(scope, [])):
+                entry = self._entries[entry_id]
+                if self.ttl_seconds and now - entry["created_at"] > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                if entry["text"] == text:
+                    similarity = 1.0
+                elif unit is not None and entry["vector"] is not None:
+                    similarity = float(entry["vector"] @ unit)
+                else:
+                    continue
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            saved_ms = max(
+                0.0, entry["cost_ms"] - (time.perf_counter() - started) * 1000
+            )
+            self.saved_ms += saved_ms
+            answer = copy.deepcopy(entry["answer"])
+        return {"answer": answer, "similarity": best_similarity, "saved_ms": saved_ms}
+
+    def put(
+        self,
+        scope: Scope,
+        question: str,
+        query_vector: Optional[Iterable[float]],
+        answer: Any,
+        cost_ms: float,
+    ) -> None:
+        """Cache an answer and the time it took to produce (retrieval + generation)."""
+        if not self.enabled:
+            return
+        entry = {
+            "scope": scope,
+            "text": self._normalize_text(question),
+            "vector": self._unit(query_vector),
+            "answer": copy.deepcopy(answer),
+            "cost_ms": cost_ms,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._scopes.setdefault(scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """Drop every answer whose scope includes one of `document_ids`.
+
+        Returns:
+            Number of entries removed
+        """
+        targets = set(document_ids)
+        with self._lock:
+            stale = [
+                entry_id
+                for scope, entry_ids in self._scopes.items()
+                if targets.intersection(scope.document_ids)
+                for entry_id in entry_ids
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+        if stale:
+            logging.info(
+                "[AnswerCache] invalidated %d answers for %s",
+                len(stale),
+                sorted(targets),
+            )
+        return len(stale)
+
+    def _remove(self, entry_id: int) -> None:
+        # Caller holds the lock
+        entry = self._entries.pop(entry_id)
+        entry_ids = self._scopes[entry["scope"]]
+        entry_ids.remove(entry_id)
+        if not entry_ids:
+            del self._scopes[entry["scope"]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_ms_total": round(self.saved_ms, 1),
+            }
@@ -0,0 +1,176 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.tokens import estimate_tokens
+
+# Per-snippet header the prompt adds ("[doc=... page=... score=...]")
+HEADER_TOKENS = 12
+
+
+def _merge_text(a: str, b: str, min_overlap: int) -> Optional[str]:
+    """Join two chunks when one contains the other or they overlap end-to-start."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    for first, second in ((a, b), (b, a)):
+        probe = second[:min_overlap]
+        if len(probe) < min_overlap:
+            continue
+        start = first.find(probe)
+        while start != -1:
+            if second.startswith(first[start:]):
+                return first[:start] + second
+            start = first.find(probe, start + 1)
+    return None
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+class ContextPacker:
+    """Packs retrieved snippets into the prompt context under a token budget.
+
+    Steps, on results already ordered best first:
+      1. merge chunks of the same document and page that overlap (the text
+         splitter repeats up to `chunk_overlap` characters between neighbours)
+      2. drop snippets whose words are nearly all in a better-ranked snippet
+      3. add snippets in rank order while they fit in `max_tokens`
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        dedup_threshold: float = 0.9,
+        min_overlap: int = 32,
+    ) -> None:
+        """
+        Args:
+            max_tokens: Token budget of the packed context (0 disables the budget)
+            dedup_threshold: Share of a snippet's words already present in a
+                better-ranked snippet above which it is a near-duplicate
+            min_overlap: Minimum shared characters for merging two chunks
+        """
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.min_overlap = min_overlap
+
+    @classmethod
+    def from_env(cls) -> "ContextPacker":
+        return cls(
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "3000")),
+            dedup_threshold=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9")),
+        )
+
+    def pack(
+        self, relevant_docs: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Merge, de-duplicate and budget structured retrieval results.
+
+        Args:
+            relevant_docs: Dicts with "snippet", "document_id", "page", "score",
+                best first
+
+        Returns:
+            Tuple of (packed results best first, stats with tokens_before,
+            tokens_after, tokens_saved, chunks_in, chunks_out, merged,
+            duplicates_dropped, over_budget_dropped)
+        """
+        tokens_before = sum(
+            estimate_tokens(d.get("snippet", "")) + HEADER_TOKENS for d in relevant_docs
+        )
+        merged, merges = self._merge_overlaps(relevant_docs)
+        unique, duplicates = self._drop_near_duplicates(merged)
+        packed, over_budget = self._fit_budget(unique)
+        tokens_after = sum(
+            estimate_tokens(d["snippet"]) + HEADER_TOKENS for d in packed
+        )
+        return packed, {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": max(0, tokens_before - tokens_after),
+            "chunks_in": len(relevant_docs),
+            "chunks_out": len(packed),
+            "merged": merges,
+            "duplicates_dropped": duplicates,
+            "over_budget_dropped": over_budget,
+        }
+
+    def _merge_overlaps(
+        self, docs: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        packed: List[Dict[str, Any]] = []
+        merges = 0
+        for doc in docs:
+            item = dict(doc)
+            key = (item.get("document_id"), item.get("page"))
+            target = None  # position of the entry this chunk was merged into
+            idx = 0
+            while idx < len(packed):
+                kept = packed[idx]
+                joined = None
+                if (kept.get("document_id"), kept.get("page")) == key:
+                    joined = _merge_text(
+                        kept.get("snippet", ""),
+                        item.get("snippet", ""),
+                        self.min_overlap,
+                    )
+                if joined is None:
+                    idx += 1
+                    continue
+                merges += 1
+                if target is None:
+                    # The better-ranked entry keeps its position and score
+                    packed[idx] = item = {**kept, "snippet": joined}
+                    target = idx
+                    idx += 1
+                else:
+                    # The grown chunk bridges into a lower-ranked entry: absorb it
+                    packed[target] = item = {**packed[target], "snippet": joined}
+                    del packed[idx]
+            if target is None:
+                packed.append(item)
+        return packed, merges
+
+    def _drop_near_duplicates(
+        self, docs: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        kept: List[Dict[str, Any]] = []
+        kept_words: List[set] = []
+        dropped = 0
+        for doc in docs:
+            words = _words(doc.get("snippet", ""))
+            duplicate = any(
+                words and len(words & other) / len(words) >= self.dedup_threshold
+                for other in kept_words
+            )
+            if duplicate:
+                dropped += 1
+                continue
+            kept.append(doc)
+            kept_words.append(words)
+        return kept, dropped
+
+    def _fit_budget(
+        self, docs: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        if not self.max_tokens:
+            return docs, 0
+        packed: List[Dict[str, Any]] = []
+        used = 0
+        dropped = 0
+        for doc in docs:
+            cost = estimate_tokens(doc["snippet"]) + HEADER_TOKENS
+            if used + cost <= self.max_tokens:
+                packed.append(doc)
+                used += cost
+            elif not packed:
+                # Never send an empty context: trim the best snippet to the budget
+                chars = max(0, (self.max_tokens - HEADER_TOKENS) * 4)
+                packed.append({**doc, "snippet": doc["snippet"][:chars]})
+                used = self.max_tokens
+            else:
+                dropped += 1  # a smaller, lower-ranked snippet may still fit
+        return packed, dropped
@@ -0,0 +1,346 @@
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def summary_vectors(sample: np.ndarray, count: int, iterations: int = 8) -> np.ndarray:
+    """`count` unit vectors summarizing the topics of `sample` (spherical k-means).
+
+    Centers start from evenly spaced rows, so a page-ordered sample seeds one
+    center per section of the document, and move to the mean direction of the
+    rows closest to them.
+    """
+    sample = _normalize(np.asarray(sample, dtype=np.float32))
+    if len(sample) <= count:
+        return sample
+    centers = sample[np.linspace(0, len(sample) - 1, count).astype(np.int64)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centers.T, axis=1)
+        for idx in range(count):
+            members = sample[assignment == idx]
+            if len(members):
+                centers[idx] = members.sum(axis=0)
+        centers = _normalize(centers)
+    return centers
+
+
+class DocumentRouter:
+    """Document-level index that picks which documents a dense query visits.
+
+    Every document is summarized by a few unit vectors: the centroid of its
+    chunk embeddings plus `summary_count` topic centers. A query scores each
+    requested document by its best cosine similarity to those vectors and
+    only the most promising ones go on to the chunk-level search. Small
+    selections, flat score distributions and documents without routing
+    vectors are always searched in full.
+
+    The number of routed documents adapts to the query: every document within
+    `margin` of the best score is kept, bounded by `min_routed` (at least k)
+    and `max_routed`. A sample of routed queries (`audit_rate`) is also run
+    exhaustively to measure the recall the pruning costs.
+
+    Files are replaced by renames, so processes sharing `path` pick up each
+    other's updates with `refresh`.
+
+    Layout:
+        <path>/<document_id>.npy    routing vectors, centroid first
+    """
+
+    def __init__(
+        self,
+        path: str,
+        enabled: bool = True,
+        summary_count: int = 4,
+        sample_size: int = 512,
+        min_documents: int = 32,
+        min_routed: int = 8,
+        max_routed: int = 64,
+        margin: float = 0.15,
+        min_spread: float = 0.02,
+        audit_rate: float = 0.01,
+    ) -> None:
+        """
+        Args:
+            path: Directory holding one routing file per document
+            enabled: Route queries (vectors are still built when disabled)
+            summary_count: Topic centers kept per document besides the centroid
+            sample_size: Chunk vectors sampled per document to find the centers
+            min_documents: Selections with fewer documents are searched in full
+            min_routed: Fewest documents a routed query visits (raised to k)
+            max_routed: Most documents a routed query visits
+            margin: Documents scoring within this cosine of the best one are kept
+            min_spread: Below this gap between the best and the median score
+                the vectors cannot tell documents apart; search every document
+            audit_rate: Share of routed queries also searched exhaustively to
+                measure recall
+        """
+        self.path = path
+        self.enabled = enabled
+        self.summary_count = max(0, summary_count)
+        self.sample_size = max(1, sample_size)
+        self.min_documents = min_documents
+        self.min_routed = max(1, min_routed)
+        self.max_routed = max(self.min_routed, max_routed)
+        self.margin = margin
+        self.min_spread = min_spread
+        self.audit_rate = min(1.0, max(0.0, audit_rate))
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, np.ndarray] = {}
+        # mtime_ns of each loaded file and of the directory, to spot updates
+        self._file_stamps: Dict[str, int] = {}
+        self._dir_stamp: Optional[int] = None
+        # Stacked vectors of every document, rebuilt lazily after an update
+        self._matrix: Optional[np.ndarray] = None
+        self._row_starts = np.zeros(0, dtype=np.int64)
+        self._positions: Dict[str, int] = {}
+        self.refresh()
+
+        self.queries = 0
+        self.routed = 0
+        self.fallbacks = 0
+        self.documents_requested = 0
+        self.documents_searched = 0
+        self.audits = 0
+        self.audit_recall = 0.0
+
+    @classmethod
+    def from_env(cls, root: str) -> "DocumentRouter":
+        return cls(
+            os.path.join(root, "routing"),
+            enabled=os.getenv("DOCUMENT_ROUTING", "true").lower()
+            in ("1", "true", "yes"),
+            summary_count=int(os.getenv("ROUTING_SUMMARY_VECTORS", "4")),
+            min_documents=int(os.getenv("ROUTING_MIN_DOCUMENTS", "32")),
+            min_routed=int(os.getenv("ROUTING_MIN_ROUTED", "8")),
+            max_routed=int(os.getenv("ROUTING_MAX_ROUTED", "64")),
+            margin=float(os.getenv("ROUTING_MARGIN", "0.15")),
+            min_spread=float(os.getenv("ROUTING_MIN_SPREAD", "0.02")),
+            audit_rate=float(os.getenv("ROUTING_AUDIT_RATE", "0.01")),
+        )
+
+    def refresh(self) -> bool:
+        """Load routing files written or removed by other processes.
+
+        Costs one stat of the directory when nothing changed.
+
+        Returns:
+            True if any document's vectors changed
+        """
+        dir_stamp = os.stat(self.path).st_mtime_ns
+        if dir_stamp == self._dir_stamp:
+            return False
+        with self._lock:
+            known = dict(self._file_stamps)
+        found: Dict[str, int] = {}
+        loaded: Dict[str, np.ndarray] = {}
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith(".npy") or entry.name.startswith(".tmp-"):
+                continue
+            document_id = entry.name[:-4]
+            try:
+                found[document_id] = entry.stat().st_mtime_ns
+                if known.get(document_id) != found[document_id]:
+                    loaded[document_id] = np.load(entry.path)
+            except Exception as exc:
+                # Removed meanwhile, or not a routing file: searched in full
+                logging.warning("[DocumentRouter] skipping %s: %s", entry.name, exc)
+                found.pop(document_id, None)
+        with self._lock:
+            removed = [d for d in self._vectors if d not in found]
+            for document_id in removed:
+                del self._vectors[document_id]
+                self._file_stamps.pop(document_id, None)
+            for document_id, vectors in loaded.items():
+                self._vectors[document_id] = vectors
+                self._file_stamps[document_id] = found[document_id]
+            if removed or loaded:
+                self._matrix = None
+            self._dir_stamp = dir_stamp
+        return bool(removed or loaded)
+
+    def has(self, document_id: str) -> bool:
+        with self._lock:
+            return document_id in self._vectors
+
+    def update(
+        self, document_id: str, blocks: Iterable[np.ndarray], chunks: int
+    ) -> None:
+        """Rebuild the routing vectors of one document from its chunk vectors.
+
+        Args:
+            document_id: Indexed document
+            blocks: The document's live chunk vectors, in page order, in blocks
+            chunks: Number of rows in `blocks`, used to sample them evenly
+        """
+        stride = max(1, -(-chunks // self.sample_size))
+        total: Optional[np.ndarray] = None
+        sampled: List[np.ndarray] = []
+        seen = 0
+        for block in blocks:
+            block = np.asarray(block, dtype=np.float32)
+            if not len(block):
+                continue
+            total = block.sum(axis=0) if total is None else total + block.sum(axis=0)
+            # Rows seen, stride, 2*stride, ... across block boundaries
+            sampled.append(block[(-seen) % stride :: stride])
+            seen += len(block)
+        if total is None:
+            self.remove(document_id)
+            return
+        vectors = _normalize(total[None, :])
+        if self.summary_count:
+            centers = summary_vectors(np.vstack(sampled), self.summary_count)
+            vectors = np.vstack([vectors, centers]).astype(np.float32)
+
+        tmp_path = os.path.join(self.path, f".tmp-{os.getpid()}-{document_id}.npy")
+        final_path = os.path.join(self.path, f"{document_id}.npy")
+        np.save(tmp_path, vectors)
+        os.replace(tmp_path, final_path)
+        with self._lock:
+            self._vectors[document_id] = vectors
+            self._file_stamps[document_id] = os.stat(final_path).st_mtime_ns
+            self._matrix = None
+
+    def remove(self, document_id: str) -> None:
+        with self._lock:
+            if self._vectors.pop(document_id, None) is None:
+                return
+            self._file_stamps.pop(document_id, None)
+            self._matrix = None
+        try:
+            os.remove(os.path.join(self.path, f"{document_id}.npy"))
+        except FileNotFoundError:
+            pass
+
+    def _document_scores(self, query: np.ndarray) -> Tuple[np.ndarray, Dict[str, int]]:
+        # Caller holds the lock. Rows of a document are contiguous, so its best
+        # similarity is one reduceat over the stacked matrix
+        if self._matrix is None:
+            ids = list(self._vectors)
+            self._positions = {document_id: idx for idx, document_id in enumerate(ids)}
+            if ids:
+                counts = [len(self._vectors[document_id]) for document_id in ids]
+                self._matrix = np.vstack([self._vectors[d] for d in ids])
+                self._row_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            else:
+                self._matrix = np.zeros((0, query.shape[0]), dtype=np.float32)
+                self._row_starts = np.zeros(0, dtype=np.int64)
+        if not self._positions or self._matrix.shape[1] != query.shape[0]:
+            return np.zeros(0, dtype=np.float32), {}
+        similarities = self._matrix @ query
+        return np.maximum.reduceat(similarities, self._row_starts), self._positions
+
+    def route(
+        self, query_vector: Iterable[float], document_ids: List[str], k: int
+    ) -> Tuple[List[str], Dict[str, Any]]:
+        """Pick the documents among `document_ids` worth a chunk-level search.
+
+        Args:
+            query_vector: Query embedding
+            document_ids: Documents the query is restricted to
+            k: Number of chunks the search returns
+
+        Returns:
+            Tuple of (documents to search, in the order given, {"documents",
+            "routed", "fallback"}) where "fallback" names why every document
+            is searched, or is None when the selection was pruned
+        """
+        stats: Dict[str, Any] = {
+            "documents": len(document_ids),
+            "routed": len(document_ids),
+            "fallback": None,
+        }
+        if not self.enabled:
+            stats["fallback"] = "disabled"
+            return document_ids, stats
+        if len(document_ids) < self.min_documents:
+            stats["fallback"] = "few_documents"
+            return self._record(document_ids, stats)
+
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        with self._lock:
+            scores, positions = self._document_scores(query)
+        scored = [
+            (float(scores[positions[d]]), d) for d in document_ids if d in positions
+        ]
+        # Documents without routing vectors cannot be ranked: always searched
+        unrouted = [d for d in document_ids if d not in positions]
+        if not scored:
+            stats["fallback"] = "no_routing_vectors"
+            return self._record(document_ids, stats)
+        scored.sort(key=lambda item: -item[0])
+        best = scored[0][0]
+        if best - scored[len(scored) // 2][0] < self.min_spread:
+            stats["fallback"] = "flat_scores"
+            return self._record(document_ids, stats)
+
+        within_margin = sum(1 for score, _ in scored if score >= best - self.margin)
+        count = min(
+            max(within_margin, self.min_routed, k), self.max_routed, len(scored)
+        )
+        if count + len(unrouted) >= len(document_ids):
+            stats["fallback"] = "no_pruning"
+            return self._record(document_ids, stats)
+        keep = {d for _, d in scored[:count]} | set(unrouted)
+        selected = [d for d in document_ids if d in keep]
+        stats["routed"] = len(selected)
+        return self._record(selected, stats)
+
+    def _record(
+        self, selected: List[str], stats: Dict[str, Any]
+    ) -> Tuple[List[str], Dict[str, Any]]:
+        with self._lock:
+            self.queries += 1
+            self.documents_requested += stats["documents"]
+            self.documents_searched += len(selected)
+            if stats["fallback"] is None:
+                self.routed += 1
+            elif stats["fallback"] not in ("few_documents", "disabled"):
+                self.fallbacks += 1
+        return selected, stats
+
+    def record_expansion(self, stats: Dict[str, Any]) -> None:
+        """Count a routed query that was searched in full after all."""
+        with self._lock:
+            self.routed -= 1
+            self.fallbacks += 1
+            self.documents_searched += stats["documents"] - stats["routed"]
+        stats.update(routed=stats["documents"], fallback="too_few_hits")
+
+    def should_audit(self) -> bool:
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def record_audit(self, recall: float) -> None:
+        """Add one routed-vs-exhaustive recall@k measurement."""
+        with self._lock:
+            self.audits += 1
+            self.audit_recall += recall
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents_indexed": len(self._vectors),
+                "queries": self.queries,
+                "routed": self.routed,
+                "fallbacks": self.fallbacks,
+                "fanout_ratio": (
+                    self.documents_searched / self.documents_requested
+                    if self.documents_requested
+                    else 1.0
+                ),
+                "audits": self.audits,
+                "audit_recall": (
+                    self.audit_recall / self.audits if self.audits else 1.0
+                ),
+            }
@@ -1,16 +1,46 @@
+import asyncio
+import hashlib
 import logging
 import os
+import random
 import re
+import threading
 import time
-from io import BytesIO
-from typing import Any, Dict, List
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings as LangChainEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from openai import OpenAI
-from pypdf import PdfReader
+from openai import APITimeoutError, AsyncOpenAI, OpenAI, RateLimitError
+from services.adaptive_concurrency import AdaptiveConcurrency
+from services.document_router import DocumentRouter
+from services.embedding_cache import EmbeddingCache
+from services.index_cache import IndexCache
+from services.lexical_index import is_identifier_query, reciprocal_rank_fusion
+from services.metrics import record_stage, sampled_log, stage_timer
+from services.pdf_extraction import PageExtractor, PdfSource
+from services.query_batcher import QueryEmbeddingBatcher
+from services.sharding import PartitionedVectorStore
+from services.tokens import estimate_tokens
+from services.vector_store import SegmentedVectorStore, SegmentWriter
+
+# Chunking of page text before embedding (characters, counted with len)
+CHUNK_SIZE = 1400
+CHUNK_OVERLAP = 300
+
+
+def _sha256(source: PdfSource) -> str:
+    # Files are hashed in blocks so large uploads are never read into memory at once
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 class OpenAIEmbeddingsDirect(LangChainEmbeddings):
@@ -20,9 +50,35 @@ class OpenAIEmbeddingsDirect(LangChainEmbeddings):
     vector stores while delegating to OpenAI's embeddings API.
     """
 
-    def __init__(self, model: str = "text-embedding-3-small") -> None:
+    def __init__(
+        self,
+        model: str = "text-embedding-3-small",
+        cache: Optional[EmbeddingCache] = None,
+    ) -> None:
         self.client = OpenAI()
+        self.async_client = AsyncOpenAI()
         self.model = model
+        self.cache = cache
+
+        # Document batches skip the SDK's own retries so throttling reaches the
+        # adaptive concurrency controller instead of being retried blindly
+        self.batch_client = OpenAI(
+            max_retries=0,
+            timeout=float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "60")),
+        )
+        self.batch_max_tokens = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "20000"))
+        self.batch_max_items = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "2048"))
+        self.max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+        self.concurrency = AdaptiveConcurrency(
+            initial=int(os.getenv("EMBEDDING_CONCURRENCY", "4")),
+            maximum=int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "16")),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency.maximum, thread_name_prefix="embeddings"
+        )
+        self.query_batcher = QueryEmbeddingBatcher.from_env(
+            self._embed_queries, self._aembed_queries
+        )
 
     def _sanitize_text(self, text: str) -> str:
         # Cleans the text to remove null characters and strip whitespace
@@ -36,29 +92,182 @@ class OpenAIEmbeddingsDirect(LangChainEmbeddings):
         return cleaned
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embeddings, _ = self.embed_documents_with_stats(texts)
+        return embeddings
+
+    def embed_documents_with_stats(
+        self,
+        texts: List[str],
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[List[List[float]], Dict[str, int]]:
+        """Embed texts, serving repeated (model, text) pairs from the embedding cache.
+
+        Args:
+            texts: Texts to embed
+            progress: Optional callback receiving the number of texts embedded so far
+
+        Returns:
+            Tuple of (embeddings in input order, {"hits", "misses"} cache counters)
+        """
         cleaned_texts = [self._sanitize_text(t) for t in texts]
+        if self.cache is None:
+            return self._embed_batches(cleaned_texts, progress), {
+                "hits": 0,
+                "misses": len(cleaned_texts),
+            }
+
+        keys = [EmbeddingCache.key(self.model, t) for t in cleaned_texts]
+        cached = self.cache.get_many(keys)
+
+        # Only send each distinct uncached text once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, cleaned_texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key not in missing)
+        if missing:
+            fresh = self._embed_batches(
+                list(missing.values()),
+                (lambda done: progress(hits + done)) if progress else None,
+            )
+            new_items = list(zip(missing.keys(), fresh))
+            self.cache.put_many(new_items)
+            cached.update(new_items)
+        if progress:
+            progress(len(keys))
+
+        return [cached[key] for key in keys], {
+            "hits": hits,
+            "misses": len(keys) - hits,
+        }
+
+    def _plan_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Split texts into contiguous [start, end) ranges under the token budget."""
+        batches: List[Tuple[int, int]] = []
+        start = 0
+        tokens = 0
+        for idx, text in enumerate(texts):
+            needed = estimate_tokens(text)
+            if idx > start and (
+                tokens + needed > self.batch_max_tokens
+                or idx - start >= self.batch_max_items
+            ):
+                batches.append((start, idx))
+                start = idx
+                tokens = 0
+            tokens += needed
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> float:
+        # Honour the provider's Retry-After when present, otherwise back off exponentially
+        response = getattr(exc, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        try:
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+        return min(30.0, 0.5 * (2**attempt)) * (0.5 + random.random())
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            try:
+                response = self.batch_client.embeddings.create(
+                    model=self.model, input=batch
+                )
+            except (RateLimitError, APITimeoutError) as exc:
+                self.concurrency.release(throttled=True)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(exc, attempt)
+                logging.warning(
+                    "[OpenAIEmbeddingsDirect] %s; retrying in %.2fs (concurrency=%d)",
+                    type(exc).__name__,
+                    delay,
+                    self.concurrency.limit,
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                self.concurrency.release()
+                raise
+            self.concurrency.release()
+            return [item.embedding for item in response.data]
+
+    def _embed_batches(
+        self,
+        cleaned_texts: List[str],
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> List[List[float]]:
+        # Token-budgeted batches run concurrently; results are reassembled in input order
+        batches = self._plan_batches(cleaned_texts)
+        if len(batches) <= 1:
+            embeddings = self._embed_batch(cleaned_texts) if cleaned_texts else []
+            if progress:
+                progress(len(embeddings))
+            return embeddings
+        futures = {
+            self._executor.submit(self._embed_batch, cleaned_texts[start:end]): (
+                start,
+                end,
+            )
+            for start, end in batches
+        }
+        embedded = 0
+        for future in as_completed(futures):
+            future.result()
+            start, end = futures[future]
+            embedded += end - start
+            if progress:
+                progress(embedded)
         all_embeddings: List[List[float]] = []
-        batch_size = 64
-        # Send the text to the embeddings model in batches of 64
-        for start in range(0, len(cleaned_texts), batch_size):
-            batch = cleaned_texts[start : start + batch_size]
-            response = self.client.embeddings.create(model=self.model, input=batch)
-            all_embeddings.extend([item.embedding for item in response.data])
+        for future in futures:
+            all_embeddings.extend(future.result())
         return all_embeddings
 
     def embed_query(self, text: str) -> List[float]:
-        # Embeds a single query string
-        response = self.client.embeddings.create(
-            model=self.model, input=self._sanitize_text(text)
+        # Concurrent queries share one embeddings call through the batcher
+        return self.query_batcher.embed(self._sanitize_text(text))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Async path: awaits the shared batch instead of blocking a thread
+        return await self.query_batcher.aembed(self._sanitize_text(text))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries at once, for bulk workloads.
+
+        Queries go through the same token-bounded, concurrent batches as
+        document chunks instead of the query batcher, and bypass the chunk
+        embedding cache.
+        """
+        return self._embed_batches([self._sanitize_text(t) for t in texts])
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in response.data]
+
+    async def _aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        response = await self.async_client.embeddings.create(
+            model=self.model, input=texts
         )
-        return response.data[0].embedding
+        return [item.embedding for item in response.data]
+
+
+RETRIEVAL_MODES = ("auto", "dense", "lexical", "hybrid")
 
 
 class EmbeddingsService:
     def __init__(self):
         """Service responsible for generating and persisting embeddings using FAISS."""
 
-        # Where to persist the FAISS index
+        # Where to persist the FAISS segments
         self.index_path = "./vector_store"
         os.makedirs(self.index_path, exist_ok=True)
 
@@ -66,175 +275,507 @@ class EmbeddingsService:
         embedding_model_name = os.getenv(
             "OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"
         )
-        self.embeddings = OpenAIEmbeddingsDirect(model=embedding_model_name)
-
-        # Try loading an existing FAISS index if present
-        if any(fname.endswith(".faiss") for fname in os.listdir(self.index_path)):
-            # allow_dangerous_deserialization=True is required when running inside Docker/
-            # constrained environments where pickle safety checks are strict.
-            logging.info(
-                f"[EmbeddingsService] Loading existing FAISS index from {self.index_path}"
-            )
-            self.vector_store = FAISS.load_local(
-                self.index_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True,
+        # Content-addressed cache so repeated chunks are never embedded twice
+        embedding_cache = None
+        if os.getenv("EMBEDDING_CACHE", "true").lower() in ("1", "true", "yes"):
+            embedding_cache = EmbeddingCache(
+                os.getenv(
+                    "EMBEDDING_CACHE_PATH",
+                    os.path.join(self.index_path, "embedding_cache.sqlite"),
+                )
             )
+        self.embeddings = OpenAIEmbeddingsDirect(
+            model=embedding_model_name, cache=embedding_cache
+        )
+
+        # Loaded segments, shared by every request in this process
+        self.index_cache = IndexCache.from_env()
+        preload_on_ingest = os.getenv("INDEX_CACHE_PRELOAD", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+
+        # Segmented, memory-mapped vector store (older layouts: see migrate_vector_store)
+        shard_urls = [
+            url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()
+        ]
+        if shard_urls:
+            # Partitions searched by separate shard servers (see shard_server.py)
+            self.store = PartitionedVectorStore.from_env(self.index_path, shard_urls)
         else:
-            self.vector_store = None
+            self.store = SegmentedVectorStore.from_env(
+                self.index_path, self.index_cache, preload_on_ingest
+            )
+
+        # Per-document summary vectors that prune which documents a query visits
+        self.router = DocumentRouter.from_env(self.index_path)
+        missing = [d for d in self.store.document_ids() if not self.router.has(d)]
+        if missing:
+            # Documents indexed before routing existed are searched in full until then
+            threading.Thread(
+                target=self._backfill_routing,
+                args=(missing,),
+                name="routing-backfill",
+                daemon=True,
+            ).start()
+
+        # Page text extraction, parallel above PDF_PARALLEL_MIN_PAGES pages
+        self.page_extractor = PageExtractor.from_env()
+
+        # Ingestion pipeline: chunk batches embedded concurrently per document
+        self.pipeline_depth = max(1, int(os.getenv("INGEST_PIPELINE_DEPTH", "4")))
+        self._pipeline_executor = ThreadPoolExecutor(
+            max_workers=self.pipeline_depth, thread_name_prefix="ingest-embed"
+        )
+
+        # Default retrieval mode: dense, lexical, hybrid or (opt-in) auto
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "dense").lower()
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported RETRIEVAL_MODE: {self.retrieval_mode}")
 
         # Document splitter configuration
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1400,
-            chunk_overlap=300,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len,
         )
 
-    def process_pdf(self, file_content: bytes, filename: str) -> Dict:
-        """Process one PDF file and persist its own FAISS index under a file-specific folder.
+    def process_pdf(
+        self,
+        source: PdfSource,
+        filename: str,
+        progress: Optional[Callable[..., None]] = None,
+    ) -> Dict:
+        """Process one PDF file and append its chunks to the segmented vector store.
+
+        Documents are identified by name and fingerprinted by content: an
+        unchanged re-upload is skipped, identical content under a new name is
+        copied without embedding, and a revised file only re-indexes the pages
+        whose content hash changed.
+
+        Pages are parsed, split, embedded and written to the new segment as a
+        pipeline (see `_index_pages`), so memory use does not grow with the
+        size of the document.
 
         Args:
-            file_content: Bytes content of the PDF file
+            source: Path of the PDF file (e.g. a spooled upload) or its bytes
+            filename: Original filename, used to derive the document_id
+            progress: Optional callback `progress(stage=None, **counters)` receiving
+                the current stage and pages_parsed/chunks_embedded/index_saved counters
 
         Returns:
             Dict containing processing statistics
         """
-        # Derive a deterministic folder name from the incoming filename
+        # Derive a deterministic document_id from the incoming filename
         stem = os.path.splitext(os.path.basename(filename))[0]
         stem = stem.strip().lower()
         stem = re.sub(r"[^a-z0-9._-]+", "_", stem) or "document"
-        doc_dir = os.path.join(self.index_path, stem)
 
-        # If this document was already processed, skip
-        existing_faiss = os.path.join(doc_dir, "index.faiss")
-        existing_meta = os.path.join(doc_dir, "index.pkl")
-        if os.path.exists(existing_faiss) and os.path.exists(existing_meta):
+        report = progress or (lambda stage=None, **counters: None)
+        with stage_timer("ingest", "hash"):
+            content_hash = _sha256(source)
+        self.refresh()
+        info = self.store.document_info(stem)
+
+        # Same name and same bytes: nothing to do
+        if info is not None and info.get("content_hash") == content_hash:
             return {
-                "message": "Document already indexed; skipping",
+                "message": "Document already indexed with identical content; skipping",
                 "skipped": True,
                 "document_id": stem,
-                "index_path": doc_dir,
+                "version": info.get("version", 1),
+                "content_hash": content_hash,
+                "index_path": self.store.segments_path,
                 "documents_indexed": 0,
                 "total_chunks": 0,
             }
 
-        # Read PDF bytes with PyPDF2
-        reader = PdfReader(BytesIO(file_content))
-        docs: List[Document] = []
-        for idx, page in enumerate(reader.pages):
-            try:
-                text = page.extract_text() or ""
-            except Exception:
-                text = ""
-            docs.append(Document(page_content=text, metadata={"page": idx + 1}))
+        # Same bytes under a new name: copy the stored vectors instead of re-embedding
+        copy_source = (
+            self.store.find_by_content_hash(content_hash) if info is None else None
+        )
+        if copy_source is not None:
+            report("saving")
+            source_info = self.store.document_info(copy_source)
+            with stage_timer("ingest", "save"):
+                segment_id = self.store.copy_document(
+                    copy_source,
+                    stem,
+                    {
+                        "content_hash": content_hash,
+                        "page_hashes": source_info["page_hashes"],
+                    },
+                )
+            self._update_routing(stem)
+            report(index_saved=True)
+            return {
+                "message": f"Identical content already indexed as {copy_source}; copied",
+                "skipped": False,
+                "document_id": stem,
+                "copied_from": copy_source,
+                "version": 1,
+                "content_hash": content_hash,
+                "documents_indexed": len(source_info["page_hashes"]),
+                "total_chunks": source_info["chunks"],
+                "pages_reindexed": 0,
+                "index_path": self.store.segment_path(segment_id),
+                "embedding_cache": {"hits": 0, "misses": 0},
+            }
 
-        # Split and filter empty
-        chunks = self.text_splitter.split_documents(docs)
-        chunks = [d for d in chunks if d.page_content and d.page_content.strip()]
+        # Diff page content hashes against the indexed version
+        report("parsing")
+        with stage_timer("ingest", "hash_pages"):
+            page_hashes = self.page_extractor.page_hashes(source)
+        fingerprint = {"content_hash": content_hash, "page_hashes": page_hashes}
+        if info is None:
+            replaced = set(range(1, len(page_hashes) + 1))
+        elif info.get("page_hashes") is None:
+            # Indexed before page hashes existed: replace every page
+            replaced = set(range(1, len(page_hashes) + 1))
+            replaced |= set(self.store.document_pages(stem))
+        else:
+            old_hashes = info["page_hashes"]
+            replaced = {
+                idx + 1
+                for idx, page_hash in enumerate(page_hashes)
+                if idx >= len(old_hashes) or old_hashes[idx] != page_hash
+            }
+            replaced |= set(range(len(page_hashes) + 1, len(old_hashes) + 1))
 
-        # DEBUG: visualize chunks
-        logging.info(f"[EmbeddingsService] Total pages loaded: {len(docs)}")
-        logging.info(f"[EmbeddingsService] Total non-empty chunks: {len(chunks)}")
+        # Read only the new or changed pages, streaming them into a new segment
+        indices = sorted(page - 1 for page in replaced if page <= len(page_hashes))
+        writer = self.store.begin_segment(stem)
+        try:
+            cache_stats = self._index_pages(source, stem, indices, writer, report)
+        except BaseException:
+            self.store.discard_segment(writer)
+            raise
+        chunks_total = writer.rows
 
+        logging.info(
+            f"[EmbeddingsService] {stem}: {len(indices)}/{len(page_hashes)} pages "
+            f"indexed, {chunks_total} non-empty chunks"
+        )
 
-        # If nothing extracted, return early
-        if not chunks:
+        # If nothing extracted from a new document, return early
+        if info is None and not chunks_total:
+            self.store.discard_segment(writer)
             return {
-                "documents_indexed": len(docs),
+                "documents_indexed": len(indices),
                 "total_chunks": 0,
                 "index_path": self.index_path,
             }
 
-        # Store in a dedicated FAISS index for this document
-        local_store = FAISS.from_documents(chunks, self.embeddings)
-        os.makedirs(doc_dir, exist_ok=True)
-        local_store.save_local(doc_dir)
+        report("saving")
+        with stage_timer("ingest", "save"):
+            if info is None:
+                # Above version 1 if a concurrent upload of the same name won
+                segment_id = self.store.commit_document(stem, writer, fingerprint)
+            else:
+                segment_id = self.store.commit_pages(
+                    stem,
+                    replaced,
+                    writer,
+                    fingerprint,
+                    base_version=info.get("version", 1),
+                )
+            version = self.store.document_info(stem)["version"]
+        self._update_routing(stem)
+        report(index_saved=True)
 
         return {
-            "message": "Document processed successfully",
+            "message": (
+                "Document processed successfully"
+                if info is None
+                else f"Document updated; re-indexed {len(replaced)} changed pages"
+            ),
             "skipped": False,
             "document_id": stem,
-            "documents_indexed": len(docs),
-            "total_chunks": len(chunks),
-            "index_path": doc_dir,
+            "version": version,
+            "content_hash": content_hash,
+            "documents_indexed": len(page_hashes),
+            "pages_reindexed": len(replaced),
+            "total_chunks": chunks_total,
+            "index_path": (
+                self.store.segment_path(segment_id)
+                if segment_id is not None
+                else self.store.segments_path
+            ),
+            "embedding_cache": cache_stats,
         }
 
+    def _index_pages(
+        self,
+        source: PdfSource,
+        document_id: str,
+        indices: List[int],
+        writer: SegmentWriter,
+        report: Callable[..., None],
+    ) -> Dict[str, int]:
+        """Parse, split, embed and write pages to `writer` as a bounded pipeline.
+
+        Page text comes from the extractor (a process pool for large files)
+        and is split in this thread. Chunks are grouped into token-budgeted
+        batches, up to `pipeline_depth` batches are embedded concurrently
+        while the next pages are parsed, and embedded batches are appended to
+        the segment in page order. Only the extractor's prefetch window and
+        the in-flight batches are held in memory.
+
+        Returns:
+            {"hits", "misses"} embedding cache counters
+        """
+        seconds = {"parse": 0.0, "split": 0.0, "embed": 0.0, "write": 0.0}
+        cache_stats = {"hits": 0, "misses": 0}
+        in_flight: Deque[Tuple[Future, List[str], List[Dict[str, Any]]]] = deque()
+        embedded = 0
+
+        def embed(texts: List[str]) -> Tuple[np.ndarray, Dict[str, int], float]:
+            started = time.perf_counter()
+            vectors, stats = self.embeddings.embed_documents_with_stats(texts)
+            matrix = np.asarray(vectors, dtype=np.float32)
+            return matrix, stats, time.perf_counter() - started
+
+        def write_oldest() -> None:
+            nonlocal embedded
+            future, texts, metadatas = in_flight.popleft()
+            vectors, stats, embed_seconds = future.result()
+            seconds["embed"] += embed_seconds
+            for key in cache_stats:
+                cache_stats[key] += stats[key]
+            started = time.perf_counter()
+            writer.add(texts, vectors, metadatas)
+            seconds["write"] += time.perf_counter() - started
+            embedded += len(texts)
+            report(chunks_embedded=embedded)
+
+        def submit(texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+            # Backpressure: wait for the oldest batch before exceeding the depth
+            while len(in_flight) >= self.pipeline_depth:
+                write_oldest()
+            in_flight.append(
+                (self._pipeline_executor.submit(embed, texts), texts, metadatas)
+            )
+
+        max_tokens = self.embeddings.batch_max_tokens
+        max_items = self.embeddings.batch_max_items
+        batch_texts: List[str] = []
+        batch_metadatas: List[Dict[str, Any]] = []
+        batch_tokens = 0
+        chunks_total = 0
+        pages = self.page_extractor.iter_texts(
+            source,
+            lambda done, total: report(pages_parsed=done, pages_total=total),
+            pages=indices,
+        )
+        try:
+            for idx in indices:
+                started = time.perf_counter()
+                text = next(pages)
+                seconds["parse"] += time.perf_counter() - started
+
+                started = time.perf_counter()
+                chunks = [
+                    chunk
+                    for chunk in self.text_splitter.split_text(text)
+                    if chunk and chunk.strip()
+                ]
+                seconds["split"] += time.perf_counter() - started
+                for chunk in chunks:
+                    tokens = estimate_tokens(chunk)
+                    if batch_texts and (
+                        batch_tokens + tokens > max_tokens
+                        or len(batch_texts) >= max_items
+                    ):
+                        submit(batch_texts, batch_metadatas)
+                        batch_texts, batch_metadatas, batch_tokens = [], [], 0
+                    batch_texts.append(chunk)
+                    batch_metadatas.append(
+                        {"document_id": document_id, "page": idx + 1}
+                    )
+                    batch_tokens += tokens
+                chunks_total += len(chunks)
+
+            report("embedding", chunks_total=chunks_total)
+            if batch_texts:
+                submit(batch_texts, batch_metadatas)
+            while in_flight:
+                write_oldest()
+        finally:
+            pages.close()
+            for future, _, _ in in_flight:
+                future.cancel()
+
+        for stage, value in seconds.items():
+            record_stage("ingest", stage, value)
+        return cache_stats
+
+    def _update_routing(self, document_id: str) -> None:
+        """Rebuild a document's routing vectors from its indexed chunks."""
+        try:
+            with stage_timer("ingest", "route"):
+                info = self.store.document_info(document_id)
+                self.router.update(
+                    document_id,
+                    self.store.iter_document_vectors(document_id),
+                    info["chunks"] if info else 0,
+                )
+        except Exception:
+            # A document without routing vectors is always searched, never missed
+            logging.exception(
+                f"[EmbeddingsService] routing vectors of {document_id} not updated"
+            )
+            self.router.remove(document_id)
+
+    def _backfill_routing(self, document_ids: List[str]) -> None:
+        for document_id in document_ids:
+            # Other worker processes backfill the same documents at startup
+            self.router.refresh()
+            if self.store.has_document(document_id) and not self.router.has(
+                document_id
+            ):
+                self._update_routing(document_id)
+        logging.info(
+            f"[EmbeddingsService] built routing vectors of {len(document_ids)} documents"
+        )
+
+    def refresh(self) -> None:
+        """Pick up documents indexed or merged by other worker processes.
+
+        One stat of the manifest and one of the routing directory when
+        nothing changed.
+        """
+        self.store.refresh()
+        self.router.refresh()
+
+    def document_versions(self, document_ids: List[str]) -> Dict[str, int]:
+        """Index version of every known document among `document_ids`."""
+        self.refresh()
+        versions: Dict[str, int] = {}
+        for document_id in dict.fromkeys(document_ids or []):
+            info = self.store.document_info(document_id)
+            if info is not None:
+                versions[document_id] = info.get("version", 1)
+        return versions
+
+    def effective_mode(self, mode: Optional[str] = None) -> str:
+        """Retrieval mode a request runs in: its own, else RETRIEVAL_MODE."""
+        return (mode or self.retrieval_mode).lower()
+
+    def query_needs_embedding(self, query: str, mode: Optional[str] = None) -> bool:
+        """Whether retrieval in `mode` is expected to embed the query."""
+        mode = self.effective_mode(mode)
+        if mode == "auto":
+            return not is_identifier_query(query)
+        return mode != "lexical"
+
     def similarity_search(
         self,
         query: str,
         k: int = 5,
         document_ids: List[str] = None,
+        mode: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        """Search across stored FAISS indexes for similar chunks.
+        """Search the vector store segments for similar chunks.
 
         Args:
             query: Search query string
             k: Number of documents to return
             document_ids: Required list of document directory names (stems)
                 to restrict the search to. If empty, searches none.
+            mode: "dense" (embeddings), "lexical" (BM25, no embedding call),
+                "hybrid" (both, fused by reciprocal rank) or "auto" (lexical for
+                identifier-like queries, dense otherwise). Defaults to RETRIEVAL_MODE
 
         Returns:
             List of dicts with content and metadata: {"snippet", "document_id", "page", "score"}
         """
+        results, _ = self.similarity_search_with_stats(query, k, document_ids, mode)
+        return results
 
-        logging.info(
-            "[EmbeddingsService] similarity_search k=%s, doc_ids=%s, query='%s'",
-            k,
-            document_ids or [],
-            (query[:120] + ("…" if len(query) > 120 else "")),
-        )
+    def similarity_search_with_stats(
+        self,
+        query: str,
+        k: int = 5,
+        document_ids: List[str] = None,
+        mode: Optional[str] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Same as `similarity_search`, also returning retrieval statistics.
 
-        if not os.path.isdir(self.index_path):
-            return []
+        The query is embedded at most once and the resulting vector is reused
+        for a by-vector search against every segment holding a requested
+        document. Lexical search never calls the embeddings API.
 
-        # Build candidate entries
-        candidate_entries: List[str] = []
-        try:
-            for entry in os.listdir(self.index_path):
-                doc_dir = os.path.join(self.index_path, entry)
-                if os.path.isdir(doc_dir):
-                    candidate_entries.append(entry)
-        except Exception as exc:
-            logging.error("[EmbeddingsService] listdir failed: %s", exc)
-            candidate_entries = []
+        Args:
+            query_vector: Embedding of `query` computed by the caller, if any
 
-        # Restrict strictly to provided document_ids (empty list → search none)
-        allowed = set(document_ids or [])
-        candidate_entries = [e for e in candidate_entries if e in allowed]
-        logging.info(
-            "[EmbeddingsService] candidate_indexes=%d (%s)",
-            len(candidate_entries),
-            ", ".join(candidate_entries[:10]),
-        )
+        Returns:
+            Tuple of (results, stats) where stats holds "embedding_calls",
+            "segments_searched", the "retrieval_mode" actually used and the
+            document "routing" of the dense search (None without one)
+        """
+        mode = self.effective_mode(mode)
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported retrieval mode: {mode}")
+        stats: Dict[str, Any] = {
+            "embedding_calls": 0,
+            "segments_searched": 0,
+            "retrieval_mode": mode,
+            "routing": None,
+        }
 
-        aggregated: List = []
-        for entry in candidate_entries:
-            doc_dir = os.path.join(self.index_path, entry)
-            faiss_path = os.path.join(doc_dir, "index.faiss")
-            meta_path = os.path.join(doc_dir, "index.pkl")
-            if not (os.path.exists(faiss_path) and os.path.exists(meta_path)):
-                continue
-            try:
-                store = FAISS.load_local(
-                    doc_dir, self.embeddings, allow_dangerous_deserialization=True
-                )
-                docs_with_scores = store.similarity_search_with_score(query, k=k)
-                # Preserve the document_id (entry) with each result
-                aggregated.extend(
-                    [(entry, doc, score) for doc, score in docs_with_scores]
-                )
-                logging.info(
-                    "[EmbeddingsService] index='%s' hits=%d",
-                    entry,
-                    len(docs_with_scores),
-                )
-            except Exception as exc:
-                logging.error(
-                    f"[EmbeddingsService] Failed loading index at {doc_dir}: {exc}"
+        # Restrict strictly to provided document_ids (empty list → search none)
+        self.refresh()
+        candidate_entries = [
+            d for d in dict.fromkeys(document_ids or []) if self.store.has_document(d)
+        ]
+        if not candidate_entries:
+            return [], stats
+
+        auto = mode == "auto"
+        if auto:
+            mode = "lexical" if is_identifier_query(query) else "dense"
+        # Hybrid fuses deeper candidate lists than it returns
+        fetch_k = k * 4 if mode == "hybrid" else k
+
+        lexical_hits: List[Tuple[str, Document, float]] = []
+        if mode in ("lexical", "hybrid"):
+            with stage_timer("retrieval", "search_lexical"):
+                lexical_hits, search_stats = self.store.lexical_search(
+                    query, fetch_k, candidate_entries
                 )
+            stats.update(search_stats)
+            if auto and not lexical_hits:
+                mode = "dense"  # nothing matched the identifier: fall back
+
+        dense_hits: List[Tuple[str, Document, float]] = []
+        if mode in ("dense", "hybrid"):
+            if query_vector is None:
+                with stage_timer("retrieval", "embed_query"):
+                    query_vector = self.embeddings.embed_query(query)
+                stats["embedding_calls"] += 1
+            dense_hits, search_stats = self._dense_search(
+                query_vector, fetch_k, candidate_entries
+            )
+            stats.update(search_stats)
+
+        if mode == "hybrid":
+            by_key = {
+                _chunk_key(document_id, doc): (document_id, doc)
+                for document_id, doc, _ in dense_hits + lexical_hits
+            }
+            fused = reciprocal_rank_fusion(
+                [
+                    [_chunk_key(document_id, doc) for document_id, doc, _ in hits]
+                    for hits in (dense_hits, lexical_hits)
+                ]
+            )
+            top_k = [(*by_key[key], score) for key, score in fused[:k]]
+        else:
+            top_k = lexical_hits if mode == "lexical" else dense_hits
+        stats["retrieval_mode"] = mode
 
-        aggregated.sort(key=lambda triple: triple[2])  # ascending by score
-        top_k = aggregated[:k]
         structured: List[Dict[str, Any]] = []
         for document_id, doc, score in top_k:
             try:
@@ -252,6 +793,90 @@ class EmbeddingsService:
                     "score": float(score) if hasattr(score, "__float__") else score,
                 }
             )
-            logging.info(f"[EmbeddingsService] structured: {structured}")
 
-        return structured
+        sampled_log.log(
+            "EmbeddingsService",
+            "similarity_search",
+            k=k,
+            document_ids=candidate_entries[:10],
+            query=query[:120],
+            hits=[
+                {
+                    "document_id": r["document_id"],
+                    "page": r["page"],
+                    "score": r["score"],
+                }
+                for r in structured
+            ],
+            **stats,
+        )
+        return structured, stats
+
+    def _dense_search(
+        self, query_vector: List[float], k: int, document_ids: List[str]
+    ) -> Tuple[List[Tuple[str, Document, float]], Dict[str, Any]]:
+        """Dense top-k over the documents the router picks among `document_ids`.
+
+        A routed search that finds fewer than k chunks is repeated over every
+        document; a sample of routed searches is also run in full to measure
+        the recall lost to routing.
+        """
+        with stage_timer("retrieval", "route"):
+            routed_ids, routing = self.router.route(query_vector, document_ids, k)
+        with stage_timer("retrieval", "search_dense"):
+            hits, stats = self.store.search(query_vector, k, routed_ids)
+        pruned = len(routed_ids) < len(document_ids)
+        if pruned and len(hits) < k:
+            self.router.record_expansion(routing)
+            with stage_timer("retrieval", "search_dense"):
+                hits, stats = self.store.search(query_vector, k, document_ids)
+        elif pruned and self.router.should_audit():
+            with stage_timer("retrieval", "route_audit"):
+                exhaustive, _ = self.store.search(query_vector, k, document_ids)
+            expected = {_chunk_key(d, doc) for d, doc, _ in exhaustive}
+            found = {_chunk_key(d, doc) for d, doc, _ in hits}
+            routing["audit_recall"] = (
+                len(expected & found) / len(expected) if expected else 1.0
+            )
+            self.router.record_audit(routing["audit_recall"])
+        return hits, {**stats, "routing": routing}
+
+    async def asimilarity_search_with_stats(
+        self,
+        query: str,
+        k: int = 5,
+        document_ids: List[str] = None,
+        mode: Optional[str] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Async `similarity_search_with_stats` for the event loop.
+
+        The query is embedded with the async client, then the segment searches
+        (CPU work on memory-mapped files) run in a worker thread.
+        """
+        embedding_calls = 0
+        self.refresh()
+        has_documents = any(self.store.has_document(d) for d in document_ids or [])
+        if (
+            query_vector is None
+            and has_documents
+            and self.query_needs_embedding(query, mode)
+        ):
+            with stage_timer("retrieval", "embed_query"):
+                query_vector = await self.embeddings.aembed_query(query)
+            embedding_calls = 1
+        results, stats = await asyncio.to_thread(
+            self.similarity_search_with_stats,
+            query,
+            k,
+            document_ids,
+            mode,
+            query_vector,
+        )
+        stats["embedding_calls"] += embedding_calls
+        return results, stats
+
+
+def _chunk_key(document_id: str, doc: Document) -> str:
+    # Identifies one chunk across dense and lexical result lists
+    return f"{document_id}\x00{doc.metadata.get('page')}\x00{doc.page_content}"
@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# (provider, model)
+ModelKey = Tuple[str, str]
+
+
+class LatencyTracker:
+    """Recent call latencies per (provider, model).
+
+    Keeps the last `window` samples of each model, so percentiles follow the
+    provider's current behaviour rather than its lifetime average. Calls
+    cancelled before they finished (the losing side of a hedged question) are
+    kept as censored samples: their elapsed time is a lower bound of the real
+    latency. Dropping them would remove exactly the slowest calls and pull the
+    percentiles, and with them the hedge delay, further down with every hedge.
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        """
+        Args:
+            window: Number of recent samples kept per model
+        """
+        self.window = max(1, window)
+        # (seconds, censored) pairs
+        self._samples: Dict[ModelKey, Deque[Tuple[float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LatencyTracker":
+        return cls(window=int(os.getenv("LLM_LATENCY_WINDOW", "200")))
+
+    def observe(
+        self, provider: str, model: str, seconds: float, censored: bool = False
+    ) -> None:
+        """Record one call.
+
+        Args:
+            provider: Provider of the call
+            model: Model of the call
+            seconds: Latency, or time until cancellation when `censored`
+            censored: The call was cancelled, so `seconds` is a lower bound
+        """
+        with self._lock:
+            samples = self._samples.get((provider, model))
+            if samples is None:
+                samples = self._samples[(provider, model)] = deque(maxlen=self.window)
+            samples.append((seconds, censored))
+
+    def count(self, provider: str, model: str) -> int:
+        with self._lock:
+            return len(self._samples.get((provider, model), ()))
+
+    def censored(self, provider: str, model: str) -> int:
+        with self._lock:
+            return sum(1 for _, cut in self._samples.get((provider, model), ()) if cut)
+
+    def percentile(self, provider: str, model: str, q: float) -> Optional[float]:
+        """The `q`-th percentile (0-100) of recent latencies, or None without samples.
+
+        Censored samples count at their lower bound, so the result may
+        underestimate the true percentile but no longer ignores the slow tail.
+        """
+        with self._lock:
+            samples = sorted(
+                seconds for seconds, _ in self._samples.get((provider, model), ())
+            )
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+        return samples[rank]
+
+    def stats(self) -> Dict[ModelKey, Dict[str, float]]:
+        """Sample and censored counts and p50/p95/p99 latency (seconds) of every model."""
+        with self._lock:
+            keys = list(self._samples)
+        stats = {}
+        for provider, model in keys:
+            stats[(provider, model)] = {
+                "samples": self.count(provider, model),
+                "censored": self.censored(provider, model),
+                **{
+                    f"p{q}": self.percentile(provider, model, q) or 0.0
+                    for q in (50, 95, 99)
+                },
+            }
+        return stats
+
+
+class HedgePolicy:
+    """When and where to send a backup request for a slow answer.
+
+    A hedged question first goes to its own model; if no answer arrived after
+    the hedge delay, the same prompt is sent to the backup model as well and
+    the first valid answer wins. The delay is the `percentile` of the
+    primary model's recent latencies once `min_samples` are known (clamped to
+    `min_delay`..`max_delay`), and `delay` before that, so only the slowest
+    few percent of calls are duplicated.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        backup: Optional[Tuple[str, Optional[str]]] = None,
+        delay: float = 2.0,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        min_delay: float = 0.25,
+        max_delay: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            enabled: Hedge questions that do not say otherwise
+            backup: (provider, model) receiving the hedged request; None disables hedging
+            delay: Hedge delay in seconds until enough latencies are known
+                (and always, when `percentile` is 0)
+            percentile: Latency percentile of the primary model used as delay
+            min_samples: Samples needed before the percentile is trusted
+            min_delay: Lower bound of the percentile-based delay
+            max_delay: Upper bound of the percentile-based delay
+        """
+        self.enabled = enabled
+        self.backup = backup
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        """Build from LLM_HEDGE* variables; LLM_HEDGE_BACKUP is "provider" or "provider:model"."""
+        backup = os.getenv("LLM_HEDGE_BACKUP", "").strip()
+        provider, _, model = backup.partition(":")
+        return cls(
+            enabled=os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes"),
+            backup=(provider, model or None) if provider else None,
+            delay=float(os.getenv("LLM_HEDGE_DELAY_MS", "2000")) / 1000,
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250")) / 1000,
+            max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "30000")) / 1000,
+        )
+
+    def should_hedge(self, requested: Optional[bool]) -> bool:
+        """Whether a question hedges: its own `hedge` flag, else the default."""
+        if self.backup is None:
+            return False
+        return self.enabled if requested is None else requested
+
+    def hedge_delay(self, tracker: LatencyTracker, provider: str, model: str) -> float:
+        """Seconds to wait for `provider`/`model` before sending the backup request."""
+        if self.percentile <= 0 or tracker.count(provider, model) < self.min_samples:
+            return self.delay
+        observed = tracker.percentile(provider, model, self.percentile)
+        return min(self.max_delay, max(self.min_delay, observed))
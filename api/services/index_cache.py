@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class IndexCache:
+    """Process-wide LRU cache of loaded index segments.
+
+    Entries are keyed by segment id (e.g. "seg_00000001") and validated against
+    the modification time of the segment's segment.json, so a segment rewritten
+    on disk is reloaded on the next access. The cache is bounded by an entry
+    count and, optionally, by an estimated memory budget in bytes; least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 0) -> None:
+        """
+        Args:
+            max_entries: Maximum number of segments kept in memory (0 disables caching)
+            max_bytes: Maximum estimated memory footprint in bytes (0 means unbounded)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, partitions: int = 1) -> "IndexCache":
+        """Build from INDEX_CACHE_* variables.
+
+        Args:
+            partitions: Number of caches sharing the process budget; each gets
+                an even share of the entries (at least one) and of the bytes
+        """
+        partitions = max(1, partitions)
+        max_entries = int(os.getenv("INDEX_CACHE_MAX_ENTRIES", "64"))
+        max_bytes = int(os.getenv("INDEX_CACHE_MAX_MB", "0")) * 1024 * 1024
+        return cls(
+            max_entries=max(1, max_entries // partitions) if max_entries > 0 else 0,
+            max_bytes=max_bytes // partitions,
+        )
+
+    def get_or_load(
+        self,
+        key: str,
+        mtime: float,
+        loader: Callable[[], Any],
+        size_of: Callable[[Any], int],
+    ) -> Any:
+        """Return the cached segment for `key`, loading it when missing or stale.
+
+        Args:
+            key: Segment id
+            mtime: Current modification time of the segment on disk
+            loader: Callable that loads the segment from disk
+            size_of: Callable returning the estimated size in bytes of a segment
+
+        Returns:
+            The loaded segment
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Load outside the lock so slow disk reads do not serialize other lookups
+        store = loader()
+        self.put(key, mtime, store, size_of(store))
+        return store
+
+    def put(self, key: str, mtime: float, store: Any, size: int) -> None:
+        """Insert or replace an entry, then evict down to the configured budget."""
+        if self.max_entries <= 0:
+            return
+        if self.max_bytes and size > self.max_bytes:
+            logging.info(
+                "[IndexCache] '%s' (%d bytes) exceeds cache budget; not cached",
+                key,
+                size,
+            )
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[2]
+            self._entries[key] = (mtime, store, size)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self._total_bytes > self.max_bytes
+            ):
+                evicted_key, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+                logging.info("[IndexCache] evicted '%s'", evicted_key)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes or None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,268 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Callable, Dict, Optional
+
+# Callable(file_path, filename, progress) -> result dict
+ProcessFn = Callable[[str, str, Callable[..., None]], Dict[str, Any]]
+
+
+class IngestionJobs:
+    """Bounded background queue for document ingestion jobs.
+
+    Each uploaded file becomes one job executed on a small dedicated worker
+    pool, so large uploads neither block the request that submitted them nor
+    take threads away from `/question` traffic. Jobs report per-file progress
+    by stage while they run.
+
+    With a `state_dir`, job records are also written there as JSON, so any
+    worker process sharing the directory can report a job that another
+    worker runs.
+    """
+
+    def __init__(
+        self,
+        process_fn: ProcessFn,
+        max_workers: int = 1,
+        history: int = 500,
+        state_dir: Optional[str] = None,
+        persist_interval: float = 0.5,
+    ) -> None:
+        """
+        Args:
+            process_fn: Function that ingests one file and reports progress
+            max_workers: Number of files ingested concurrently
+            history: Number of finished jobs kept for status lookups
+            state_dir: Directory shared by worker processes for job records
+                (None keeps them in this process only)
+            persist_interval: Least seconds between writes of a job record
+                for progress counters alone; status and stage changes are
+                always written
+        """
+        self.process_fn = process_fn
+        self.history = history
+        self.state_dir = state_dir
+        self.persist_interval = persist_interval
+        self._persisted_at: Dict[str, float] = {}
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            self._prune_records()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="ingest"
+        )
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, filename: str) -> Dict[str, Any]:
+        """Queue one file (spooled to disk) for ingestion and return its job record."""
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "filename": filename,
+            "worker_pid": os.getpid(),
+            "worker_started": _process_start_time(os.getpid()),
+            "status": "queued",
+            "stage": "queued",
+            "progress": {
+                "pages_total": None,
+                "pages_parsed": 0,
+                "chunks_total": None,
+                "chunks_embedded": 0,
+                "index_saved": False,
+            },
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._persist(job_id)
+            self._trim()
+            # Run in the submitter's context so stage timings reach its request
+            self._futures[job_id] = self._executor.submit(
+                copy_context().run, self._run, job_id, file_path, filename
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return copy.deepcopy(job)
+        # Submitted to another worker process
+        return self._load_record(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Block until the job finishes and return its final record."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+        return self.get(job_id)
+
+    async def wait_async(self, job_id: str) -> Dict[str, Any]:
+        """Await the job without blocking a thread and return its final record."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            await asyncio.wrap_future(future)
+        return self.get(job_id)
+
+    def _update(self, job_id: str, stage: Optional[str] = None, **progress) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            stage_changed = stage is not None and stage != job["stage"]
+            if stage is not None:
+                job["stage"] = stage
+            job["progress"].update(progress)
+            self._persist(job_id, force=stage_changed)
+
+    def _run(self, job_id: str, file_path: str, filename: str) -> None:
+        with self._lock:
+            self._jobs[job_id]["status"] = "running"
+            self._jobs[job_id]["started_at"] = time.time()
+            self._persist(job_id)
+
+        def progress(stage: Optional[str] = None, **counters) -> None:
+            self._update(job_id, stage, **counters)
+
+        try:
+            result = self.process_fn(file_path, filename, progress)
+            status, error = "completed", None
+        except Exception as exc:
+            logging.exception("[IngestionJobs] job %s (%s) failed", job_id, filename)
+            result, status, error = None, "failed", str(exc)
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(
+                    status=status,
+                    stage="done" if status == "completed" else job["stage"],
+                    result=result,
+                    error=error,
+                    finished_at=time.time(),
+                )
+                self._persist(job_id)
+            self._futures.pop(job_id, None)
+            self._persisted_at.pop(job_id, None)
+
+    def _trim(self) -> None:
+        # Forget the oldest finished jobs beyond the history limit
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["status"] in ("completed", "failed")
+        ]
+        for job_id in finished[: max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+            self._remove_record(job_id)
+
+    def _record_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _persist(self, job_id: str, force: bool = True) -> None:
+        # Caller holds the lock
+        if self.state_dir is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._persisted_at.get(job_id, 0.0) < (
+            self.persist_interval
+        ):
+            return
+        self._persisted_at[job_id] = now
+        path = self._record_path(job_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(self._jobs[job_id], fh)
+            # Renamed into place: readers never see a half-written record
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logging.warning("[IngestionJobs] could not save job %s: %s", job_id, exc)
+
+    def _load_record(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.state_dir is None or not job_id.isalnum():
+            return None
+        try:
+            with open(self._record_path(job_id), "r", encoding="utf-8") as fh:
+                job = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if job["status"] in ("queued", "running") and not _worker_alive(
+            job.get("worker_pid"), job.get("worker_started")
+        ):
+            # The worker running it exited; the job will never finish
+            job.update(status="failed", error="Worker process exited during ingestion")
+        return job
+
+    def _remove_record(self, job_id: str) -> None:
+        if self.state_dir is None:
+            return
+        try:
+            os.remove(self._record_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _prune_records(self) -> None:
+        # Records left by earlier processes: keep the newest `history`
+        records = []
+        for entry in os.scandir(self.state_dir):
+            try:
+                records.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass  # pruned by another worker meanwhile
+        records.sort(reverse=True)
+        for _, path in records[self.history :]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _process_start_time(pid: int) -> Optional[int]:
+    """Start time of a process in clock ticks since boot, None where unknown.
+
+    Together with the PID it identifies one process: a recycled PID belongs
+    to a process started later.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as fh:
+            stat = fh.read()
+    except OSError:
+        return None
+    # Fields after the command name, which may itself contain spaces or ")"
+    fields = stat.rpartition(")")[2].split()
+    try:
+        return int(fields[19])  # field 22, starttime
+    except (IndexError, ValueError):
+        return None
+
+
+def _worker_alive(pid: Optional[int], started: Optional[int]) -> bool:
+    """Whether the process that ran a job still exists."""
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    if started is None:
+        return True  # recorded without a start time (or no /proc)
+    current = _process_start_time(pid)
+    return current is None or current == started
@@ -0,0 +1,244 @@
+"""BM25 inverted index stored next to each segment's vectors.
+
+Dense retrieval needs an embedding round trip per query and is weak on exact
+identifiers (clause numbers, part codes). Each segment therefore also keeps a
+small pickle-free inverted index over the same chunks:
+
+    lexicon.json      sorted vocabulary
+    lex_offsets.npy   int64 start of each term's postings (terms + 1)
+    lex_rows.npy      int32 row of every posting, grouped by term
+    lex_tf.npy        uint16 term frequency of every posting
+    lex_lengths.npy   int32 token count of every row
+"""
+
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Words and identifiers such as "12.3.1", "px-2200" or "a/b"; compounds also
+# yield their parts so "clause 12" still matches "12.3"
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+SPLIT_RE = re.compile(r"[._/-]")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+LEXICAL_FILES = (
+    "lexicon.json",
+    "lex_offsets.npy",
+    "lex_rows.npy",
+    "lex_tf.npy",
+    "lex_lengths.npy",
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if len(token) > 1 and SPLIT_RE.search(token):
+            tokens.extend(part for part in SPLIT_RE.split(token) if part)
+    return tokens
+
+
+def query_tokens(text: str, index: Optional["LexicalIndex"]) -> List[str]:
+    """Tokens of a query against one index, split into parts only where needed.
+
+    A compound such as "px-2200" that is in the index matches exactly; its
+    parts ("px", "2200") would match almost every row of a corpus full of
+    part codes and add nothing but cost. Compounds missing from the index
+    fall back to their parts, as when indexing.
+    """
+    vocabulary = index.term_ids if index is not None else {}
+    tokens: List[str] = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if len(token) > 1 and SPLIT_RE.search(token) and token not in vocabulary:
+            tokens.extend(part for part in SPLIT_RE.split(token) if part)
+    return tokens
+
+
+def is_identifier_query(query: str, max_words: int = 4) -> bool:
+    """Short queries containing a code-like word (a digit, or a joined compound)."""
+    words = query.split()
+    if not words or len(words) > max_words:
+        return False
+    return any(
+        re.search(r"\d", word) or re.search(r"\w[._/-]\w", word) for word in words
+    )
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = RRF_K
+) -> List[Tuple[str, float]]:
+    """Fuse several rankings of keys into one: score = sum(1 / (k + rank)).
+
+    Returns:
+        List of (key, fused score) sorted by descending score
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def bm25_idf(n_rows: int, df: np.ndarray) -> np.ndarray:
+    return np.log1p((n_rows - df + 0.5) / (df + 0.5))
+
+
+class LexicalIndex:
+    """Read-side of a segment's inverted index."""
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tf: np.ndarray,
+        lengths: np.ndarray,
+    ) -> None:
+        self.term_ids = {term: idx for idx, term in enumerate(terms)}
+        # np.asarray drops the np.memmap subclass but keeps the mapping
+        self.offsets = np.asarray(offsets)
+        self.rows = np.asarray(rows)
+        self.tf = np.asarray(tf)
+        self.lengths = np.asarray(lengths)
+        self.total_length = int(lengths.sum())
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        return cls(*_build_arrays(texts))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        """Memory-map a segment's index; None for segments written without one."""
+        if not all(os.path.exists(os.path.join(path, f)) for f in LEXICAL_FILES):
+            return None
+        with open(os.path.join(path, "lexicon.json"), "r", encoding="utf-8") as fh:
+            terms = json.load(fh)
+        arrays = [
+            np.load(os.path.join(path, name), mmap_mode="r")
+            for name in LEXICAL_FILES[1:]
+        ]
+        return cls(terms, *arrays)
+
+    def document_frequencies(self, tokens: List[str]) -> np.ndarray:
+        ids = [self.term_ids.get(token) for token in tokens]
+        return np.array(
+            [
+                0 if idx is None else int(self.offsets[idx + 1] - self.offsets[idx])
+                for idx in ids
+            ],
+            dtype=np.float64,
+        )
+
+    def scores(
+        self,
+        tokens: List[str],
+        idf: np.ndarray,
+        avg_length: float,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 score of every row matching at least one token.
+
+        Args:
+            tokens: Query tokens (duplicates count once per occurrence)
+            idf: Corpus-wide inverse document frequency of each token
+            avg_length: Corpus-wide average row length in tokens
+            allowed: Rows that may match (None allows every row); postings of
+                other rows are dropped before scoring
+
+        Returns:
+            Tuple of (row positions ascending, their float64 scores)
+        """
+        mask = None
+        if allowed is not None:
+            mask = np.zeros(len(self.lengths), dtype=bool)
+            mask[allowed] = True
+        matched_rows: List[np.ndarray] = []
+        contributions: List[np.ndarray] = []
+        for token, token_idf in zip(tokens, idf):
+            idx = self.term_ids.get(token)
+            if idx is None:
+                continue
+            start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+            rows = np.asarray(self.rows[start:end])
+            tf = np.asarray(self.tf[start:end], dtype=np.float64)
+            if mask is not None:
+                keep = mask[rows]
+                rows, tf = rows[keep], tf[keep]
+            if not len(rows):
+                continue
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * np.asarray(self.lengths[rows]) / avg_length
+            )
+            matched_rows.append(rows)
+            contributions.append(token_idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not matched_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        # Sum the contributions of each row over every query token
+        rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(contributions))
+
+
+def _build_arrays(
+    texts: Iterable[str],
+) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Compact typed arrays: postings grow with the segment, Python lists of
+    # ints would cost several times more memory
+    vocabulary: Dict[str, int] = {}
+    posting_terms = array("q")
+    posting_rows = array("i")
+    posting_tf = array("H")
+    lengths = array("i")
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for token, count in Counter(tokens).items():
+            posting_terms.append(vocabulary.setdefault(token, len(vocabulary)))
+            posting_rows.append(row)
+            posting_tf.append(min(count, 65535))
+
+    # Renumber terms alphabetically and group postings by term
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+    term_column = rank[np.frombuffer(posting_terms, dtype=np.int64)]
+    order = np.argsort(term_column, kind="stable")
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_column, minlength=len(terms)), out=offsets[1:])
+    return (
+        terms,
+        offsets,
+        np.frombuffer(posting_rows, dtype=np.int32)[order],
+        np.frombuffer(posting_tf, dtype=np.uint16)[order],
+        np.frombuffer(lengths, dtype=np.int32).copy(),
+    )
+
+
+def write_lexical_index(path: str, texts: Iterable[str]) -> None:
+    """Build and persist the inverted index of a segment's chunk texts."""
+    terms, offsets, rows, tf, lengths = _build_arrays(texts)
+    with open(os.path.join(path, "lexicon.json"), "w", encoding="utf-8") as fh:
+        json.dump(terms, fh)
+    for name, values in zip(LEXICAL_FILES[1:], (offsets, rows, tf, lengths)):
+        np.save(os.path.join(path, name), values)
+
+
+def corpus_idf(
+    indexes: List[LexicalIndex], tokens: List[str]
+) -> Tuple[np.ndarray, float]:
+    """Inverse document frequencies and average row length across segments."""
+    n_rows = sum(len(index.lengths) for index in indexes)
+    if n_rows == 0:
+        return np.zeros(len(tokens)), 1.0
+    df = sum(index.document_frequencies(tokens) for index in indexes)
+    avg_length = max(1.0, sum(index.total_length for index in indexes) / n_rows)
+    return bm25_idf(n_rows, df), avg_length
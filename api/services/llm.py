@@ -1,23 +1,52 @@
+import asyncio
+import json
 import logging
 import os
 import re
-from typing import Dict, List
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
+import httpx
 from langchain_core.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
+from services.hedging import LatencyTracker
+from services.metrics import metrics, record_stage, sampled_log, stage_timer
+
+NO_CONTEXT_ANSWER = "No relevant context found in the documents. Please try a different question or upload relevant documents."
+
+metrics.describe(
+    "rag_llm_hedged_answers_total",
+    "Hedged questions by the model whose answer was used (primary or backup)",
+)
 
 
 class LLMService:
-    def __init__(self, llm_provider: str = "openai", model: str | None = None):
+    DEFAULT_MODELS = {"openai": "gpt-4.1-mini", "gemini": "gemini-2.0-flash-lite"}
+
+    def __init__(
+        self,
+        llm_provider: str = "openai",
+        model: str | None = None,
+        http_client: Optional[httpx.Client] = None,
+        http_async_client: Optional[httpx.AsyncClient] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+    ):
         """Initialize LLM service with specified provider
 
         Args:
             llm_provider: The LLM provider to use ('openai', 'gemini')
             model: Optional model name override to use for the given provider
+            http_client: Optional shared HTTP client (connection pool) for OpenAI
+            http_async_client: Optional shared async HTTP client for OpenAI
+            latency_tracker: Optional tracker receiving the latency of every answer,
+                and of cancelled calls as censored samples
         """
         self.provider = llm_provider
         self.model = model
+        self.http_client = http_client
+        self.http_async_client = http_async_client
+        self.latency_tracker = latency_tracker
         self.llm = self._get_llm(llm_provider)
 
         self.prompt_template = PromptTemplate(
@@ -34,6 +63,20 @@ class LLMService:
             input_variables=["context", "question"],
         )
 
+        # Streaming answers are plain text: a strict JSON blob cannot be parsed
+        # until it is complete, so citations are sent separately instead
+        self.stream_prompt_template = PromptTemplate(
+            template=(
+                "You are a helpful assistant. Use ONLY the provided context to answer.\n"
+                "If you did not find exactly the answer on the context, summarize the information you found."
+                "If the answer is not in the context, say you cannot answer from the context.\n\n"
+                "Answer in plain text. Do not include JSON, markdown code fences, or a list of citations.\n\n"
+                "Context (each item may include document_id and page metadata):\n{context}\n\n"
+                "Answer the following question: {question}\n"
+            ),
+            input_variables=["context", "question"],
+        )
+
     def _get_llm(self, provider: str):
         """Get LLM instance based on provider
 
@@ -43,31 +86,56 @@ class LLMService:
 
         if provider == "openai":
             return ChatOpenAI(
-                model=self.model or "gpt-4.1-mini",
+                model=self.model or self.DEFAULT_MODELS["openai"],
                 temperature=0,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
             )
         elif provider == "gemini":
             return ChatGoogleGenerativeAI(
-                model=self.model or "gemini-2.0-flash-lite",
+                model=self.model or self.DEFAULT_MODELS["gemini"],
                 google_api_key=os.getenv("GOOGLE_API_KEY"),
                 temperature=0,
             )
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
-    def _safe_parse_json(self, content: str) -> Dict:
-        """Parse JSON from the model content, with minimal cleanup."""
-        import json
-
+    @staticmethod
+    def _strip_fences(content: str) -> str:
         text = content.strip()
         # Remove common fence wrappers if provider adds them
         text = re.sub(r"^```(json)?", "", text).strip()
-        text = re.sub(r"```$", "", text).strip()
+        return re.sub(r"```$", "", text).strip()
+
+    def _parse_json(self, content: str) -> Optional[Dict]:
+        """The JSON object in the model content, or None if there is none."""
         try:
-            return json.loads(text)
+            parsed = json.loads(self._strip_fences(content))
         except Exception:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    def _safe_parse_json(self, content: str) -> Dict:
+        """Parse JSON from the model content, with minimal cleanup."""
+        parsed = self._parse_json(content)
+        if parsed is None:
             logging.warning("Falling back to plain answer due to JSON parse error")
-            return {"answer": text, "references": ""}
+            return {"answer": self._strip_fences(content), "references": ""}
+        return parsed
+
+    def _format_context(self, relevant_docs: List) -> str:
+        # If we received structured retrieval results, extract text for context
+        if relevant_docs and isinstance(relevant_docs[0], dict):
+            # Include minimal metadata with each snippet so the model can cite it
+            def format_context(d: Dict) -> str:
+                doc_id = d.get("document_id")
+                page = d.get("page")
+                score = d.get("score")
+                snippet = d.get("snippet", "")
+                return f"[doc={doc_id} page={page} score={score}]\n{snippet}"
+
+            return "\n\n".join([format_context(d) for d in relevant_docs])
+        return "\n\n".join(relevant_docs)
 
     def generate_answer(self, question: str, relevant_docs: List[str]) -> Dict:
         """Generate answer based on question and relevant documents
@@ -80,46 +148,178 @@ class LLMService:
             Dict containing answer and sources
         """
         if not relevant_docs:
-            return {
-                "answer": "No relevant context found in the documents. Please try a different question or upload relevant documents.",
-                "references": "",
-            }
+            return {"answer": NO_CONTEXT_ANSWER, "references": ""}
 
-        # If we received structured retrieval results, extract text for context
-        if relevant_docs and isinstance(relevant_docs[0], dict):
-            # Include minimal metadata with each snippet so the model can cite it
-            def format_context(d: Dict) -> str:
-                doc_id = d.get("document_id")
-                page = d.get("page")
-                score = d.get("score")
-                snippet = d.get("snippet", "")
-                return f"[doc={doc_id} page={page} score={score}]\n{snippet}"
+        # Get response from LLM
+        prompt = self._answer_prompt(question, relevant_docs)
+        started = time.perf_counter()
+        response = self.llm.invoke(prompt)
+        self._observe_latency(time.perf_counter() - started)
+        return self._parse_answer(response.content, relevant_docs)
 
-            context = "\n\n".join([format_context(d) for d in relevant_docs])
-        else:
-            context = "\n\n".join(relevant_docs)
+    async def agenerate_answer(self, question: str, relevant_docs: List) -> Dict:
+        """Async `generate_answer`: awaits the provider without holding a thread."""
+        if not relevant_docs:
+            return {"answer": NO_CONTEXT_ANSWER, "references": ""}
 
-        # Generate prompt
-        prompt = self.prompt_template.format(context=context, question=question)
+        prompt = self._answer_prompt(question, relevant_docs)
+        content = await self._ainvoke(prompt)
+        return self._parse_answer(content, relevant_docs)
 
-        # Get response from LLM
-        response = self.llm.invoke(prompt)
-        parsed = self._safe_parse_json(response.content)
-        logging.info(
-            "[LLMService] parsed keys=%s answer_len=%s refs_len=%s citations=%s",
-            list(parsed.keys()),
-            (
-                len(parsed.get("answer", ""))
-                if isinstance(parsed.get("answer"), str)
-                else None
-            ),
-            (
-                len(parsed.get("references", ""))
-                if isinstance(parsed.get("references"), str)
-                else None
+    async def agenerate_hedged(
+        self,
+        question: str,
+        relevant_docs: List,
+        backup: "LLMService",
+        delay: float,
+    ) -> Tuple[Dict, Dict[str, Any]]:
+        """`agenerate_answer` with a backup request if this model is slow.
+
+        The prompt goes to this model first. If no answer arrived after `delay`
+        seconds, or this model failed or returned invalid JSON, the same prompt
+        is also sent to `backup`. The first valid JSON answer wins and the
+        other request is cancelled; if neither is valid, the first plain-text
+        answer is used, and if both failed the first error is raised.
+
+        Args:
+            question: User's question
+            relevant_docs: Structured retrieval results or plain snippets
+            backup: Service receiving the hedged request
+            delay: Seconds to wait for this model before hedging
+
+        Returns:
+            The answer and a summary of the race: whether it hedged, the delay,
+            and the provider and model whose answer was used
+        """
+        summary: Dict[str, Any] = {
+            "hedged": False,
+            "delay_ms": round(delay * 1000, 1),
+            "winner": "primary",
+            "provider": self.provider,
+            "model": self.model,
+        }
+        if not relevant_docs:
+            return {"answer": NO_CONTEXT_ANSWER, "references": ""}, summary
+
+        prompt = self._answer_prompt(question, relevant_docs)
+        deadline = time.perf_counter() + delay
+        calls: Dict[asyncio.Task, LLMService] = {
+            asyncio.ensure_future(self._ainvoke(prompt)): self
+        }
+        fallback: Optional[Tuple[LLMService, str]] = None
+        error: Optional[BaseException] = None
+
+        def hedge() -> None:
+            summary["hedged"] = True
+            calls[asyncio.ensure_future(backup._ainvoke(prompt))] = backup
+
+        try:
+            while calls:
+                timeout = (
+                    None
+                    if summary["hedged"]
+                    else max(0.0, deadline - time.perf_counter())
+                )
+                done, _ = await asyncio.wait(
+                    calls, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedge()
+                    continue
+                for task in done:
+                    service = calls.pop(task)
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        logging.warning(
+                            "[LLMService] %s/%s failed in a hedged question: %s",
+                            service.provider,
+                            service.model,
+                            task.exception(),
+                        )
+                        continue
+                    content = task.result()
+                    with stage_timer("answer", "parse"):
+                        parsed = service._parse_json(content)
+                    if parsed is not None and "answer" in parsed:
+                        return self._hedge_result(
+                            service, parsed, relevant_docs, summary
+                        )
+                    fallback = fallback or (service, content)
+                if not calls and not summary["hedged"]:
+                    # Failed or invalid before the delay: no point waiting
+                    hedge()
+        finally:
+            for task in calls:
+                task.cancel()
+
+        if fallback is None:
+            raise error
+        service, content = fallback
+        return self._hedge_result(
+            service, service._safe_parse_json(content), relevant_docs, summary
+        )
+
+    def _hedge_result(
+        self,
+        service: "LLMService",
+        parsed: Dict,
+        relevant_docs: List,
+        summary: Dict[str, Any],
+    ) -> Tuple[Dict, Dict[str, Any]]:
+        if service is not self:
+            summary.update(
+                winner="backup", provider=service.provider, model=service.model
+            )
+        if summary["hedged"]:
+            metrics.increment("rag_llm_hedged_answers_total", winner=summary["winner"])
+        return service._finish_answer(parsed, relevant_docs), summary
+
+    async def _ainvoke(self, prompt: str) -> str:
+        started = time.perf_counter()
+        try:
+            response = await self.llm.ainvoke(prompt)
+        except asyncio.CancelledError:
+            # A hedged call cancelled by the other model's answer: its elapsed
+            # time is only a lower bound, kept so the slow tail stays visible
+            self._observe_latency(time.perf_counter() - started, censored=True)
+            raise
+        self._observe_latency(time.perf_counter() - started)
+        return response.content
+
+    def _observe_latency(self, seconds: float, censored: bool = False) -> None:
+        if not censored:
+            record_stage("answer", "llm", seconds)
+        if self.latency_tracker is not None:
+            self.latency_tracker.observe(
+                self.provider,
+                self.model or self.DEFAULT_MODELS[self.provider],
+                seconds,
+                censored=censored,
+            )
+
+    def _answer_prompt(self, question: str, relevant_docs: List) -> str:
+        with stage_timer("answer", "prompt"):
+            return self.prompt_template.format(
+                context=self._format_context(relevant_docs), question=question
+            )
+
+    def _parse_answer(self, content: str, relevant_docs: List) -> Dict:
+        with stage_timer("answer", "parse"):
+            parsed = self._safe_parse_json(content)
+        return self._finish_answer(parsed, relevant_docs)
+
+    def _finish_answer(self, parsed: Dict, relevant_docs: List) -> Dict:
+        sampled_log.log(
+            "LLMService",
+            "answer",
+            provider=self.provider,
+            model=self.model,
+            keys=list(parsed.keys()),
+            answer_len=(
+                len(parsed["answer"]) if isinstance(parsed.get("answer"), str) else None
             ),
-            (
-                len(parsed.get("citations", []))
+            citations=(
+                len(parsed["citations"])
                 if isinstance(parsed.get("citations"), list)
                 else 0
             ),
@@ -127,7 +327,96 @@ class LLMService:
         # Ensure citations exist; if model omitted them, pass through retrieval items
         if isinstance(relevant_docs[0], dict):
             parsed.setdefault("citations", relevant_docs)
-
-        logging.info("[LLMService] parsed=%s", parsed)
         return parsed
 
+    def stream_answer(
+        self, question: str, relevant_docs: List
+    ) -> Iterator[Tuple[str, Any]]:
+        """Stream an answer as (event, data) pairs while the provider generates it.
+
+        Emits a "citations" event with the retrieved snippets first, then one
+        "token" event per chunk of generated text, and finally a "done" event
+        with the full answer and the time to first token.
+
+        Args:
+            question: User's question
+            relevant_docs: Structured retrieval results or plain snippets
+        """
+        yield "citations", relevant_docs
+        if not relevant_docs:
+            yield "token", {"text": NO_CONTEXT_ANSWER}
+            yield "done", {"answer": NO_CONTEXT_ANSWER, "time_to_first_token_ms": None}
+            return
+
+        stream = _StreamedAnswer(self.provider, self.model)
+        for chunk in self.llm.stream(self._stream_prompt(question, relevant_docs)):
+            text = stream.add(chunk)
+            if text:
+                yield "token", {"text": text}
+        yield "done", stream.done()
+
+    async def astream_answer(
+        self, question: str, relevant_docs: List
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Async `stream_answer`, yielding the same (event, data) pairs."""
+        yield "citations", relevant_docs
+        if not relevant_docs:
+            yield "token", {"text": NO_CONTEXT_ANSWER}
+            yield "done", {"answer": NO_CONTEXT_ANSWER, "time_to_first_token_ms": None}
+            return
+
+        stream = _StreamedAnswer(self.provider, self.model)
+        async for chunk in self.llm.astream(
+            self._stream_prompt(question, relevant_docs)
+        ):
+            text = stream.add(chunk)
+            if text:
+                yield "token", {"text": text}
+        yield "done", stream.done()
+
+    def _stream_prompt(self, question: str, relevant_docs: List) -> str:
+        with stage_timer("answer", "prompt"):
+            return self.stream_prompt_template.format(
+                context=self._format_context(relevant_docs), question=question
+            )
+
+
+class _StreamedAnswer:
+    """Accumulates streamed chunks and measures the time to first token."""
+
+    def __init__(self, provider: str, model: Optional[str]) -> None:
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token_ms: Optional[float] = None
+        self.parts: List[str] = []
+
+    def add(self, chunk) -> str:
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        if text:
+            if self.first_token_ms is None:
+                elapsed = time.perf_counter() - self.started
+                self.first_token_ms = elapsed * 1000
+                record_stage("answer", "llm_first_token", elapsed)
+            self.parts.append(text)
+        return text
+
+    def done(self) -> Dict[str, Any]:
+        answer = "".join(self.parts)
+        record_stage("answer", "llm", time.perf_counter() - self.started)
+        sampled_log.log(
+            "LLMService",
+            "streamed_answer",
+            provider=self.provider,
+            model=self.model,
+            answer_len=len(answer),
+            ttft_ms=self.first_token_ms,
+        )
+        return {
+            "answer": answer,
+            "time_to_first_token_ms": (
+                round(self.first_token_ms, 1)
+                if self.first_token_ms is not None
+                else None
+            ),
+        }
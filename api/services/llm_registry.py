@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+from services.hedging import LatencyTracker
+from services.llm import LLMService
+
+
+class LLMRegistry:
+    """Thread-safe registry of LLM services keyed by (provider, model).
+
+    Each (provider, model) pair gets one long-lived `LLMService`, so switching
+    models between requests reuses an existing client instead of rebuilding
+    one. OpenAI clients share keep-alive HTTP connection pools (one sync, one
+    async). Clients unused for `idle_seconds` are evicted on the next lookup.
+    Every service reports its answer latencies to the shared `latency` tracker,
+    which outlives evicted clients.
+    """
+
+    def __init__(
+        self,
+        idle_seconds: float = 900.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        timeout: float = 120.0,
+        latency: Optional[LatencyTracker] = None,
+    ) -> None:
+        """
+        Args:
+            idle_seconds: Evict clients unused for this long (0 keeps them forever)
+            max_connections: Size of the shared HTTP connection pool
+            max_keepalive_connections: Idle keep-alive connections kept open
+            timeout: HTTP timeout in seconds for LLM calls
+            latency: Tracker of recent answer latencies per (provider, model)
+        """
+        self.idle_seconds = idle_seconds
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=60.0,
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        # Used by the async request path; its connections belong to one event loop
+        self._limits = limits
+        self._timeout = timeout
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._services: Dict[Tuple[str, str], Tuple[LLMService, float]] = {}
+        self.latency = latency or LatencyTracker()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.creations = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMRegistry":
+        return cls(
+            idle_seconds=float(os.getenv("LLM_CLIENT_IDLE_SECONDS", "900")),
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+            timeout=float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120")),
+            latency=LatencyTracker.from_env(),
+        )
+
+    @staticmethod
+    def key(provider: str, model: Optional[str]) -> Tuple[str, str]:
+        if provider not in LLMService.DEFAULT_MODELS:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        return provider, model or LLMService.DEFAULT_MODELS[provider]
+
+    def get(self, provider: str, model: Optional[str] = None) -> LLMService:
+        """Return the shared service for (provider, model), creating it on first use."""
+        key = self.key(provider, model)
+        now = time.monotonic()
+        with self._lock:
+            self._bind_loop()
+            self._evict_idle(now)
+            entry = self._services.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._services[key] = (entry[0], now)
+                return entry[0]
+            # Built under the lock so concurrent first requests share one client;
+            # construction is local and makes no network calls
+            service = LLMService(
+                key[0],
+                key[1],
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
+                latency_tracker=self.latency,
+            )
+            self._services[key] = (service, now)
+            self.creations += 1
+            logging.info("[LLMRegistry] created client for %s/%s", *key)
+            return service
+
+    def _bind_loop(self) -> None:
+        # Caller holds the lock. A server runs one event loop for its lifetime;
+        # if requests arrive on a new loop (e.g. a test client started per
+        # request) the old pool is unusable, so clients are rebuilt on a new one
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is None:
+            self._loop = loop
+        elif loop is not self._loop:
+            self._loop = loop
+            self.http_async_client = httpx.AsyncClient(
+                limits=self._limits, timeout=self._timeout
+            )
+            self._services.clear()
+            logging.info("[LLMRegistry] new event loop: rebuilt async clients")
+
+    def _evict_idle(self, now: float) -> None:
+        # Caller holds the lock
+        if not self.idle_seconds:
+            return
+        idle = [
+            key
+            for key, (_, last_used) in self._services.items()
+            if now - last_used > self.idle_seconds
+        ]
+        for key in idle:
+            del self._services[key]
+            self.evictions += 1
+            logging.info("[LLMRegistry] evicted idle client for %s/%s", *key)
+
+    async def warm_up(self, models: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Create clients for `models` and open a pooled connection to OpenAI.
+
+        Must run on the serving event loop: answers go through the async pool,
+        whose connections belong to that loop. Failures are logged and
+        ignored: warm-up only saves first-request latency.
+        """
+        openai_models = False
+        for provider, model in models:
+            try:
+                self.get(provider, model)
+                openai_models = openai_models or provider == "openai"
+            except Exception as exc:
+                logging.warning(
+                    "[LLMRegistry] warm-up failed for %s/%s: %s", provider, model, exc
+                )
+        if openai_models:
+            base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+            try:
+                # Any response leaves a TLS keep-alive connection in the shared pool
+                await self.http_async_client.get(
+                    f"{base_url.rstrip('/')}/models",
+                    headers={
+                        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"
+                    },
+                )
+            except Exception as exc:
+                logging.warning("[LLMRegistry] connection warm-up failed: %s", exc)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "clients": len(self._services),
+                "hits": self.hits,
+                "creations": self.creations,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs, ending with +Inf."""
+        pairs: List[Tuple[str, int]] = []
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            pairs.append(("+Inf" if bound == float("inf") else repr(bound), running))
+        return pairs
+
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms in Prometheus text format.
+
+    Kept in-house (a few dicts behind one lock) so recording a stage costs a
+    bisect and three additions, with no extra dependency.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, "counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_number(value)}")
+            for name, series in sorted(self._gauges.items()):
+                self._header(lines, name, "gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_number(value)}")
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for key, histogram in sorted(series.items()):
+                    for le, count in histogram.cumulative():
+                        labels = _format_labels(key + (("le", le),))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_sum{labels} {_number(histogram.total)}")
+                    lines.append(f"{name}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+metrics = MetricsRegistry()
+metrics.describe(
+    "rag_stage_duration_seconds",
+    "Time spent in one stage of ingestion, retrieval or answer generation",
+)
+metrics.describe("rag_http_requests_total", "HTTP requests by route and status")
+metrics.describe(
+    "rag_http_request_duration_seconds",
+    "Time until the response headers were sent, by route",
+)
+
+
+class RequestTimings:
+    """Per-request stage durations, reported in the Server-Timing header."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self._durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        # Stages repeated within a request (e.g. several cold segments) add up
+        with self._lock:
+            self._durations[stage] = self._durations.get(stage, 0.0) + seconds
+
+    def header(self) -> str:
+        with self._lock:
+            entries = [
+                f"{stage};dur={seconds * 1000:.1f}"
+                for stage, seconds in self._durations.items()
+            ]
+        total = (time.perf_counter() - self.started) * 1000
+        return ", ".join(entries + [f"total;dur={total:.1f}"])
+
+
+# Set by ServerTimingMiddleware; copied into worker threads by asyncio.to_thread
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record_stage(operation: str, stage: str, seconds: float) -> None:
+    """Record one stage duration in the histogram and the current request's timings."""
+    metrics.observe(
+        "rag_stage_duration_seconds", seconds, operation=operation, stage=stage
+    )
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage_timer(operation: str, stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage` of `operation` (e.g. "retrieval", "search_dense")."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(operation, stage, time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a `Server-Timing` header and per-route HTTP metrics.
+
+    The header lists the stages recorded with `stage_timer` while the request
+    was handled, plus the total. Streaming responses send their headers before
+    the body, so they only report the stages completed by then (retrieval).
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.header())
+                route = _route_label(scope)
+                metrics.observe(
+                    "rag_http_request_duration_seconds",
+                    time.perf_counter() - timings.started,
+                    route=route,
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            metrics.increment(
+                "rag_http_requests_total",
+                route=_route_label(scope),
+                method=scope["method"],
+                status=str(status),
+            )
+
+
+def _route_label(scope) -> str:
+    # Route templates ("/jobs/{job_id}") keep the label set bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class SampledLog:
+    """Structured (JSON) log lines for hot paths, emitted for a sample of calls.
+
+    Per-request details such as retrieved snippets are too expensive to log on
+    every call; a small random sample keeps them available for debugging.
+    """
+
+    def __init__(self, rate: float = 0.01) -> None:
+        """
+        Args:
+            rate: Fraction of calls that are logged (0 disables, 1 logs all)
+        """
+        self.rate = min(1.0, max(0.0, rate))
+
+    @classmethod
+    def from_env(cls) -> "SampledLog":
+        """Build from LOG_SAMPLE_RATE (default 0.01)."""
+        return cls(rate=float(os.getenv("LOG_SAMPLE_RATE", "0.01")))
+
+    def log(self, component: str, event: str, **fields: Any) -> None:
+        """Log `event` with `fields` as one JSON object, if this call is sampled.
+
+        Args:
+            component: Log prefix, e.g. "EmbeddingsService"
+            event: Short event name, e.g. "similarity_search"
+            fields: JSON-serializable details of the call
+        """
+        if self.rate <= 0.0 or (self.rate < 1.0 and random.random() >= self.rate):
+            return
+        logging.info(
+            "[%s] %s %s",
+            component,
+            event,
+            json.dumps(fields, default=str, ensure_ascii=False, sort_keys=True),
+        )
+
+
+sampled_log = SampledLog.from_env()
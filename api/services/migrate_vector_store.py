@@ -0,0 +1,115 @@
+"""One-off migration of `vector_store/` to the pickle-free segment format.
+
+Converts, in place:
+  * per-document folders of the original layout (`<root>/<stem>/index.faiss|index.pkl`),
+    which are appended to the segmented store under their folder name
+  * pickle-backed segments (`<root>/segments/<id>/index.faiss|index.pkl`)
+
+This is the only code path that still unpickles `index.pkl`, so only run it on
+data this service produced. Stop the API while migrating.
+
+Usage (from the api/ directory):
+    python -m services.migrate_vector_store --root ./vector_store [--remove-legacy]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from services.ann_index import IndexSettings
+from services.index_cache import IndexCache
+from services.vector_store import SegmentedVectorStore, write_segment_files
+
+
+def load_pickled_index(
+    path: str,
+) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+    """Read a LangChain FAISS folder into (texts, vectors, metadatas) in row order."""
+    # No embedding function is needed: the index is only read, never queried
+    store = FAISS.load_local(path, None, allow_dangerous_deserialization=True)
+    docs = [
+        store.docstore.search(store.index_to_docstore_id[position])
+        for position in range(store.index.ntotal)
+    ]
+    vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    return [d.page_content for d in docs], vectors, [dict(d.metadata) for d in docs]
+
+
+def migrate(root: str, remove_legacy: bool = False) -> Dict[str, int]:
+    """Convert every old-format index under `root`.
+
+    Args:
+        root: The vector store directory
+        remove_legacy: Delete per-document folders once they are imported
+
+    Returns:
+        Counts of converted segments and imported per-document folders
+    """
+    settings = IndexSettings.from_env()
+    store = SegmentedVectorStore(
+        root,
+        IndexCache(max_entries=0),
+        background_merge=False,
+        preload=False,
+        index_settings=settings,
+    )
+
+    converted = 0
+    for segment_id in store.segment_ids():
+        segment_dir = store.segment_path(segment_id)
+        if os.path.exists(os.path.join(segment_dir, "segment.json")):
+            continue
+        texts, vectors, metadatas = load_pickled_index(segment_dir)
+        tmp_dir = f"{segment_dir}.migrating"
+        old_dir = f"{segment_dir}.pickle"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        write_segment_files(tmp_dir, texts, vectors, metadatas, settings)
+        os.replace(segment_dir, old_dir)
+        os.replace(tmp_dir, segment_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        converted += 1
+        logging.info("[migrate] converted segment %s (%d rows)", segment_id, len(texts))
+
+    imported = 0
+    for entry in sorted(os.listdir(root)):
+        doc_dir = os.path.join(root, entry)
+        if not (
+            os.path.exists(os.path.join(doc_dir, "index.faiss"))
+            and os.path.exists(os.path.join(doc_dir, "index.pkl"))
+        ):
+            continue
+        if not store.has_document(entry):
+            texts, vectors, metadatas = load_pickled_index(doc_dir)
+            store.add_document(entry, texts, vectors, metadatas)
+            imported += 1
+            logging.info("[migrate] imported %s (%d chunks)", entry, len(texts))
+        if remove_legacy:
+            shutil.rmtree(doc_dir, ignore_errors=True)
+
+    return {"segments_converted": converted, "documents_imported": imported}
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(
+        description="Migrate vector_store/ to the pickle-free segment format"
+    )
+    parser.add_argument("--root", default="./vector_store")
+    parser.add_argument(
+        "--remove-legacy",
+        action="store_true",
+        help="delete per-document index folders after importing them",
+    )
+    args = parser.parse_args()
+    print(migrate(args.root, remove_legacy=args.remove_legacy))
+
+
+if __name__ == "__main__":
+    main()
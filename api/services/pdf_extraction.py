@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from io import BytesIO
+from typing import BinaryIO, Callable, Deque, Iterator, List, Optional, Tuple, Union
+
+from pypdf import PdfReader
+
+# A PDF given as a file path (spooled upload) or as its bytes
+PdfSource = Union[str, bytes]
+
+# Worker-process reader of the last file path, reused across page slices
+_cached_reader: Optional[Tuple[str, float, BinaryIO, PdfReader]] = None
+
+
+@contextmanager
+def open_pdf(source: PdfSource) -> Iterator[PdfReader]:
+    """PdfReader over a path or bytes.
+
+    A path is read through an open file handle rather than handed to pypdf,
+    which would load the whole file into memory.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield PdfReader(BytesIO(source))
+        return
+    with open(source, "rb") as fh:
+        yield PdfReader(fh)
+
+
+def _worker_reader(source: PdfSource) -> PdfReader:
+    # Opening a large PDF reads its whole page tree, so each worker keeps the
+    # reader of the file it is extracting instead of reopening it per slice
+    global _cached_reader
+    if isinstance(source, (bytes, bytearray)):
+        return PdfReader(BytesIO(source))
+    mtime = os.path.getmtime(source)
+    if _cached_reader is None or _cached_reader[:2] != (source, mtime):
+        if _cached_reader is not None:
+            _cached_reader[2].close()
+        fh = open(source, "rb")
+        _cached_reader = (source, mtime, fh, PdfReader(fh))
+    return _cached_reader[3]
+
+
+def _extract_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+def _extract_pages(source: PdfSource, indices: List[int]) -> List[str]:
+    # Runs in a worker process: each worker opens the PDF itself and extracts its slice
+    reader = _worker_reader(source)
+    return [_extract_text(reader.pages[idx]) for idx in indices]
+
+
+def _page_hash(page) -> str:
+    # Hash the raw content stream: far cheaper than extracting text
+    try:
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+    except Exception:
+        data = b""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PageExtractor:
+    """Extracts page text from PDFs, fanning large documents out to a process pool.
+
+    pypdf text extraction is pure Python and CPU-bound, so threads do not help;
+    documents with at least `min_pages` pages are split into contiguous page
+    ranges extracted by worker processes and yielded back in page order.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        min_pages: int = 50,
+        slice_pages: int = 16,
+        prefetch: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            max_workers: Number of worker processes (defaults to the CPU count, max 4)
+            min_pages: Documents with fewer pages stay on the single-thread path
+            slice_pages: Pages per worker task when extracting from a file path
+            prefetch: Slices in flight ahead of the consumer (defaults to
+                twice the number of workers)
+        """
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.min_pages = min_pages
+        self.slice_pages = max(1, slice_pages)
+        self.prefetch = max(1, prefetch or 2 * self.max_workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "PageExtractor":
+        workers = os.getenv("PDF_EXTRACT_WORKERS")
+        return cls(
+            max_workers=int(workers) if workers else None,
+            min_pages=int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50")),
+            slice_pages=int(os.getenv("PDF_EXTRACT_SLICE_PAGES", "16")),
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking the multi-threaded API process is not safe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    @staticmethod
+    def page_hashes(source: PdfSource) -> List[str]:
+        """sha256 of every page's content stream, in page order."""
+        with open_pdf(source) as reader:
+            return [_page_hash(page) for page in reader.pages]
+
+    def extract_texts(
+        self,
+        source: PdfSource,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pages: Optional[List[int]] = None,
+    ) -> List[str]:
+        """Return the text of the requested pages, in order ("" for unreadable pages).
+
+        Args:
+            source: Path or bytes content of the PDF file
+            progress: Optional callback receiving (pages_extracted, pages_total)
+            pages: 0-based page indices to extract (defaults to every page)
+        """
+        return list(self.iter_texts(source, progress, pages))
+
+    def iter_texts(
+        self,
+        source: PdfSource,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pages: Optional[List[int]] = None,
+    ) -> Iterator[str]:
+        """Yield the text of the requested pages in order, as they are extracted.
+
+        Large documents given as a path are cut into slices of `slice_pages`
+        pages for the process pool, with at most `prefetch` slices in flight
+        ahead of the consumer, so only a bounded window of page text exists
+        at any time and the first pages arrive early. Bytes are shipped to
+        every slice, so they are split in one slice per worker instead.
+
+        Args:
+            source: Path or bytes content of the PDF file
+            progress: Optional callback receiving (pages_extracted, pages_total)
+            pages: 0-based page indices to extract (defaults to every page)
+        """
+        with open_pdf(source) as reader:
+            indices = list(range(len(reader.pages))) if pages is None else list(pages)
+            total = len(indices)
+            report = progress or (lambda done, total: None)
+            report(0, total)
+            if self.max_workers <= 1 or total < self.min_pages:
+                for done, idx in enumerate(indices, start=1):
+                    text = _extract_text(reader.pages[idx])
+                    report(done, total)
+                    yield text
+                return
+
+        step = (
+            -(-total // self.max_workers)
+            if isinstance(source, (bytes, bytearray))
+            else self.slice_pages
+        )
+        slices = iter(
+            [indices[start : start + step] for start in range(0, total, step)]
+        )
+        pending: Deque[Future] = deque()
+        done = 0
+        try:
+            pool = self._get_pool()
+
+            def fill() -> None:
+                while len(pending) < self.prefetch:
+                    chunk = next(slices, None)
+                    if chunk is None:
+                        return
+                    pending.append(pool.submit(_extract_pages, source, chunk))
+
+            fill()
+            while pending:
+                texts = pending.popleft().result()
+                fill()
+                report(done + len(texts), total)
+                for text in texts:
+                    yield text
+                    done += 1
+        except BrokenProcessPool as exc:
+            logging.warning(
+                "[PageExtractor] process pool failed (%s); extracting serially", exc
+            )
+            self._pool = None
+            with open_pdf(source) as reader:
+                for idx in indices[done:]:
+                    text = _extract_text(reader.pages[idx])
+                    report(done + 1, total)
+                    yield text
+                    done += 1
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched API calls.
+
+    Callers block on `embed` (or await `aembed`) while a dispatcher thread collects queued queries
+    for up to `max_wait_ms` after the first one arrives, or until
+    `max_batch_size` are queued, then embeds them with one call to `embed_fn`.
+    Batches run on a small pool so the next one is collected while the
+    previous call is in flight. Added latency per query is bounded by
+    `max_wait_ms`.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_wait_ms: float = 5.0,
+        max_batch_size: int = 64,
+        max_in_flight: int = 4,
+        aembed_fn: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None,
+    ) -> None:
+        """
+        Args:
+            embed_fn: Embeds a list of texts, returning vectors in input order
+            max_wait_ms: How long a batch collects queries after the first one
+            max_batch_size: Queries per call (1 disables batching)
+            max_in_flight: Concurrent batched calls
+            aembed_fn: Async counterpart of `embed_fn`, used by `aembed` when
+                batching is disabled
+        """
+        self.embed_fn = embed_fn
+        self.aembed_fn = aembed_fn
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_in_flight), thread_name_prefix="query-embed"
+        )
+        self._dispatcher = None
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.calls = 0
+        self.largest_batch = 0
+
+    @classmethod
+    def from_env(
+        cls,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        aembed_fn: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None,
+    ) -> "QueryEmbeddingBatcher":
+        enabled = os.getenv("QUERY_EMBEDDING_BATCH", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        return cls(
+            embed_fn,
+            max_wait_ms=float(os.getenv("QUERY_EMBEDDING_BATCH_WAIT_MS", "5")),
+            max_batch_size=(
+                int(os.getenv("QUERY_EMBEDDING_BATCH_MAX_SIZE", "64")) if enabled else 1
+            ),
+            max_in_flight=int(os.getenv("QUERY_EMBEDDING_MAX_IN_FLIGHT", "4")),
+            aembed_fn=aembed_fn,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    def embed(self, text: str) -> List[float]:
+        """Embed one query, sharing the API call with concurrent queries."""
+        if not self.enabled:
+            vector = self.embed_fn([text])[0]
+            self._record(1)
+            return vector
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        """Async `embed`: waits on the shared batch without holding a thread."""
+        if self.enabled:
+            return await asyncio.wrap_future(self.submit(text))
+        if self.aembed_fn is None:
+            return await asyncio.to_thread(self.embed, text)
+        vector = (await self.aembed_fn([text]))[0]
+        self._record(1)
+        return vector
+
+    def submit(self, text: str) -> Future:
+        """Queue one query for the next batch; the future resolves to its vector."""
+        self._ensure_dispatcher()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _record(self, batch_size: int) -> None:
+        with self._lock:
+            self.queries += batch_size
+            self.calls += 1
+            self.largest_batch = max(self.largest_batch, batch_size)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop,
+                    name="query-embed-dispatcher",
+                    daemon=True,
+                )
+                self._dispatcher.start()
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        # Past the deadline: still take whatever is already queued
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        try:
+            vectors = self.embed_fn([text for text, _ in batch])
+            if len(vectors) != len(batch):
+                raise RuntimeError(
+                    f"expected {len(batch)} embeddings, got {len(vectors)}"
+                )
+        except Exception as exc:
+            logging.warning(
+                "[QueryEmbeddingBatcher] batch of %d queries failed: %s",
+                len(batch),
+                exc,
+            )
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        self._record(len(batch))
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "calls": self.calls,
+                "largest_batch": self.largest_batch,
+                "mean_batch": (
+                    round(self.queries / self.calls, 2) if self.calls else 0.0
+                ),
+            }
@@ -0,0 +1,351 @@
+import base64
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from langchain_core.documents import Document
+from services.index_cache import IndexCache
+from services.vector_store import SegmentedVectorStore, SegmentWriter, copy_blocks
+
+Hit = Tuple[str, Document, float]
+
+
+def shard_for(document_id: str, shards: int) -> int:
+    """Shard owning a document: a stable hash of its id, so every process agrees."""
+    digest = hashlib.sha1(document_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def partition_root(root: str, shard: int) -> str:
+    """Directory of one shard's partition of the vector store."""
+    return os.path.join(root, "shards", str(shard))
+
+
+def encode_vector(vector: Iterable[float]) -> str:
+    # float32 bytes in base64: a quarter of the size of a JSON float list
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4")
+
+
+def encode_hits(hits: List[Hit]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "document_id": document_id,
+            "page": doc.metadata.get("page"),
+            "text": doc.page_content,
+            "score": score,
+        }
+        for document_id, doc, score in hits
+    ]
+
+
+def decode_hits(items: List[Dict[str, Any]]) -> List[Hit]:
+    return [
+        (
+            item["document_id"],
+            Document(
+                page_content=item["text"],
+                metadata={"page": item["page"], "document_id": item["document_id"]},
+            ),
+            float(item["score"]),
+        )
+        for item in items
+    ]
+
+
+class ShardClient:
+    """HTTP client of one retrieval shard server (see `shard_server.py`)."""
+
+    def __init__(self, url: str, http_client: httpx.Client) -> None:
+        self.url = url.rstrip("/")
+        self.http_client = http_client
+
+    def search(
+        self, query_vector: Iterable[float], k: int, document_ids: List[str]
+    ) -> Tuple[List[Hit], Dict[str, int]]:
+        return self._post(
+            "/search",
+            {
+                "vector": encode_vector(query_vector),
+                "k": k,
+                "document_ids": document_ids,
+            },
+        )
+
+    def lexical_search(
+        self, query: str, k: int, document_ids: List[str]
+    ) -> Tuple[List[Hit], Dict[str, int]]:
+        return self._post(
+            "/lexical_search", {"query": query, "k": k, "document_ids": document_ids}
+        )
+
+    def _post(
+        self, path: str, payload: Dict[str, Any]
+    ) -> Tuple[List[Hit], Dict[str, int]]:
+        response = self.http_client.post(f"{self.url}{path}", json=payload)
+        response.raise_for_status()
+        body = response.json()
+        return decode_hits(body["hits"]), {
+            "segments_searched": body["segments_searched"]
+        }
+
+
+class PartitionedVectorStore:
+    """Vector store split into partitions that are searched by shard servers.
+
+    Each document belongs to one partition (`shard_for`), stored as a regular
+    `SegmentedVectorStore` under `<root>/shards/<n>/`. This process writes and
+    merges the partitions; searches are scattered to the shard server owning
+    each partition, which memory-maps only its own segments, and the partial
+    top-k lists are merged here. Shards that fail or miss the `timeout` are
+    left out of the results and reported; if every shard fails the search
+    raises.
+
+    Offers the interface `EmbeddingsService` uses of `SegmentedVectorStore`.
+    Segment ids are qualified by partition ("<n>/seg_00000001").
+    """
+
+    def __init__(
+        self,
+        root: str,
+        shard_urls: List[str],
+        timeout: float = 2.0,
+        make_partition: Optional[Callable[[str], SegmentedVectorStore]] = None,
+    ) -> None:
+        """
+        Args:
+            root: Vector store directory; partitions live in its shards/ folder
+            shard_urls: Base URL of the shard server of each partition, in order
+            timeout: Seconds to wait for the shards of one search
+            make_partition: Builds the store of a partition directory
+                (defaults to a store with its share of the index cache budget)
+        """
+        if not shard_urls:
+            raise ValueError("PartitionedVectorStore needs at least one shard URL")
+        self.root = root
+        self.segments_path = os.path.join(root, "shards")
+        self.timeout = timeout
+        make_partition = make_partition or (
+            lambda path: SegmentedVectorStore(
+                path, IndexCache.from_env(len(shard_urls))
+            )
+        )
+        self.partitions = [
+            make_partition(partition_root(root, shard))
+            for shard in range(len(shard_urls))
+        ]
+        self.http_client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+        self.clients = [ShardClient(url, self.http_client) for url in shard_urls]
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(4, 4 * len(shard_urls)), thread_name_prefix="shard-scatter"
+        )
+
+    @classmethod
+    def from_env(
+        cls, root: str, shard_urls: List[str], preload: bool = False
+    ) -> "PartitionedVectorStore":
+        return cls(
+            root,
+            shard_urls,
+            timeout=float(os.getenv("SHARD_TIMEOUT_MS", "2000")) / 1000,
+            # The process budget is split across the partitions' caches
+            make_partition=lambda path: SegmentedVectorStore.from_env(
+                path, IndexCache.from_env(len(shard_urls)), preload
+            ),
+        )
+
+    def partition(self, document_id: str) -> SegmentedVectorStore:
+        return self.partitions[shard_for(document_id, len(self.partitions))]
+
+    def _qualified(self, document_id: str, segment_id: Optional[str]) -> Optional[str]:
+        if segment_id is None:
+            return None
+        return f"{shard_for(document_id, len(self.partitions))}/{segment_id}"
+
+    # Documents and ingestion: delegated to the owning partition
+
+    def has_document(self, document_id: str) -> bool:
+        return self.partition(document_id).has_document(document_id)
+
+    def document_ids(self) -> List[str]:
+        return [d for partition in self.partitions for d in partition.document_ids()]
+
+    def document_info(self, document_id: str) -> Optional[Dict[str, Any]]:
+        return self.partition(document_id).document_info(document_id)
+
+    def document_pages(self, document_id: str) -> List[int]:
+        return self.partition(document_id).document_pages(document_id)
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        for partition in self.partitions:
+            document_id = partition.find_by_content_hash(content_hash)
+            if document_id is not None:
+                return document_id
+        return None
+
+    def iter_document_vectors(self, document_id: str) -> Iterator[np.ndarray]:
+        return self.partition(document_id).iter_document_vectors(document_id)
+
+    def segment_path(self, segment_id: str) -> str:
+        shard, _, local_id = segment_id.partition("/")
+        return self.partitions[int(shard)].segment_path(local_id)
+
+    def begin_segment(self, document_id: Optional[str] = None) -> SegmentWriter:
+        if document_id is None:
+            raise ValueError("A partitioned store needs the document_id of a segment")
+        return self.partition(document_id).begin_segment(document_id)
+
+    def discard_segment(self, writer: SegmentWriter) -> None:
+        for partition in self.partitions:
+            if writer.path.startswith(partition.segments_path + os.sep):
+                partition.discard_segment(writer)
+                return
+
+    def commit_document(
+        self,
+        document_id: str,
+        writer: SegmentWriter,
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        segment_id = self.partition(document_id).commit_document(
+            document_id, writer, fingerprint
+        )
+        return self._qualified(document_id, segment_id)
+
+    def commit_pages(
+        self,
+        document_id: str,
+        pages: Iterable[int],
+        writer: SegmentWriter,
+        fingerprint: Dict[str, Any],
+        base_version: int,
+    ) -> Optional[str]:
+        segment_id = self.partition(document_id).commit_pages(
+            document_id, pages, writer, fingerprint, base_version
+        )
+        return self._qualified(document_id, segment_id)
+
+    def copy_document(
+        self,
+        source_id: str,
+        document_id: str,
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        source, target = self.partition(source_id), self.partition(document_id)
+        if source is target:
+            segment_id = target.copy_document(source_id, document_id, fingerprint)
+        else:
+            # Streamed across partitions block by block, like a copy within one
+            writer = target.begin_segment(document_id)
+            try:
+                copy_blocks(
+                    source.export_document_blocks(source_id), document_id, writer
+                )
+            except BaseException:
+                target.discard_segment(writer)
+                raise
+            segment_id = target.commit_document(document_id, writer, fingerprint)
+        return self._qualified(document_id, segment_id)
+
+    def refresh(self) -> bool:
+        # Every partition, not just up to the first that changed
+        return any([partition.refresh() for partition in self.partitions])
+
+    def version(self) -> int:
+        return sum(partition.version() for partition in self.partitions)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {}
+        for partition in self.partitions:
+            for name, value in partition.cache_stats().items():
+                if isinstance(value, (int, float)):
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+    # Search: scattered to the shard servers
+
+    def search(
+        self, query_vector: List[float], k: int, document_ids: Iterable[str]
+    ) -> Tuple[List[Hit], Dict[str, Any]]:
+        """Top-k chunks by ascending L2 distance, gathered from the shards.
+
+        Returns:
+            Tuple of (hits, {"segments_searched", "shards"}) where "shards" is
+            {"queried", "failed"} with the indexes of the shards left out
+        """
+        vector = np.asarray(query_vector, dtype=np.float32)
+        hits, stats = self._scatter(
+            document_ids, lambda client, ids: client.search(vector, k, ids)
+        )
+        hits.sort(key=lambda hit: hit[2])
+        return hits[:k], stats
+
+    def lexical_search(
+        self, query: str, k: int, document_ids: Iterable[str]
+    ) -> Tuple[List[Hit], Dict[str, Any]]:
+        """Top-k chunks by BM25, gathered from the shards.
+
+        Each shard scores with its own term statistics, so scores of
+        different shards are close but not exactly comparable.
+        """
+        hits, stats = self._scatter(
+            document_ids, lambda client, ids: client.lexical_search(query, k, ids)
+        )
+        hits.sort(key=lambda hit: -hit[2])
+        return hits[:k], stats
+
+    def _scatter(
+        self,
+        document_ids: Iterable[str],
+        call: Callable[[ShardClient, List[str]], Tuple[List[Hit], Dict[str, int]]],
+    ) -> Tuple[List[Hit], Dict[str, Any]]:
+        grouped: Dict[int, List[str]] = defaultdict(list)
+        for document_id in document_ids:
+            grouped[shard_for(document_id, len(self.partitions))].append(document_id)
+        futures = {
+            self._executor.submit(call, self.clients[shard], ids): shard
+            for shard, ids in grouped.items()
+        }
+        done, _ = wait(futures, timeout=self.timeout)
+
+        hits: List[Hit] = []
+        segments_searched = 0
+        failed: List[int] = []
+        for future, shard in futures.items():
+            if future not in done:
+                future.cancel()
+                failed.append(shard)
+                logging.warning(
+                    "[PartitionedVectorStore] shard %d (%s) timed out",
+                    shard,
+                    self.clients[shard].url,
+                )
+            elif future.exception() is not None:
+                failed.append(shard)
+                logging.warning(
+                    "[PartitionedVectorStore] shard %d (%s) failed: %s",
+                    shard,
+                    self.clients[shard].url,
+                    future.exception(),
+                )
+            else:
+                shard_hits, shard_stats = future.result()
+                hits.extend(shard_hits)
+                segments_searched += shard_stats["segments_searched"]
+        if futures and len(failed) == len(futures):
+            raise RuntimeError(f"No retrieval shard answered ({len(failed)} queried)")
+        return hits, {
+            "segments_searched": segments_searched,
+            "shards": {"queried": len(futures), "failed": sorted(failed)},
+        }
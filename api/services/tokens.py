@@ -0,0 +1,3 @@
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for request budgeting."""
+    return max(1, len(text) // 4)
@@ -0,0 +1,1415 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from services.ann_index import (
+    SCAN_BLOCK_ROWS,
+    STORAGE_DTYPES,
+    IndexSettings,
+    build_ann_index,
+    decode_vectors,
+    encode_vectors,
+    search_vectors,
+    sq8_params,
+)
+from services.index_cache import IndexCache
+from services.lexical_index import (
+    LexicalIndex,
+    corpus_idf,
+    query_tokens,
+    write_lexical_index,
+)
+from services.metrics import stage_timer
+
+SEGMENT_FORMAT = 1
+
+# Fixed per-row schema: index into the segment's document list and 1-based page (-1 if unknown)
+ROW_DTYPE = np.dtype([("doc", "<i4"), ("page", "<i4")])
+
+
+def write_segment_files(
+    path: str,
+    texts: List[str],
+    vectors: Iterable[Iterable[float]],
+    metadatas: List[Dict[str, Any]],
+    settings: Optional[IndexSettings] = None,
+) -> None:
+    """Persist one segment in the pickle-free columnar format.
+
+    Files:
+        vectors.npy     matrix (rows x dimensions) in the configured storage
+                        (float32, float16 or uint8 codes), memory-mappable
+        sq_params.npy   per-dimension [minimum, scale] rows, sq8 storage only
+        norms.npy       float32 squared L2 norm of every (decoded) row
+        index.faiss     approximate index, absent for flat segments
+        lexicon.json,   BM25 inverted index over the chunk texts,
+        lex_*.npy       see services.lexical_index
+        text.bin        UTF-8 chunk texts, concatenated
+        offsets.npy     int64 byte offsets of each chunk in text.bin (rows + 1)
+        rows.npy        ROW_DTYPE records (document index, page)
+        segment.json    format version, dimensions, storage, index type and
+                        the segment's document ids
+    """
+    writer = SegmentWriter(path, settings)
+    writer.add(texts, vectors, metadatas)
+    writer.close()
+
+
+class SegmentWriter:
+    """Writes one segment incrementally, in the format of `write_segment_files`.
+
+    Chunk texts and float32 vectors are appended to files as batches arrive,
+    so a large document never has to be held in memory. `close()` encodes
+    the vectors and computes norms block by block from the memory-mapped
+    spill file, then builds the ANN and lexical indexes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        settings: Optional[IndexSettings] = None,
+        segment_id: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            path: Directory the segment files are written to
+            settings: Index type and vector storage of the segment
+            segment_id: Id the segment is published under, if any
+        """
+        self.path = path
+        self.settings = settings or IndexSettings()
+        self.segment_id = segment_id
+        self.rows = 0
+        self.dimensions = 0
+        os.makedirs(path, exist_ok=True)
+        self._raw_path = os.path.join(path, "vectors.f32")
+        self._raw = open(self._raw_path, "wb")
+        self._text = open(os.path.join(path, "text.bin"), "wb")
+        self._offsets = array("q", [0])
+        self._docs = array("i")
+        self._pages = array("i")
+        self._document_ids: Dict[str, int] = {}
+        # Running per-dimension range, for sq8 parameters over the whole segment
+        self._minimum: Optional[np.ndarray] = None
+        self._maximum: Optional[np.ndarray] = None
+
+    def add(
+        self,
+        texts: List[str],
+        vectors: Iterable[Iterable[float]],
+        metadatas: List[Dict[str, Any]],
+    ) -> None:
+        """Append chunks; every metadata needs a "document_id" and may have a "page"."""
+        if not texts:
+            return
+        matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(texts), -1)
+        if self.rows == 0:
+            self.dimensions = int(matrix.shape[1])
+        elif matrix.shape[1] != self.dimensions:
+            raise ValueError(
+                f"Expected {self.dimensions}-dimensional vectors, got {matrix.shape[1]}"
+            )
+        self._raw.write(matrix.tobytes())
+        if self.settings.storage == "sq8":
+            low, high = matrix.min(axis=0), matrix.max(axis=0)
+            self._minimum = (
+                low if self._minimum is None else np.minimum(self._minimum, low)
+            )
+            self._maximum = (
+                high if self._maximum is None else np.maximum(self._maximum, high)
+            )
+
+        for text, metadata in zip(texts, metadatas):
+            encoded = text.encode("utf-8")
+            self._text.write(encoded)
+            self._offsets.append(self._offsets[-1] + len(encoded))
+            document_id = metadata["document_id"]
+            self._docs.append(
+                self._document_ids.setdefault(document_id, len(self._document_ids))
+            )
+            page = metadata.get("page")
+            self._pages.append(page if page is not None else -1)
+        self.rows += len(texts)
+
+    def close(self) -> None:
+        """Finish the segment files; segment.json is written last."""
+        self._raw.close()
+        self._text.close()
+        path, settings, n_rows = self.path, self.settings, self.rows
+        matrix = (
+            np.memmap(
+                self._raw_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(n_rows, self.dimensions),
+            )
+            if n_rows and self.dimensions
+            else np.zeros((n_rows, self.dimensions), dtype=np.float32)
+        )
+
+        sq_params = None
+        if settings.storage == "sq8":
+            sq_params = sq8_params(
+                (
+                    self._minimum
+                    if self._minimum is not None
+                    else np.zeros(self.dimensions)
+                ),
+                (
+                    self._maximum
+                    if self._maximum is not None
+                    else np.ones(self.dimensions)
+                ),
+            )
+            np.save(os.path.join(path, "sq_params.npy"), sq_params)
+        stored = np.lib.format.open_memmap(
+            os.path.join(path, "vectors.npy"),
+            mode="w+",
+            dtype=STORAGE_DTYPES[settings.storage],
+            shape=(n_rows, self.dimensions),
+        )
+        norms = np.empty(n_rows, dtype=np.float32)
+        for start in range(0, n_rows, SCAN_BLOCK_ROWS):
+            block, _ = encode_vectors(
+                matrix[start : start + SCAN_BLOCK_ROWS], settings.storage, sq_params
+            )
+            stored[start : start + SCAN_BLOCK_ROWS] = block
+            decoded = decode_vectors(block, sq_params)
+            norms[start : start + SCAN_BLOCK_ROWS] = np.einsum(
+                "ij,ij->i", decoded, decoded
+            )
+        stored.flush()
+        del stored
+        np.save(os.path.join(path, "norms.npy"), norms)
+
+        index_type = settings.choose_index_type(n_rows, self.dimensions)
+        index = build_ann_index(matrix, index_type, settings.storage, settings)
+        if index is not None:
+            faiss.write_index(index, os.path.join(path, "index.faiss"))
+            del index
+        del matrix
+        os.remove(self._raw_path)
+
+        offsets = np.frombuffer(self._offsets, dtype=np.int64)
+        rows = np.empty(n_rows, dtype=ROW_DTYPE)
+        rows["doc"] = np.frombuffer(self._docs, dtype=np.int32)
+        rows["page"] = np.frombuffer(self._pages, dtype=np.int32)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "rows.npy"), rows)
+
+        text = np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r")
+        write_lexical_index(
+            path,
+            (
+                bytes(text[offsets[row] : offsets[row + 1]]).decode("utf-8")
+                for row in range(n_rows)
+            ),
+        )
+        del text
+
+        with open(os.path.join(path, "segment.json"), "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "format": SEGMENT_FORMAT,
+                    "dimensions": self.dimensions,
+                    "rows": n_rows,
+                    "storage": settings.storage,
+                    "index_type": index_type,
+                    "documents": list(self._document_ids),
+                },
+                fh,
+            )
+
+    def abort(self) -> None:
+        """Close the spill files without finishing the segment."""
+        self._raw.close()
+        self._text.close()
+
+    def page_counts(self, n_pages: int) -> List[int]:
+        """Number of chunks written for each 1-based page up to `n_pages`."""
+        return _page_chunks(self._pages, n_pages)
+
+
+class Segment:
+    """A loaded, immutable segment holding the chunks of many documents.
+
+    Vectors, texts and row metadata are memory-mapped, so opening a segment
+    is close to zero-copy; chunk text is only decoded for returned hits. The
+    optional ANN index is read into memory.
+    """
+
+    def __init__(
+        self, segment_id: str, path: str, settings: Optional[IndexSettings] = None
+    ) -> None:
+        self.segment_id = segment_id
+        self.path = path
+        self.settings = settings or IndexSettings()
+        with open(os.path.join(path, "segment.json"), "r", encoding="utf-8") as fh:
+            info = json.load(fh)
+        self.document_ids: List[str] = info["documents"]
+        # Segments written before index selection existed are float32 and flat
+        self.storage = info.get("storage", "float32")
+        self.index_type = info.get("index_type", "flat")
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.sq_params = (
+            np.load(os.path.join(path, "sq_params.npy"))
+            if self.storage == "sq8"
+            else None
+        )
+        index_path = os.path.join(path, "index.faiss")
+        self.index = (
+            faiss.read_index(index_path) if os.path.exists(index_path) else None
+        )
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        # Plain ndarray views keep the mapping but skip np.memmap's per-access overhead
+        self.offsets = np.asarray(
+            np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        )
+        self.rows = np.asarray(np.load(os.path.join(path, "rows.npy"), mmap_mode="r"))
+        self.text = np.asarray(
+            np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r")
+        )
+        # Segments written before the lexical index existed get one in memory
+        self.lexical = LexicalIndex.load(path) or LexicalIndex.build(
+            self.chunk_text(position) for position in range(self.ntotal)
+        )
+        # Row positions of every document, used to build per-query ID filters
+        doc_column = np.asarray(self.rows["doc"])
+        order = np.argsort(doc_column, kind="stable")
+        bounds = np.searchsorted(
+            doc_column[order], np.arange(len(self.document_ids) + 1)
+        )
+        self.doc_positions = {
+            document_id: order[bounds[idx] : bounds[idx + 1]].astype(np.int64)
+            for idx, document_id in enumerate(self.document_ids)
+        }
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def chunk_text(self, position: int) -> str:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.text[start:end].tobytes().decode("utf-8")
+
+    def document(self, position: int) -> Document:
+        """Materialize one row as a LangChain Document."""
+        row = self.rows[position]
+        page = int(row["page"])
+        return Document(
+            page_content=self.chunk_text(position),
+            metadata={
+                "page": page if page >= 0 else None,
+                "document_id": self.document_ids[int(row["doc"])],
+            },
+        )
+
+    def dead_rows(self, tombstones: Dict[str, Iterable[int]]) -> Optional[np.ndarray]:
+        """Boolean mask of rows whose (document, page) was replaced; None if none."""
+        mask = None
+        for document_id, pages in tombstones.items():
+            positions = self.doc_positions.get(document_id)
+            if positions is None or not pages:
+                continue
+            dead = positions[np.isin(self.rows["page"][positions], list(pages))]
+            if dead.size:
+                if mask is None:
+                    mask = np.zeros(self.ntotal, dtype=bool)
+                mask[dead] = True
+        return mask
+
+    def allowed_rows(
+        self,
+        document_ids: Set[str],
+        tombstones: Optional[Dict[str, Iterable[int]]] = None,
+    ) -> Optional[np.ndarray]:
+        """Live rows belonging to `document_ids`; None when every row is allowed."""
+        present = [d for d in document_ids if d in self.doc_positions]
+        dead = self.dead_rows(tombstones) if tombstones else None
+        if len(present) == len(self.doc_positions) and dead is None:
+            return None
+        if not present:
+            return np.empty(0, dtype=np.int64)
+        if len(present) == len(self.doc_positions):
+            rows = np.arange(self.ntotal, dtype=np.int64)
+        else:
+            rows = np.sort(np.concatenate([self.doc_positions[d] for d in present]))
+        return rows if dead is None else rows[~dead[rows]]
+
+    def decoded_vectors(self) -> np.ndarray:
+        """All rows as a float32 matrix."""
+        return decode_vectors(self.vectors, self.sq_params)
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        document_ids: Set[str],
+        exact: bool = False,
+        tombstones: Optional[Dict[str, Iterable[int]]] = None,
+    ) -> List[Tuple[str, Document, float]]:
+        """Top-k live chunks of this segment restricted to `document_ids`.
+
+        Uses the ANN index when the segment has one, unless `exact` is set or
+        the filter keeps so few rows that scanning them is cheaper and exact.
+
+        Returns:
+            List of (document_id, Document, score) sorted by ascending squared L2
+            distance, the same score FAISS' L2 indexes report
+        """
+        rows = self.allowed_rows(document_ids, tombstones)
+        if rows is not None and rows.size == 0:
+            return []
+        distances, positions = search_vectors(
+            self.vectors,
+            self.norms,
+            self.sq_params,
+            self.index,
+            np.asarray(query_vector, dtype=np.float32),
+            k,
+            self.settings,
+            rows,
+            exact,
+        )
+
+        hits: List[Tuple[str, Document, float]] = []
+        for position, distance in zip(positions, distances):
+            doc = self.document(int(position))
+            hits.append((doc.metadata["document_id"], doc, float(distance)))
+        return hits
+
+    def lexical_search(
+        self,
+        tokens: List[str],
+        idf: np.ndarray,
+        avg_length: float,
+        k: int,
+        document_ids: Set[str],
+        tombstones: Optional[Dict[str, Iterable[int]]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Top-k live rows by BM25 score, restricted to `document_ids`.
+
+        Returns:
+            List of (row position, score) sorted by descending score; callers
+            materialize only the rows they keep with `document`
+        """
+        allowed = self.allowed_rows(document_ids, tombstones)
+        if allowed is not None and allowed.size == 0:
+            return []
+        rows, scores = self.lexical.scores(tokens, idf, avg_length, allowed)
+        if len(rows) > k:
+            # Every row scoring at least the k-th best, so ties at the cut are
+            # broken by row position below rather than by partition order
+            threshold = -np.partition(-scores, k - 1)[k - 1]
+            keep = scores >= threshold
+            rows, scores = rows[keep], scores[keep]
+        # Descending score, ties by row position
+        order = np.lexsort((rows, -scores))[:k]
+        return [(int(rows[idx]), float(scores[idx])) for idx in order]
+
+    def export_blocks(
+        self,
+        tombstones: Optional[Dict[str, Iterable[int]]] = None,
+        document_ids: Optional[Set[str]] = None,
+        block_rows: int = SCAN_BLOCK_ROWS,
+    ) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """Yield (texts, vectors, metadatas) of the live rows in row order.
+
+        Rows come in blocks of at most `block_rows`, read from the mapped
+        files, so exporting a large segment never decodes it whole.
+
+        Args:
+            tombstones: Replaced pages per document, left out of the export
+            document_ids: Only export these documents (defaults to all)
+            block_rows: Rows per yielded block
+        """
+        if document_ids is None:
+            positions = np.arange(self.ntotal, dtype=np.int64)
+        else:
+            positions = self.allowed_rows(document_ids)
+            if positions is None:
+                positions = np.arange(self.ntotal, dtype=np.int64)
+        dead = self.dead_rows(tombstones) if tombstones else None
+        if dead is not None:
+            positions = positions[~dead[positions]]
+        for start in range(0, positions.size, block_rows):
+            block = positions[start : start + block_rows]
+            yield (
+                [self.chunk_text(int(position)) for position in block],
+                decode_vectors(self.vectors[block], self.sq_params),
+                [
+                    {
+                        "page": int(row["page"]) if row["page"] >= 0 else None,
+                        "document_id": self.document_ids[int(row["doc"])],
+                    }
+                    for row in self.rows[block]
+                ],
+            )
+
+
+def copy_blocks(
+    blocks: Iterable[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]],
+    document_id: str,
+    writer: SegmentWriter,
+) -> None:
+    """Append exported (texts, vectors, metadatas) blocks to `writer` under `document_id`.
+
+    Raises:
+        ValueError: If there were no rows to copy
+    """
+    for texts, vectors, metadatas in blocks:
+        writer.add(
+            texts, vectors, [{**m, "document_id": document_id} for m in metadatas]
+        )
+    if not writer.rows:
+        raise ValueError(f"No chunks to copy into {document_id}")
+
+
+def _page_chunks(pages: Iterable[int], n_pages: int) -> List[int]:
+    # Number of chunks per 1-based page, used to keep chunk totals after page swaps
+    counts = [0] * n_pages
+    for page in pages:
+        if 1 <= page <= n_pages:
+            counts[page - 1] += 1
+    return counts
+
+
+def _file_stamp(stat: os.stat_result) -> Tuple[int, ...]:
+    """Identifies one written version of a file that is replaced by renames."""
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class SegmentedVectorStore:
+    """Vector store made of a few large FAISS segments instead of one index per file.
+
+    New documents are appended as small segments; a background merger
+    combines small segments into larger ones. Queries only visit segments
+    that hold at least one requested document and restrict the scan inside
+    each segment with an ID filter, so search cost tracks the number of
+    vectors rather than the number of documents.
+
+    Segments are immutable. Re-indexing changed pages of a document appends
+    a segment with the new chunks and tombstones the old (document, page)
+    rows in the manifest; merges drop tombstoned rows for good.
+
+    Several processes (e.g. uvicorn workers) can open the same root. Manifest
+    changes are serialized by an exclusive lock on manifest.lock and applied
+    on top of the latest manifest on disk; readers pick up other processes'
+    changes with `refresh`, one stat when nothing changed. Segment files are
+    memory-mapped read-only, so their pages are shared between processes.
+    Only the process holding merge.lock runs background merges.
+
+    Layout:
+        <root>/manifest.json                 documents -> segments, segment sizes
+        <root>/manifest.lock                 writer lock (flock)
+        <root>/merge.lock                    held by the process merging segments
+        <root>/segments/<segment_id>/        columnar files, see write_segment_files
+    """
+
+    def __init__(
+        self,
+        root: str,
+        cache: IndexCache,
+        merge_factor: int = 8,
+        target_vectors: int = 50000,
+        merge_interval: float = 30.0,
+        retire_seconds: float = 60.0,
+        background_merge: bool = True,
+        preload: bool = True,
+        index_settings: Optional[IndexSettings] = None,
+        search_workers: int = 4,
+    ) -> None:
+        """
+        Args:
+            root: Directory holding the manifest and the segments folder
+            cache: LRU cache for loaded segments
+            merge_factor: Number of small segments that triggers a merge
+            target_vectors: Segments below this size are merge candidates and
+                merges stop growing a segment beyond it
+            merge_interval: Seconds between background merge checks
+            retire_seconds: Grace period before merged-away segments are deleted
+            background_merge: Start the background merger thread
+            preload: Put freshly written segments straight into the cache
+            index_settings: Index type and vector storage of new segments
+            search_workers: Segments searched concurrently by one query
+                (1 searches them one after another)
+        """
+        self.root = root
+        self.segments_path = os.path.join(root, "segments")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.cache = cache
+        self.merge_factor = max(2, merge_factor)
+        self.target_vectors = target_vectors
+        self.merge_interval = merge_interval
+        self.retire_seconds = retire_seconds
+        self.preload = preload
+        self.index_settings = index_settings or IndexSettings()
+        os.makedirs(self.segments_path, exist_ok=True)
+        # FAISS and numpy release the GIL, so segment scans overlap in threads
+        self._search_executor = (
+            ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="search")
+            if search_workers > 1
+            else None
+        )
+
+        self._lock = threading.RLock()
+        # Cross-process writer lock: flock on a file opened on first write, so
+        # read-only replicas never need write access to the root
+        self._write_mutex = threading.RLock()
+        self._write_depth = 0
+        self._lock_file: Optional[Any] = None
+        self._manifest, self._manifest_stamp = self._read_manifest()
+        self._merge_wakeup = threading.Event()
+        self._warn_pickle_segments()
+        if background_merge:
+            threading.Thread(
+                target=self._merge_loop, name="segment-merger", daemon=True
+            ).start()
+
+    @classmethod
+    def from_env(
+        cls,
+        root: str,
+        cache: IndexCache,
+        preload: bool = True,
+    ) -> "SegmentedVectorStore":
+        return cls(
+            root,
+            cache,
+            preload=preload,
+            merge_factor=int(os.getenv("SEGMENT_MERGE_FACTOR", "8")),
+            target_vectors=int(os.getenv("SEGMENT_TARGET_VECTORS", "50000")),
+            merge_interval=float(os.getenv("SEGMENT_MERGE_INTERVAL_SECONDS", "30")),
+            background_merge=os.getenv("SEGMENT_BACKGROUND_MERGE", "true").lower()
+            in ("1", "true", "yes"),
+            index_settings=IndexSettings.from_env(),
+            search_workers=int(os.getenv("SEARCH_MAX_WORKERS", "4")),
+        )
+
+    def _read_manifest(self) -> Tuple[Dict[str, Any], Optional[Tuple[int, ...]]]:
+        """The manifest on disk and the stamp of the file it was read from."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as fh:
+                # Stamp the opened file, not the path: a rename in between
+                # must not pair an old manifest with the new stamp
+                return json.load(fh), _file_stamp(os.fstat(fh.fileno()))
+        except FileNotFoundError:
+            pass
+        empty = {
+            "version": 0,
+            "next_segment": 1,
+            "segments": {},
+            "documents": {},
+            "retired": [],
+        }
+        return empty, None
+
+    def _write_manifest(self) -> None:
+        # Write-then-rename so readers never observe a partially written
+        # manifest; the caller holds the writer lock, so the tmp name is ours
+        self._manifest["version"] += 1
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self._manifest, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+            stamp = _file_stamp(os.fstat(fh.fileno()))
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_stamp = stamp
+
+    def _manifest_file_stamp(self) -> Optional[Tuple[int, ...]]:
+        try:
+            return _file_stamp(os.stat(self.manifest_path))
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> bool:
+        """Re-read the manifest if another process rewrote it.
+
+        Costs one stat when nothing changed. Every rewrite renames a new file
+        into place, so a changed inode or mtime means a new version.
+
+        Returns:
+            True if a newer manifest was loaded
+        """
+        stamp = self._manifest_file_stamp()
+        with self._lock:
+            if stamp is None or stamp == self._manifest_stamp:
+                return False
+            self._manifest, self._manifest_stamp = self._read_manifest()
+            return True
+
+    def version(self) -> int:
+        """Version of the manifest this process currently serves."""
+        with self._lock:
+            return self._manifest["version"]
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """Hold the manifest writer lock of every thread and process.
+
+        The manifest is brought up to date once the lock is held, so changes
+        made inside apply on top of what other processes published. Readers
+        in this process only wait for the in-memory update, never for
+        another process's write.
+        """
+        with self._write_mutex:
+            if self._write_depth == 0:
+                if self._lock_file is None:
+                    self._lock_file = open(
+                        os.path.join(self.root, "manifest.lock"), "a+b"
+                    )
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._write_depth += 1
+            try:
+                with self._lock:
+                    if self._write_depth == 1:
+                        self.refresh()
+                    yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            return document_id in self._manifest["documents"]
+
+    def document_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._manifest["documents"].keys())
+
+    def document_info(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Manifest entry of a document: segments, chunks, version and hashes."""
+        with self._lock:
+            info = self._manifest["documents"].get(document_id)
+            return json.loads(json.dumps(info)) if info is not None else None
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        """Id of a document whose current content has this hash, if any."""
+        with self._lock:
+            for document_id, info in self._manifest["documents"].items():
+                if info.get("content_hash") == content_hash:
+                    return document_id
+        return None
+
+    def tombstones(
+        self, segment_id: str, document_ids: Iterable[str]
+    ) -> Dict[str, List[int]]:
+        """Replaced pages of `document_ids` inside one segment."""
+        with self._lock:
+            documents = self._manifest["documents"]
+            return {
+                document_id: documents[document_id]["tombstones"][segment_id]
+                for document_id in document_ids
+                if segment_id in documents.get(document_id, {}).get("tombstones", {})
+            }
+
+    def document_pages(self, document_id: str) -> List[int]:
+        """Pages (-1 for unknown) that currently have chunks of a document."""
+        pages: Set[int] = set()
+        for segment_id in self.segments_for([document_id]):
+            segment = self.load_segment(segment_id)
+            rows = segment.allowed_rows(
+                {document_id}, self.tombstones(segment_id, [document_id])
+            )
+            if rows is None:
+                rows = np.arange(segment.ntotal)
+            pages.update(int(page) for page in segment.rows["page"][rows])
+        return sorted(pages)
+
+    def iter_document_vectors(self, document_id: str) -> Iterator[np.ndarray]:
+        """Live vectors of one document as float32 blocks, in segment order."""
+        for segment_id in sorted(self.segments_for([document_id])):
+            segment = self.load_segment(segment_id)
+            rows = segment.allowed_rows(
+                {document_id}, self.tombstones(segment_id, [document_id])
+            )
+            if rows is None:
+                rows = np.arange(segment.ntotal, dtype=np.int64)
+            for start in range(0, rows.size, SCAN_BLOCK_ROWS):
+                block = rows[start : start + SCAN_BLOCK_ROWS]
+                yield decode_vectors(segment.vectors[block], segment.sq_params)
+
+    def segment_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._manifest["segments"].keys())
+
+    def segment_path(self, segment_id: str) -> str:
+        return os.path.join(self.segments_path, segment_id)
+
+    def _new_segment_id(self) -> str:
+        # Published right away so no other process hands out the same id
+        with self._write_lock():
+            segment_id = f"seg_{self._manifest['next_segment']:08d}"
+            self._manifest["next_segment"] += 1
+            self._write_manifest()
+            return segment_id
+
+    def begin_segment(self, document_id: Optional[str] = None) -> SegmentWriter:
+        """Start a new segment that chunks can be appended to in batches.
+
+        Pass the writer to `commit_document` or `commit_pages` once every
+        chunk is added, or to `discard_segment` to drop it.
+
+        Args:
+            document_id: Document the segment is for; only partitioned stores
+                need it, to pick the partition
+        """
+        segment_id = self._new_segment_id()
+        tmp_dir = os.path.join(self.segments_path, f".tmp-{segment_id}")
+        # Leftovers of an interrupted write were never published; discard them
+        for stale in (tmp_dir, self.segment_path(segment_id)):
+            shutil.rmtree(stale, ignore_errors=True)
+        return SegmentWriter(tmp_dir, self.index_settings, segment_id)
+
+    def discard_segment(self, writer: SegmentWriter) -> None:
+        writer.abort()
+        shutil.rmtree(writer.path, ignore_errors=True)
+
+    def _publish_segment(self, writer: SegmentWriter) -> Segment:
+        """Finish and move a segment into place; it is invisible until the manifest lists it."""
+        segment_id = writer.segment_id
+        final_dir = self.segment_path(segment_id)
+        writer.close()
+        os.replace(writer.path, final_dir)
+        segment = Segment(segment_id, final_dir, self.index_settings)
+        if self.preload:
+            # Warm the cache so the first query after a write skips the disk load
+            self.cache.put(
+                segment_id,
+                self._segment_mtime(segment_id),
+                segment,
+                self._segment_size(segment_id),
+            )
+        return segment
+
+    def add_document(
+        self,
+        document_id: str,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Append one document's chunks as a new small segment.
+
+        Args:
+            document_id: Id the chunks are stored under
+            texts: Chunk texts
+            vectors: Chunk embeddings
+            metadatas: Chunk metadata with a 1-based "page"
+            fingerprint: Optional {"content_hash", "page_hashes"} of the source file
+
+        Returns:
+            The id of the segment holding the document
+        """
+        writer = self.begin_segment()
+        writer.add(
+            texts, vectors, [{**m, "document_id": document_id} for m in metadatas]
+        )
+        return self.commit_document(document_id, writer, fingerprint)
+
+    def commit_document(
+        self,
+        document_id: str,
+        writer: SegmentWriter,
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Publish a segment from `begin_segment` holding one new document.
+
+        If a concurrent upload indexed the same document first, this one
+        replaces every page of it (the later upload wins, as a re-upload
+        would), unless both had the same content.
+
+        Args:
+            document_id: Id the chunks were written under
+            writer: Segment holding every chunk of the document
+            fingerprint: Optional {"content_hash", "page_hashes"} of the source file
+
+        Returns:
+            The id of the segment holding the document
+
+        Raises:
+            RuntimeError: If the document was indexed concurrently and this
+                upload has no fingerprint to replace it with
+        """
+        try:
+            segment = self._publish_segment(writer)
+        except BaseException:
+            self.discard_segment(writer)
+            raise
+        segment_id = writer.segment_id
+        with self._write_lock():
+            existing = self._manifest["documents"].get(document_id)
+            if existing is not None:
+                # A concurrent upload of the same document committed first
+                same_content = fingerprint is not None and existing.get(
+                    "content_hash"
+                ) == fingerprint.get("content_hash")
+                if same_content or fingerprint is None:
+                    shutil.rmtree(self.segment_path(segment_id), ignore_errors=True)
+                    self.cache.invalidate(segment_id)
+                    if same_content:
+                        return existing["segments"][0]
+                    raise RuntimeError(
+                        f"Document {document_id} was indexed concurrently; retry"
+                    )
+                pages = set(range(1, len(fingerprint["page_hashes"]) + 1))
+                if existing.get("page_hashes") is not None:
+                    pages.update(range(1, len(existing["page_hashes"]) + 1))
+                else:
+                    pages.update(self.document_pages(document_id))
+                self._replace_pages(
+                    document_id, existing, pages, writer, segment, fingerprint
+                )
+                self._write_manifest()
+                logging.info(
+                    "[SegmentedVectorStore] %s was indexed concurrently; "
+                    "replaced it with the later upload",
+                    document_id,
+                )
+                self._merge_wakeup.set()
+                return segment_id
+            self._manifest["segments"][segment_id] = {
+                "vectors": segment.ntotal,
+                "documents": [document_id],
+            }
+            info = {"segments": [segment_id], "chunks": writer.rows, "version": 1}
+            if fingerprint is not None:
+                page_hashes = list(fingerprint["page_hashes"])
+                info.update(
+                    content_hash=fingerprint["content_hash"],
+                    page_hashes=page_hashes,
+                    page_chunks=writer.page_counts(len(page_hashes)),
+                    tombstones={},
+                )
+            self._manifest["documents"][document_id] = info
+            self._write_manifest()
+        self._merge_wakeup.set()
+        return segment_id
+
+    def replace_pages(
+        self,
+        document_id: str,
+        pages: Iterable[int],
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        fingerprint: Dict[str, Any],
+        base_version: int,
+    ) -> Optional[str]:
+        """Swap the chunks of some pages of an indexed document.
+
+        The old rows of `pages` are tombstoned in every segment of the document
+        and the new chunks are appended as one small segment.
+
+        Args:
+            document_id: An indexed document
+            pages: 1-based pages whose chunks are replaced (including removed pages)
+            texts: New chunk texts of those pages
+            vectors: New chunk embeddings
+            metadatas: New chunk metadata with a 1-based "page"
+            fingerprint: {"content_hash", "page_hashes"} of the new file
+            base_version: Document version the page diff was computed against
+
+        Returns:
+            The id of the new segment, or None if the pages have no chunks left
+
+        Raises:
+            RuntimeError: If the document changed since `base_version`
+        """
+        writer = self.begin_segment()
+        writer.add(
+            texts, vectors, [{**m, "document_id": document_id} for m in metadatas]
+        )
+        return self.commit_pages(document_id, pages, writer, fingerprint, base_version)
+
+    def commit_pages(
+        self,
+        document_id: str,
+        pages: Iterable[int],
+        writer: SegmentWriter,
+        fingerprint: Dict[str, Any],
+        base_version: int,
+    ) -> Optional[str]:
+        """Publish a segment from `begin_segment` replacing some pages of a document.
+
+        See `replace_pages`; `writer` holds the new chunks of `pages` and is
+        dropped if it has none.
+        """
+        pages = sorted(set(pages))
+        segment_id, segment = None, None
+        if writer.rows:
+            try:
+                segment = self._publish_segment(writer)
+            except BaseException:
+                self.discard_segment(writer)
+                raise
+            segment_id = writer.segment_id
+        else:
+            self.discard_segment(writer)
+        with self._write_lock():
+            info = self._manifest["documents"].get(document_id)
+            if info is None or info.get("version", 1) != base_version:
+                if segment_id is not None:
+                    shutil.rmtree(self.segment_path(segment_id), ignore_errors=True)
+                    self.cache.invalidate(segment_id)
+                raise RuntimeError(
+                    f"Document {document_id} changed while it was re-indexed; retry"
+                )
+            self._replace_pages(document_id, info, pages, writer, segment, fingerprint)
+            self._write_manifest()
+        self._merge_wakeup.set()
+        return segment_id
+
+    def _replace_pages(
+        self,
+        document_id: str,
+        info: Dict[str, Any],
+        pages: Iterable[int],
+        writer: SegmentWriter,
+        segment: Optional[Segment],
+        fingerprint: Dict[str, Any],
+    ) -> None:
+        # Caller holds the write lock; `segment` is the published `writer` (None if empty)
+        pages = sorted(set(pages))
+        tombstones = info.setdefault("tombstones", {})
+        for existing in info["segments"]:
+            tombstones[existing] = sorted(
+                set(tombstones.get(existing, [])) | set(pages)
+            )
+        if segment is not None:
+            self._manifest["segments"][writer.segment_id] = {
+                "vectors": segment.ntotal,
+                "documents": [document_id],
+            }
+            info["segments"].append(writer.segment_id)
+        if pages:
+            info["version"] = info.get("version", 1) + 1
+
+        page_hashes = list(fingerprint["page_hashes"])
+        page_chunks = list(info.get("page_chunks") or [])
+        page_chunks = (page_chunks + [0] * len(page_hashes))[: len(page_hashes)]
+        new_counts = writer.page_counts(len(page_hashes))
+        for page in pages:
+            if page <= len(page_hashes):
+                page_chunks[page - 1] = new_counts[page - 1]
+        info.update(
+            content_hash=fingerprint["content_hash"],
+            page_hashes=page_hashes,
+            page_chunks=page_chunks,
+            chunks=sum(page_chunks),
+        )
+
+    def copy_document(
+        self,
+        source_id: str,
+        document_id: str,
+        fingerprint: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Index the live chunks of `source_id` again under `document_id`.
+
+        Used when identical content arrives under a new name: vectors are
+        copied from the store instead of being re-embedded, block by block.
+        """
+        writer = self.begin_segment(document_id)
+        try:
+            copy_blocks(self.export_document_blocks(source_id), document_id, writer)
+        except BaseException:
+            self.discard_segment(writer)
+            raise
+        return self.commit_document(document_id, writer, fingerprint)
+
+    def export_document(
+        self, document_id: str
+    ) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """(texts, vectors, metadatas with "page") of a document's live chunks, in page order.
+
+        Holds the whole document in memory; `export_document_blocks` streams it.
+
+        Raises:
+            ValueError: If the document has no chunks
+        """
+        texts: List[str] = []
+        vectors: List[np.ndarray] = []
+        metadatas: List[Dict[str, Any]] = []
+        for block_texts, block_vectors, block_metadatas in self.export_document_blocks(
+            document_id
+        ):
+            texts.extend(block_texts)
+            vectors.append(block_vectors)
+            metadatas.extend(block_metadatas)
+        if not texts:
+            raise ValueError(f"Document {document_id} has no chunks to copy")
+        return texts, np.vstack(vectors), metadatas
+
+    def export_document_blocks(
+        self, document_id: str, block_rows: int = SCAN_BLOCK_ROWS
+    ) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """Yield a document's live chunks in page order, at most `block_rows` at a time.
+
+        Only the row positions of the whole document are held in memory;
+        texts and vectors are read from the mapped segments one block at a time.
+
+        Yields:
+            (texts, float32 vectors, metadatas with "page")
+        """
+        segments: List[Segment] = []
+        located: List[Tuple[np.ndarray, np.ndarray]] = []
+        for segment_id in sorted(self.segments_for([document_id])):
+            segment = self.load_segment(segment_id)
+            rows = segment.allowed_rows(
+                {document_id}, self.tombstones(segment_id, [document_id])
+            )
+            if rows is None:
+                rows = np.arange(segment.ntotal, dtype=np.int64)
+            segments.append(segment)
+            located.append((np.full(rows.size, len(segments) - 1), rows))
+        if not located:
+            return
+        owners = np.concatenate([owner for owner, _ in located])
+        positions = np.concatenate([rows for _, rows in located])
+        pages = np.concatenate(
+            [segments[idx].rows["page"][rows] for idx, (_, rows) in enumerate(located)]
+        )
+        # Keep page order stable regardless of which segment holds each page
+        order = np.argsort(np.maximum(pages, 0), kind="stable")
+        for start in range(0, order.size, block_rows):
+            block = order[start : start + block_rows]
+            vectors = np.empty((block.size, segments[0].vectors.shape[1]), np.float32)
+            for owner in np.unique(owners[block]):
+                mine = owners[block] == owner
+                segment = segments[owner]
+                vectors[mine] = decode_vectors(
+                    segment.vectors[positions[block][mine]], segment.sq_params
+                )
+            yield (
+                [
+                    segments[owners[idx]].chunk_text(int(positions[idx]))
+                    for idx in block
+                ],
+                vectors,
+                [
+                    {"page": int(pages[idx]) if pages[idx] >= 0 else None}
+                    for idx in block
+                ],
+            )
+
+    def _warn_pickle_segments(self) -> None:
+        pickled = [
+            segment_id
+            for segment_id in self.segment_ids()
+            if not os.path.exists(
+                os.path.join(self.segment_path(segment_id), "segment.json")
+            )
+        ]
+        legacy = [
+            entry
+            for entry in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, entry, "index.pkl"))
+            and not self.has_document(entry)
+        ]
+        if pickled or legacy:
+            logging.warning(
+                "[SegmentedVectorStore] Found %d pickle segments and %d per-file "
+                "indexes in the old format; they are not searchable until you run "
+                "`python -m services.migrate_vector_store`",
+                len(pickled),
+                len(legacy),
+            )
+
+    def _segment_mtime(self, segment_id: str) -> float:
+        # segment.json is written last, so its mtime identifies a complete segment
+        return os.path.getmtime(
+            os.path.join(self.segment_path(segment_id), "segment.json")
+        )
+
+    def _segment_size(self, segment_id: str) -> int:
+        # Memory-mapped pages are shared and evictable; file size bounds the footprint
+        segment_dir = self.segment_path(segment_id)
+        return sum(
+            entry.stat().st_size for entry in os.scandir(segment_dir) if entry.is_file()
+        )
+
+    def load_segment(self, segment_id: str) -> Segment:
+        """Return a segment, served from the LRU cache when fresh."""
+
+        def load() -> Segment:
+            with stage_timer("retrieval", "index_load"):
+                return Segment(
+                    segment_id, self.segment_path(segment_id), self.index_settings
+                )
+
+        return self.cache.get_or_load(
+            segment_id,
+            self._segment_mtime(segment_id),
+            loader=load,
+            size_of=lambda _segment: self._segment_size(segment_id),
+        )
+
+    def segments_for(self, document_ids: Iterable[str]) -> Dict[str, Set[str]]:
+        """Group the known documents among `document_ids` by the segments holding them."""
+        grouped: Dict[str, Set[str]] = defaultdict(set)
+        with self._lock:
+            documents = self._manifest["documents"]
+            for document_id in document_ids:
+                for segment_id in documents.get(document_id, {}).get("segments", []):
+                    grouped[segment_id].add(document_id)
+        return dict(grouped)
+
+    def search(
+        self,
+        query_vector: List[float],
+        k: int,
+        document_ids: Iterable[str],
+    ) -> Tuple[List[Tuple[str, Document, float]], Dict[str, int]]:
+        """Top-k chunks across the segments holding `document_ids`.
+
+        Returns:
+            Tuple of (list of (document_id, Document, score) ascending by score,
+            {"segments_searched"})
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        grouped = self.segments_for(document_ids)
+
+        def search_segment(
+            item: Tuple[str, Set[str]],
+        ) -> List[Tuple[str, Document, float]]:
+            segment_id, allowed = item
+            try:
+                return self.load_segment(segment_id).search(
+                    query,
+                    k,
+                    allowed,
+                    tombstones=self.tombstones(segment_id, allowed),
+                )
+            except Exception as exc:
+                logging.error(
+                    "[SegmentedVectorStore] Failed searching segment %s: %s",
+                    segment_id,
+                    exc,
+                )
+                return []
+
+        if self._search_executor is not None and len(grouped) > 1:
+            # Each task runs in a copy of the caller's context so index loads
+            # are still attributed to the request
+            items = list(grouped.items())
+            contexts = [copy_context() for _ in items]
+            per_segment = self._search_executor.map(
+                lambda context, item: context.run(search_segment, item),
+                contexts,
+                items,
+            )
+        else:
+            per_segment = map(search_segment, grouped.items())
+        aggregated: List[Tuple[str, Document, float]] = [
+            hit for hits in per_segment for hit in hits
+        ]
+        aggregated.sort(key=lambda triple: triple[2])  # ascending by score
+        return aggregated[:k], {"segments_searched": len(grouped)}
+
+    def lexical_search(
+        self,
+        query: str,
+        k: int,
+        document_ids: Iterable[str],
+    ) -> Tuple[List[Tuple[str, Document, float]], Dict[str, int]]:
+        """Top-k chunks by BM25 across the segments holding `document_ids`.
+
+        Term statistics are combined across the searched segments, so scores
+        from different segments are comparable. Query tokens are built per
+        segment: a compound is searched whole where a segment indexes it and
+        by its parts elsewhere.
+
+        Returns:
+            Tuple of (list of (document_id, Document, score) descending by score,
+            {"segments_searched"})
+        """
+        grouped = self.segments_for(document_ids)
+        if not grouped:
+            return [], {"segments_searched": 0}
+        segments = {segment_id: self.load_segment(segment_id) for segment_id in grouped}
+        tokens = {
+            segment_id: query_tokens(query, segment.lexical)
+            for segment_id, segment in segments.items()
+        }
+        vocabulary = list(dict.fromkeys(t for ts in tokens.values() for t in ts))
+        if not vocabulary:
+            return [], {"segments_searched": 0}
+        idf, avg_length = corpus_idf(
+            [segment.lexical for segment in segments.values()], vocabulary
+        )
+        idf_by_token = dict(zip(vocabulary, idf.tolist()))
+        ranked: List[Tuple[float, str, int]] = []
+        for segment_id, segment in segments.items():
+            allowed = grouped[segment_id]
+            ranked.extend(
+                (score, segment_id, position)
+                for position, score in segment.lexical_search(
+                    tokens[segment_id],
+                    np.array([idf_by_token[t] for t in tokens[segment_id]]),
+                    avg_length,
+                    k,
+                    allowed,
+                    tombstones=self.tombstones(segment_id, allowed),
+                )
+            )
+        # Descending by score, ties by segment and row
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+        hits: List[Tuple[str, Document, float]] = []
+        for score, segment_id, position in ranked[:k]:
+            doc = segments[segment_id].document(position)
+            hits.append((doc.metadata["document_id"], doc, score))
+        return hits, {"segments_searched": len(grouped)}
+
+    def _merge_loop(self) -> None:
+        merge_lock = None
+        while True:
+            self._merge_wakeup.wait(timeout=self.merge_interval)
+            self._merge_wakeup.clear()
+            try:
+                if merge_lock is None:
+                    merge_lock = self._acquire_merge_lock()
+                    if merge_lock is None:
+                        # Another process merges this store
+                        continue
+                while self.merge_once():
+                    pass
+                self._delete_retired()
+            except Exception:
+                logging.exception("[SegmentedVectorStore] Background merge failed")
+
+    def _acquire_merge_lock(self) -> Optional[Any]:
+        """Lock merge.lock without waiting; the file stays locked while open."""
+        handle = open(os.path.join(self.root, "merge.lock"), "a+b")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+        logging.info("[SegmentedVectorStore] pid %d merges %s", os.getpid(), self.root)
+        return handle
+
+    def _pick_merge(self) -> List[str]:
+        self.refresh()
+        with self._lock:
+            small = sorted(
+                (
+                    (info["vectors"], segment_id)
+                    for segment_id, info in self._manifest["segments"].items()
+                    if info["vectors"] < self.target_vectors
+                ),
+            )
+        if len(small) < self.merge_factor:
+            return []
+        picked: List[str] = []
+        total = 0
+        for vectors, segment_id in small:
+            if picked and total + vectors > self.target_vectors:
+                break
+            picked.append(segment_id)
+            total += vectors
+        return picked if len(picked) >= 2 else []
+
+    def merge_once(self) -> bool:
+        """Merge one group of small segments into a larger one.
+
+        Returns:
+            True if a merge happened
+        """
+        picked = self._pick_merge()
+        if not picked:
+            return False
+
+        # Tombstoned rows are dropped here, so the merged segment needs none
+        dropped = {
+            segment_id: self.tombstones(segment_id, self.document_ids())
+            for segment_id in picked
+        }
+        # Copied block by block from the mapped segments into the merged one
+        writer = self.begin_segment()
+        try:
+            for segment_id in picked:
+                for texts, vectors, metadatas in self.load_segment(
+                    segment_id
+                ).export_blocks(dropped[segment_id]):
+                    writer.add(texts, vectors, metadatas)
+            merged = self._publish_segment(writer)
+        except BaseException:
+            self.discard_segment(writer)
+            raise
+        merged_id = writer.segment_id
+
+        with self._write_lock():
+            segments = self._manifest["segments"]
+            if any(segment_id not in segments for segment_id in picked) or any(
+                self.tombstones(segment_id, self.document_ids()) != dropped[segment_id]
+                for segment_id in picked
+            ):
+                # The set changed underneath us; drop the merged copy
+                shutil.rmtree(self.segment_path(merged_id), ignore_errors=True)
+                self.cache.invalidate(merged_id)
+                return False
+            merged_docs = sorted(
+                {
+                    doc
+                    for segment_id in picked
+                    for doc in segments[segment_id]["documents"]
+                }
+            )
+            for segment_id in picked:
+                del segments[segment_id]
+            segments[merged_id] = {"vectors": merged.ntotal, "documents": merged_docs}
+            for document_id in merged_docs:
+                info = self._manifest["documents"][document_id]
+                info["segments"] = [s for s in info["segments"] if s not in picked]
+                info["segments"].append(merged_id)
+                for segment_id in picked:
+                    info.get("tombstones", {}).pop(segment_id, None)
+            # Readers that already resolved the old segments get a grace period
+            self._manifest["retired"].extend(
+                {"segment": segment_id, "at": time.time()} for segment_id in picked
+            )
+            self._write_manifest()
+
+        for segment_id in picked:
+            self.cache.invalidate(segment_id)
+        logging.info(
+            "[SegmentedVectorStore] Merged %d segments into %s (%d vectors)",
+            len(picked),
+            merged_id,
+            merged.ntotal,
+        )
+        return True
+
+    def _delete_retired(self) -> None:
+        now = time.time()
+        with self._write_lock():
+            retired = self._manifest["retired"]
+            expired = [r for r in retired if now - r["at"] >= self.retire_seconds]
+            if not expired:
+                return
+            self._manifest["retired"] = [r for r in retired if r not in expired]
+            self._write_manifest()
+        for record in expired:
+            shutil.rmtree(self.segment_path(record["segment"]), ignore_errors=True)
@@ -0,0 +1,81 @@
+"""Retrieval shard: serves searches over one partition of the vector store.
+
+The API process writes and merges the partitions (see
+`services.sharding.PartitionedVectorStore`); a shard only reads its own
+partition and picks up new manifests as they are written.
+
+Usage (from the api/ directory, one process per shard):
+    SHARD_INDEX=0 uvicorn shard_server:app --port 9000
+    SHARD_INDEX=1 uvicorn shard_server:app --port 9001
+    SHARD_URLS=http://localhost:9000,http://localhost:9001 uvicorn main:app
+"""
+
+import os
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from services.ann_index import IndexSettings
+from services.index_cache import IndexCache
+from services.sharding import decode_vector, encode_hits, partition_root
+from services.vector_store import SegmentedVectorStore
+
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+
+# Read-only: never merges or preloads, the API process owns the writes
+store = SegmentedVectorStore(
+    os.getenv("SHARD_ROOT") or partition_root("./vector_store", SHARD_INDEX),
+    IndexCache.from_env(),
+    background_merge=False,
+    preload=False,
+    index_settings=IndexSettings.from_env(),
+    search_workers=int(os.getenv("SEARCH_MAX_WORKERS", "4")),
+)
+
+app = FastAPI(
+    title="RAG retrieval shard",
+    version="0.0.1",
+    description=f"Partition {SHARD_INDEX} of the vector store",
+)
+
+
+class SearchRequest(BaseModel):
+    # base64 of the little-endian float32 query vector
+    vector: str
+    k: int = 5
+    document_ids: List[str]
+
+
+class LexicalSearchRequest(BaseModel):
+    query: str
+    k: int = 5
+    document_ids: List[str]
+
+
+@app.get("/health")
+def health_check() -> dict:
+    store.refresh()
+    return {
+        "status": "ok",
+        "shard": SHARD_INDEX,
+        "documents": len(store.document_ids()),
+        "segments": len(store.segment_ids()),
+    }
+
+
+@app.post("/search")
+def search(request: SearchRequest) -> dict:
+    """Top-k chunks of the requested documents by ascending L2 distance."""
+    store.refresh()
+    hits, stats = store.search(
+        decode_vector(request.vector), request.k, request.document_ids
+    )
+    return {"hits": encode_hits(hits), **stats}
+
+
+@app.post("/lexical_search")
+def lexical_search(request: LexicalSearchRequest) -> dict:
+    """Top-k chunks of the requested documents by BM25 score."""
+    store.refresh()
+    hits, stats = store.lexical_search(request.query, request.k, request.document_ids)
+    return {"hits": encode_hits(hits), **stats}
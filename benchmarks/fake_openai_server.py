@@ -0,0 +1,370 @@
+"""Local fake of the OpenAI embeddings and chat APIs with injectable latency and rate limits.
+
+Vectors are deterministic (seeded by the input text), so runs are reproducible
+and identical texts always map to identical embeddings. Chat completions
+return a canned answer, optionally streamed token by token; a fraction of them
+can be made slow (tail latency) or return invalid JSON.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8010 --latency 0.2 --max-concurrent 4
+    OPENAI_BASE_URL=http://localhost:8010/v1 OPENAI_API_KEY=fake uvicorn main:app
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def fake_answer(prompt: str) -> str:
+    """Canned answer; strict JSON when the prompt asks for it, plain text otherwise."""
+    question = prompt.rsplit("Answer the following question:", 1)[-1].strip()
+    answer = f"Fake answer to: {question[:200]}"
+    if "STRICT JSON" in prompt:
+        return json.dumps({"answer": answer, "references": "", "citations": []})
+    return answer
+
+
+class FakeOpenAIState:
+    def __init__(
+        self,
+        dimensions: int = 1536,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        per_item_latency: float = 0.0,
+        max_concurrent: int = 0,
+        rate_limit_prob: float = 0.0,
+        chat_latency: float = 0.0,
+        token_latency: float = 0.0,
+        model_latency: dict = None,
+        slow_prob: float = 0.0,
+        slow_latency: float = 0.0,
+        slow_models: tuple = (),
+        invalid_json_prob: float = 0.0,
+    ) -> None:
+        self.dimensions = dimensions
+        self.latency = latency
+        self.jitter = jitter
+        self.per_item_latency = per_item_latency
+        self.max_concurrent = max_concurrent
+        self.rate_limit_prob = rate_limit_prob
+        self.chat_latency = chat_latency
+        self.token_latency = token_latency
+        # Per-model time-to-first-token overrides, e.g. {"gpt-4.1": 5.0}
+        self.model_latency = model_latency or {}
+        # Tail latency: this share of chat calls (to `slow_models`, or to every
+        # model when empty) waits `slow_latency` extra seconds
+        self.slow_prob = slow_prob
+        self.slow_latency = slow_latency
+        self.slow_models = tuple(slow_models)
+        self.invalid_json_prob = invalid_json_prob
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.inputs = 0
+        self.rate_limited = 0
+        # Client (host, port) of every connection that requested each path,
+        # e.g. to check that a warmed-up connection is reused
+        self.clients_by_path = {}
+
+    def record_client(self, path: str, client: tuple) -> None:
+        with self.lock:
+            self.clients_by_path.setdefault(path.rstrip("/"), set()).add(client)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "inputs": self.inputs,
+                "rate_limited": self.rate_limited,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+def make_handler(state: FakeOpenAIState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - silence per-request logs
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            state.record_client(self.path, self.client_address)
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send_json(200, state.snapshot())
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            state.record_client(self.path, self.client_address)
+            payload = self._read_json()
+            if self.path.rstrip("/").endswith("/embeddings"):
+                self._embeddings(payload)
+            elif self.path.rstrip("/").endswith("/chat/completions"):
+                self._chat(payload)
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def _throttle(self) -> bool:
+            """Admit the request, or answer 429 when over the injected limits."""
+            with state.lock:
+                state.requests += 1
+                over_limit = (
+                    state.max_concurrent and state.in_flight >= state.max_concurrent
+                )
+                if over_limit or random.random() < state.rate_limit_prob:
+                    state.rate_limited += 1
+                    throttled = True
+                else:
+                    state.in_flight += 1
+                    state.peak_in_flight = max(state.peak_in_flight, state.in_flight)
+                    throttled = False
+            if throttled:
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached", "type": "requests"}},
+                    {"Retry-After": "0.2"},
+                )
+            return throttled
+
+        def _embeddings(self, payload: dict) -> None:
+            if self._throttle():
+                return
+            try:
+                inputs = payload.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                delay = state.latency + state.per_item_latency * len(inputs)
+                time.sleep(delay + random.uniform(0, state.jitter))
+                as_base64 = payload.get("encoding_format") == "base64"
+                data = []
+                for idx, text in enumerate(inputs):
+                    vector = fake_embedding(str(text), state.dimensions)
+                    embedding = (
+                        base64.b64encode(vector.tobytes()).decode("ascii")
+                        if as_base64
+                        else vector.tolist()
+                    )
+                    data.append(
+                        {"object": "embedding", "index": idx, "embedding": embedding}
+                    )
+                tokens = sum(max(1, len(str(t)) // 4) for t in inputs)
+                with state.lock:
+                    state.inputs += len(inputs)
+                self._send_json(
+                    200,
+                    {
+                        "object": "list",
+                        "data": data,
+                        "model": payload.get("model", "fake"),
+                        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                    },
+                )
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def _chat(self, payload: dict) -> None:
+            if self._throttle():
+                return
+            try:
+                model = payload.get("model", "fake")
+                messages = payload.get("messages") or [{}]
+                prompt = str(messages[-1].get("content", ""))
+                content = fake_answer(prompt)
+                if random.random() < state.invalid_json_prob:
+                    content = content[: len(content) // 2]
+                delay = state.model_latency.get(model, state.chat_latency)
+                if random.random() < state.slow_prob and (
+                    not state.slow_models or model in state.slow_models
+                ):
+                    delay += state.slow_latency
+                time.sleep(delay + random.uniform(0, state.jitter))
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                created = int(time.time())
+                if payload.get("stream"):
+                    self._stream_chat(completion_id, created, model, content)
+                    return
+                self._send_json(
+                    200,
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": created,
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": len(prompt) // 4,
+                            "completion_tokens": len(content) // 4,
+                            "total_tokens": (len(prompt) + len(content)) // 4,
+                        },
+                    },
+                )
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def _stream_chat(
+            self, completion_id: str, created: int, model: str, content: str
+        ) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            words = content.split(" ")
+            tokens = [word + " " for word in words[:-1]] + words[-1:]
+            for idx, token in enumerate(tokens + [None]):
+                delta = {"content": token} if token is not None else {}
+                if idx == 0:
+                    delta["role"] = "assistant"
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": delta,
+                            "finish_reason": None if token is not None else "stop",
+                        }
+                    ],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if token is not None and state.token_latency:
+                    time.sleep(state.token_latency)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(
+    state: FakeOpenAIState, host: str = "127.0.0.1", port: int = 8010
+) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread and return it."""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="base seconds per request"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="extra random seconds"
+    )
+    parser.add_argument("--per-item-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=0,
+        help="answer 429 above this many in-flight requests",
+    )
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0)
+    parser.add_argument(
+        "--chat-latency", type=float, default=0.2, help="chat time to first token"
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.02, help="seconds between tokens"
+    )
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SECONDS",
+        help="per-model chat latency override (repeatable)",
+    )
+    parser.add_argument(
+        "--slow-prob",
+        type=float,
+        default=0.0,
+        help="share of chat calls delayed by --slow-latency",
+    )
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument(
+        "--slow-model",
+        action="append",
+        default=[],
+        metavar="MODEL",
+        help="only delay calls to this model (repeatable; default: all models)",
+    )
+    parser.add_argument(
+        "--invalid-json-prob",
+        type=float,
+        default=0.0,
+        help="share of chat answers truncated into invalid JSON",
+    )
+    args = parser.parse_args()
+
+    state = FakeOpenAIState(
+        dimensions=args.dimensions,
+        latency=args.latency,
+        jitter=args.jitter,
+        per_item_latency=args.per_item_latency,
+        max_concurrent=args.max_concurrent,
+        rate_limit_prob=args.rate_limit_prob,
+        chat_latency=args.chat_latency,
+        token_latency=args.token_latency,
+        model_latency={
+            model: float(seconds)
+            for model, seconds in (item.split("=", 1) for item in args.model_latency)
+        },
+        slow_prob=args.slow_prob,
+        slow_latency=args.slow_latency,
+        slow_models=args.slow_model,
+        invalid_json_prob=args.invalid_json_prob,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"Fake OpenAI API listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""In-process fake embeddings and chat model with configurable latency.
+
+Same deterministic vectors and canned answers as `fake_openai_server.py`, but
+without HTTP, so benchmarks time our own code plus an explicit simulated
+provider latency instead of the network stack.
+"""
+
+import time
+from typing import Any, Iterator, List, Optional
+
+from fake_openai_server import fake_answer, fake_embedding
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors seeded by the text."""
+
+    def __init__(
+        self,
+        dimensions: int = 1536,
+        latency: float = 0.0,
+        per_item_latency: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            dimensions: Vector size
+            latency: Simulated seconds per call
+            per_item_latency: Simulated extra seconds per embedded text
+        """
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        delay = self.latency + self.per_item_latency * len(texts)
+        if delay:
+            time.sleep(delay)
+        return [fake_embedding(text, self.dimensions).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning `fake_answer` after a simulated delay."""
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        content = fake_answer(str(messages[-1].content))
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))]
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        words = fake_answer(str(messages[-1].content)).split(" ")
+        for idx, word in enumerate(words):
+            text = word if idx == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if self.token_latency:
+                time.sleep(self.token_latency)
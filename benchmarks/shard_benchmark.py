@@ -0,0 +1,219 @@
+"""Throughput of scatter-gather retrieval over 1, 2, 4... shard server processes.
+
+Builds one synthetic corpus (random unit vectors, no API calls), partitions it
+for each shard count, starts that many `shard_server` processes on this
+machine and drives dense searches over every document through
+`PartitionedVectorStore` from `--concurrency` client threads. Reports
+queries per second and latency percentiles per shard count; with exact
+(flat) segments the search cost is CPU-bound, so throughput should grow with
+the shard count up to the number of cores.
+
+Usage:
+    python benchmarks/shard_benchmark.py
+    python benchmarks/shard_benchmark.py --shards 1,2,4,8 --documents 400 --duration 20
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+sys.path.insert(0, API_DIR)
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+from services.ann_index import IndexSettings  # noqa: E402
+from services.index_cache import IndexCache  # noqa: E402
+from services.sharding import PartitionedVectorStore, partition_root  # noqa: E402
+from services.vector_store import SegmentedVectorStore  # noqa: E402
+
+
+def build_partitions(
+    root: str, shards: int, corpus: np.ndarray, chunks: int
+) -> PartitionedVectorStore:
+    """Write the corpus into `shards` partitions, merged into few large segments."""
+
+    def make_partition(path: str) -> SegmentedVectorStore:
+        return SegmentedVectorStore(
+            path,
+            IndexCache(max_entries=0),
+            background_merge=False,
+            preload=False,
+            index_settings=IndexSettings(index_type="flat"),
+        )
+
+    urls = [f"http://127.0.0.1:0/{shard}" for shard in range(shards)]
+    store = PartitionedVectorStore(root, urls, make_partition=make_partition)
+    for doc in range(len(corpus) // chunks):
+        document_id = f"doc{doc:05d}"
+        vectors = corpus[doc * chunks : (doc + 1) * chunks]
+        texts = [f"{document_id} chunk {idx}" for idx in range(chunks)]
+        store.partition(document_id).add_document(
+            document_id, texts, vectors, [{"page": idx + 1} for idx in range(chunks)]
+        )
+    for partition in store.partitions:
+        while partition.merge_once():
+            pass
+    return store
+
+
+def start_shards(root: str, shards: int, base_port: int) -> List[subprocess.Popen]:
+    processes = []
+    for shard in range(shards):
+        env = {
+            **os.environ,
+            "SHARD_INDEX": str(shard),
+            "SHARD_ROOT": partition_root(root, shard),
+            "VECTOR_INDEX_TYPE": "flat",
+            # One search thread per shard: scaling comes from the processes
+            "SEARCH_MAX_WORKERS": "1",
+        }
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "shard_server:app",
+                    "--port",
+                    str(base_port + shard),
+                    "--log-level",
+                    "warning",
+                ],
+                cwd=API_DIR,
+                env=env,
+            )
+        )
+    deadline = time.monotonic() + 60
+    for shard in range(shards):
+        while True:
+            try:
+                httpx.get(
+                    f"http://127.0.0.1:{base_port + shard}/health"
+                ).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"shard {shard} did not start")
+                time.sleep(0.2)
+    return processes
+
+
+def run_load(
+    store: PartitionedVectorStore,
+    document_ids: List[str],
+    queries: np.ndarray,
+    k: int,
+    concurrency: int,
+    duration: float,
+) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(offset: int) -> None:
+        nonlocal errors
+        idx = offset
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                _, stats = store.search(queries[idx % len(queries)], k, document_ids)
+                failed = bool(stats["shards"]["failed"])
+            except RuntimeError:
+                failed = True
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+            idx += concurrency
+
+    threads = [
+        threading.Thread(target=worker, args=(offset,)) for offset in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "partial": errors,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--shards", default="1,2,4", help="shard counts to compare")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=250, help="chunks per document")
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--timeout-ms", type=float, default=5000)
+    parser.add_argument("--base-port", type=int, default=9300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    corpus = rng.standard_normal(
+        (args.documents * args.chunks, args.dimensions), dtype=np.float32
+    )
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = corpus[rng.integers(0, len(corpus), 256)]
+    document_ids = [f"doc{doc:05d}" for doc in range(args.documents)]
+
+    print(
+        f"{len(corpus)} vectors x {args.dimensions} dims, {args.documents} documents, "
+        f"k={args.k}, {args.concurrency} clients, {os.cpu_count()} CPUs"
+    )
+    print(f"{'shards':>6} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'partial':>8}")
+    for shards in [int(value) for value in args.shards.split(",")]:
+        root = tempfile.mkdtemp(prefix="shard-bench-")
+        processes: List[subprocess.Popen] = []
+        try:
+            build_partitions(root, shards, corpus, args.chunks)
+            processes = start_shards(root, shards, args.base_port)
+            urls = [
+                f"http://127.0.0.1:{args.base_port + shard}" for shard in range(shards)
+            ]
+            store = PartitionedVectorStore(
+                root,
+                urls,
+                timeout=args.timeout_ms / 1000,
+                make_partition=lambda path: SegmentedVectorStore(
+                    path, IndexCache(max_entries=0), background_merge=False
+                ),
+            )
+            # Warm-up: first searches map the segments
+            run_load(store, document_ids, queries, args.k, args.concurrency, 1.0)
+            result = run_load(
+                store, document_ids, queries, args.k, args.concurrency, args.duration
+            )
+            print(
+                f"{shards:>6} {result['qps']:>8.1f} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f} {result['partial']:>8}"
+            )
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+            shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""Stage-level micro-benchmarks of the ingestion and question pipeline, fully offline.
+
+Runs every stage of the real code path (PDF parsing, splitting, embedding,
+segment build/save, segment load, dense and lexical search, context packing,
+prompt build, generation and JSON parsing) over `examples/*.pdf` and a
+synthetic large PDF. Embeddings and the chat model are deterministic
+in-process fakes with configurable latency, so no API key is needed.
+
+Each stage reports median/min/max wall time over `--repeat` runs and the
+peak Python heap (tracemalloc) of one extra run. Results are compared with
+a stored baseline on the best (min) time and the peak heap; regressions
+beyond the tolerances are flagged and the exit status is 1.
+
+Usage:
+    python benchmarks/stage_benchmarks.py
+    python benchmarks/stage_benchmarks.py --synthetic-pages 1000 --repeat 3
+    python benchmarks/stage_benchmarks.py --save-baseline
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+# LLMService builds an OpenAI client on construction; its model is replaced by a
+# fake below, so no request is ever sent
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+from fake_providers import FakeChatModel, FakeEmbeddings  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+from services.ann_index import IndexSettings  # noqa: E402
+from services.context_packing import ContextPacker  # noqa: E402
+from services.embeddings import CHUNK_OVERLAP, CHUNK_SIZE  # noqa: E402
+from services.lexical_index import corpus_idf, query_tokens  # noqa: E402
+from services.llm import LLMService  # noqa: E402
+from services.pdf_extraction import PageExtractor  # noqa: E402
+from services.vector_store import Segment, write_segment_files  # noqa: E402
+from synthetic_pdf import make_pdf  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "stages.json")
+
+
+def measure(fn: Callable[[], Any], repeat: int, items: int = 1) -> Tuple[Any, Dict]:
+    """Time `fn` over `repeat` runs, then trace one more run for peak memory.
+
+    Returns:
+        Tuple of (result of the last run, metrics dict)
+    """
+    timings = []
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    median = statistics.median(timings)
+    return result, {
+        "items": items,
+        "median_ms": round(median, 3),
+        "min_ms": round(min(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "per_item_ms": round(median / max(1, items), 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def load_corpora(args: argparse.Namespace) -> Dict[str, List[Tuple[str, bytes]]]:
+    corpora: Dict[str, List[Tuple[str, bytes]]] = {}
+    examples = sorted(glob.glob(os.path.join(args.examples, "*.pdf")))
+    if examples:
+        corpora["examples"] = []
+        for path in examples:
+            with open(path, "rb") as fh:
+                stem = os.path.splitext(os.path.basename(path))[0]
+                corpora["examples"].append((stem, fh.read()))
+    if args.synthetic_pages:
+        corpora[f"synthetic-{args.synthetic_pages}p"] = [
+            ("synthetic", make_pdf(args.synthetic_pages, seed=args.seed))
+        ]
+    return corpora
+
+
+def bench_corpus(
+    name: str,
+    files: List[Tuple[str, bytes]],
+    args: argparse.Namespace,
+    workdir: str,
+) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    extractor = PageExtractor.from_env()
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len
+    )
+    embeddings = FakeEmbeddings(
+        dimensions=args.dimensions,
+        latency=args.embed_latency,
+        per_item_latency=args.embed_item_latency,
+    )
+    settings = IndexSettings.from_env()
+    packer = ContextPacker.from_env()
+    llm = LLMService("openai")
+    llm.llm = FakeChatModel(latency=args.chat_latency)
+
+    # Ingestion stages
+    pages, results["parse"] = measure(
+        lambda: [(doc_id, extractor.extract_texts(data)) for doc_id, data in files],
+        args.repeat,
+        sum(1 for _, data in files for _ in PageExtractor.page_hashes(data)),
+    )
+    docs = [
+        Document(page_content=text, metadata={"page": idx + 1, "document_id": doc_id})
+        for doc_id, texts in pages
+        for idx, text in enumerate(texts)
+    ]
+    chunks, results["split"] = measure(
+        lambda: [
+            chunk
+            for chunk in splitter.split_documents(docs)
+            if chunk.page_content.strip()
+        ],
+        args.repeat,
+        len(docs),
+    )
+    if not chunks:
+        print(f"[{name}] no extractable text, skipping the remaining stages")
+        return results
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+    vectors, results["embed"] = measure(
+        lambda: embeddings.embed_documents(texts), args.repeat, len(texts)
+    )
+
+    builds = iter(range(10**6))
+
+    def build() -> str:
+        path = os.path.join(workdir, name, f"segment-{next(builds)}")
+        write_segment_files(path, texts, vectors, metadatas, settings)
+        return path
+
+    segment_path, results["build_save"] = measure(build, args.repeat, len(texts))
+    segment, results["load"] = measure(
+        lambda: Segment(name, segment_path, settings), args.repeat
+    )
+
+    # Question stages, over queries made from the chunks' opening words
+    document_ids = {doc_id for doc_id, _ in files}
+    step = max(1, len(texts) // args.queries)
+    questions = [" ".join(t.split()[:10]) for t in texts[::step][: args.queries]]
+    query_vectors = [
+        np.asarray(v, dtype=np.float32) for v in embeddings.embed_documents(questions)
+    ]
+    dense, results["search_dense"] = measure(
+        lambda: [segment.search(v, args.k, document_ids) for v in query_vectors],
+        args.repeat,
+        len(questions),
+    )
+
+    def lexical() -> List:
+        hits = []
+        for question in questions:
+            tokens = query_tokens(question, segment.lexical)
+            idf, avg_length = corpus_idf([segment.lexical], tokens)
+            hits.append(
+                segment.lexical_search(tokens, idf, avg_length, args.k, document_ids)
+            )
+        return hits
+
+    _, results["search_lexical"] = measure(lexical, args.repeat, len(questions))
+
+    structured = [
+        [
+            {
+                "snippet": doc.page_content,
+                "document_id": doc_id,
+                "page": doc.metadata.get("page"),
+                "score": score,
+            }
+            for doc_id, doc, score in hits
+        ]
+        for hits in dense
+    ]
+    packed, results["pack"] = measure(
+        lambda: [packer.pack(docs)[0] for docs in structured],
+        args.repeat,
+        len(questions),
+    )
+    prompts, results["prompt_build"] = measure(
+        lambda: [llm._answer_prompt(q, docs) for q, docs in zip(questions, packed)],
+        args.repeat,
+        len(questions),
+    )
+    replies, results["generate"] = measure(
+        lambda: [llm.llm.invoke(prompt).content for prompt in prompts],
+        args.repeat,
+        len(questions),
+    )
+    _, results["json_parse"] = measure(
+        lambda: [llm._parse_answer(c, docs) for c, docs in zip(replies, packed)],
+        args.repeat,
+        len(questions),
+    )
+    return results
+
+
+def compare(
+    current: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    args: argparse.Namespace,
+) -> Dict[str, List[str]]:
+    """Regressions per stage key: slower or larger beyond tolerance and noise floor."""
+    regressions: Dict[str, List[str]] = {}
+    for key, metrics in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        problems = []
+        # Best-of-N is the least noisy estimate of a stage's cost
+        slower = metrics["min_ms"] - base["min_ms"]
+        if (
+            metrics["min_ms"] > base["min_ms"] * (1 + args.time_tolerance)
+            and slower > args.min_delta_ms
+        ):
+            problems.append(f"time +{slower / max(base['min_ms'], 1e-9):.0%}")
+        larger = metrics["peak_kb"] - base["peak_kb"]
+        if (
+            metrics["peak_kb"] > base["peak_kb"] * (1 + args.memory_tolerance)
+            and larger > args.min_delta_kb
+        ):
+            problems.append(f"memory +{larger / max(base['peak_kb'], 1e-9):.0%}")
+        if problems:
+            regressions[key] = problems
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "faiss": faiss.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_table(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    regressions: Dict[str, List[str]],
+) -> None:
+    header = (
+        f"{'stage':<34} {'items':>7} {'median ms':>11} {'min ms':>10} {'per item ms':>12} "
+        f"{'peak KB':>10} {'vs baseline':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for key, metrics in results.items():
+        base = baseline.get(key)
+        delta = (
+            f"{metrics['min_ms'] / base['min_ms'] - 1:+.0%}"
+            if base and base["min_ms"]
+            else "-"
+        )
+        flag = (
+            "  REGRESSION: " + ", ".join(regressions[key]) if key in regressions else ""
+        )
+        print(
+            f"{key:<34} {metrics['items']:>7} {metrics['median_ms']:>11.2f} "
+            f"{metrics['min_ms']:>10.2f} "
+            f"{metrics['per_item_ms']:>12.4f} {metrics['peak_kb']:>10.1f} "
+            f"{delta:>12}{flag}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--examples", default=os.path.join(ROOT, "examples"))
+    parser.add_argument("--synthetic-pages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument(
+        "--embed-latency", type=float, default=0.0, help="seconds per embed call"
+    )
+    parser.add_argument(
+        "--embed-item-latency", type=float, default=0.0, help="seconds per text"
+    )
+    parser.add_argument(
+        "--chat-latency", type=float, default=0.0, help="seconds per completion"
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write these results as the new baseline instead of comparing",
+    )
+    parser.add_argument("--time-tolerance", type=float, default=0.3)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=5.0, help="ignore smaller slowdowns"
+    )
+    parser.add_argument(
+        "--min-delta-kb", type=float, default=256.0, help="ignore smaller growth"
+    )
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    corpora = load_corpora(args)
+    if not corpora:
+        parser.error("no input: --examples has no PDFs and --synthetic-pages is 0")
+
+    results: Dict[str, Dict] = {}
+    workdir = tempfile.mkdtemp(prefix="stage-bench-")
+    try:
+        for name, files in corpora.items():
+            for stage, metrics in bench_corpus(name, files, args, workdir).items():
+                results[f"{name}/{stage}"] = metrics
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "environment": environment(),
+        "settings": {
+            "dimensions": args.dimensions,
+            "synthetic_pages": args.synthetic_pages,
+            "queries": args.queries,
+            "k": args.k,
+            "embed_latency": args.embed_latency,
+            "embed_item_latency": args.embed_item_latency,
+            "chat_latency": args.chat_latency,
+        },
+        # ru_maxrss is KB on Linux
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print_table(results, {}, {})
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    baseline: Dict[str, Dict] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            stored = json.load(fh)
+        baseline = stored.get("results", {})
+        for section in ("environment", "settings"):
+            if stored.get(section) != report[section]:
+                print(
+                    f"warning: baseline {section} differs "
+                    f"({stored.get(section)} vs {report[section]})"
+                )
+    else:
+        print(f"No baseline at {args.baseline}; record one with --save-baseline\n")
+
+    regressions = compare(results, baseline, args)
+    print_table(results, baseline, regressions)
+    print(f"\nmax RSS: {report['max_rss_kb'] / 1024:.1f} MB")
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed against {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Deterministic synthetic PDFs with extractable text, for benchmarks and load tests.
+
+Each page holds `lines_per_page` lines of seeded pseudo-random domain words,
+ending with a unique "p<page>l<line>" marker so chunks never collide.
+
+Usage:
+    python benchmarks/synthetic_pdf.py large.pdf --pages 500
+"""
+
+import argparse
+import random
+from typing import List
+
+WORDS = (
+    "contract clause maintenance pump motor warranty section valve pressure "
+    "schedule inspection supplier payment term delivery liability notice"
+).split()
+
+
+def make_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """Build a PDF of `pages` text pages (Helvetica, one content stream per page)."""
+    rnd = random.Random(seed)
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            "<< /Type /Pages /Kids ["
+            + " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+            + f"] /Count {pages} >>"
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page in range(pages):
+        lines = []
+        for line in range(lines_per_page):
+            words = " ".join(rnd.choice(WORDS) for _ in range(12))
+            lines.append(f"({words} p{page + 1}l{line}) Tj 0 -14 Td")
+        stream = ("BT /F1 10 Tf 40 800 Td " + " ".join(lines) + " ET").encode()
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                "/Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {5 + 2 * page} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+    return bytes(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("output", help="path of the PDF to write")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--lines-per-page", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    with open(args.output, "wb") as fh:
+        fh.write(make_pdf(args.pages, args.lines_per_page, args.seed))
+
+
+if __name__ == "__main__":
+    main()
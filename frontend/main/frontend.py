@@ -2,7 +2,12 @@ import logging
 import time
 
 import streamlit as st
-from routers import ask_question, get_available_models, upload_documents
+from routers import (
+    ask_question_stream,
+    get_available_models,
+    get_job_status,
+    upload_documents,
+)
 
 st.set_page_config(page_title="RAG System")
 
@@ -83,6 +88,59 @@ st.title(":blue[Document Q&A System]")
 st.caption(
     "Upload the desired Pdf files, process to generate embeddings, select the LLM provider and model, and ask questions about the documents."
 )
+
+
+def job_fraction(job: dict) -> float:
+    """Map an ingestion job's stage and counters to a 0..1 progress value."""
+    progress = job.get("progress", {})
+    if job.get("status") in ("completed", "failed"):
+        return 1.0
+    if job.get("stage") == "parsing" and progress.get("pages_total"):
+        return 0.4 * progress.get("pages_parsed", 0) / progress["pages_total"]
+    if job.get("stage") == "embedding" and progress.get("chunks_total"):
+        return 0.4 + 0.5 * progress.get("chunks_embedded", 0) / progress["chunks_total"]
+    if job.get("stage") == "saving":
+        return 0.9
+    return 0.0
+
+
+def track_ingestion(jobs: list[dict], poll_seconds: float = 1.0) -> list[dict]:
+    """Poll the ingestion jobs, rendering per-file progress, until all finish."""
+    bars = {
+        job["job_id"]: st.progress(0.0, text=f"{job['filename']}: queued")
+        for job in jobs
+    }
+    finished: dict[str, dict] = {}
+    while len(finished) < len(jobs):
+        for job in jobs:
+            job_id = job["job_id"]
+            if job_id in finished:
+                continue
+            status = get_job_status(job_id)
+            if status.get("error") and "status" not in status:
+                finished[job_id] = {
+                    "job_id": job_id,
+                    "filename": job["filename"],
+                    "status": "failed",
+                    "error": status["error"],
+                }
+                continue
+            progress = status.get("progress", {})
+            bars[job_id].progress(
+                job_fraction(status),
+                text=(
+                    f"{job['filename']}: {status.get('stage')} • "
+                    f"pages {progress.get('pages_parsed', 0)}/{progress.get('pages_total') or '?'} • "
+                    f"chunks {progress.get('chunks_embedded', 0)}/{progress.get('chunks_total') or '?'}"
+                ),
+            )
+            if status.get("status") in ("completed", "failed"):
+                finished[job_id] = status
+        if len(finished) < len(jobs):
+            time.sleep(poll_seconds)
+    return [finished[job["job_id"]] for job in jobs]
+
+
 # Initialize session state for storing upload status
 if "documents_uploaded" not in st.session_state:
     st.session_state.documents_uploaded = False
@@ -97,34 +155,41 @@ uploaded_files = st.file_uploader(
 
 if uploaded_files:
     if st.button("Process Documents"):
-        with st.spinner("Processing documents..."):
+        with st.spinner("Uploading documents..."):
             payload = [(f.name, f.getvalue()) for f in uploaded_files]
             result = upload_documents(payload)
-            if result.get("error"):
-                st.error(f"Upload failed: {result['error']}")
-                if result.get("status_code"):
-                    st.code(
-                        f"Status: {result['status_code']}\nBody: {result.get('text','')}"
-                    )
-                logging.error(f"Upload failed: {result['error']}")
-            else:
-                st.session_state.documents_uploaded = True
-                # Capture the document ids (folder stems) returned per file
-                st.session_state.current_doc_ids = [
-                    r.get("document_id")
-                    for r in result.get("results", [])
-                    if r.get("document_id")
-                ]
-                st.success(
-                    f"Succesfully processed {result.get('processed',0)} files, skipped {result.get('skipped',0)}. Total chunks processed: {result.get('total_chunks',0)}"
+        if result.get("error"):
+            st.error(f"Upload failed: {result['error']}")
+            if result.get("status_code"):
+                st.code(
+                    f"Status: {result['status_code']}\nBody: {result.get('text','')}"
+                )
+            logging.error(f"Upload failed: {result['error']}")
+        else:
+            jobs = track_ingestion(result.get("jobs", []))
+            completed = [j for j in jobs if j.get("status") == "completed"]
+            failed = [j for j in jobs if j.get("status") == "failed"]
+            results = [j.get("result") or {} for j in completed]
+            for job in failed:
+                st.error(f"{job.get('filename')}: {job.get('error')}")
+                logging.error(f"Ingestion failed: {job.get('error')}")
+            st.session_state.documents_uploaded = bool(completed)
+            # Capture the document ids (folder stems) returned per file
+            st.session_state.current_doc_ids = [
+                r.get("document_id") for r in results if r.get("document_id")
+            ]
+            skipped = sum(1 for r in results if r.get("skipped"))
+            total_chunks = sum(r.get("total_chunks", 0) for r in results)
+            st.success(
+                f"Succesfully processed {len(results) - skipped} files, skipped {skipped}. Total chunks processed: {total_chunks}"
+            )
+            if st.session_state.current_doc_ids:
+                st.caption(
+                    f"Retrieval will search only: {', '.join(st.session_state.current_doc_ids)}"
+                )
+                logging.info(
+                    f"Documents uploaded successfully: {st.session_state.current_doc_ids}"
                 )
-                if st.session_state.current_doc_ids:
-                    st.caption(
-                        f"Retrieval will search only: {', '.join(st.session_state.current_doc_ids)}"
-                    )
-                    logging.info(
-                        f"Documents uploaded successfully: {st.session_state.current_doc_ids}"
-                    )
 
 # Question answering section
 st.header(":blue[2. Ask Questions]", divider="blue")
@@ -151,47 +216,64 @@ if question:
         st.warning("Please upload and process a document first!")
     else:
         if st.button("Get Answer"):
+            logging.info(
+                f"Generating answer with the model: {model} for question: {question}"
+            )
+            st.subheader("Answer:")
+            answer_placeholder = st.empty()
+            timing_placeholder = st.empty()
+            answer = ""
+            citations: list[dict] = []
+            first_token_s = None
+            start_time = time.perf_counter()
             with st.spinner("Generating answer..."):
-                logging.info(
-                    f"Generating answer with the model: {model} for question: {question}"
-                )
-                start_time = time.perf_counter()
-                result = ask_question(
+                for event, data in ask_question_stream(
                     question,
                     llm_provider,
                     model,
                     st.session_state.current_doc_ids,
+                ):
+                    if event == "citations":
+                        citations = data
+                    elif event == "token":
+                        if first_token_s is None:
+                            first_token_s = time.perf_counter() - start_time
+                        answer += data.get("text", "")
+                        answer_placeholder.markdown(answer + "▌")
+                    elif event == "done":
+                        answer = data.get("answer", answer)
+                    elif event == "error":
+                        st.error(f"Request failed: {data.get('error')}")
+                        logging.error(f"Request failed: {data.get('error')}")
+                        if data.get("status_code"):
+                            st.code(
+                                f"Status: {data['status_code']}\nBody: {data.get('text','')}"
+                            )
+            elapsed_s = time.perf_counter() - start_time
+            answer_placeholder.markdown(answer)
+            if answer:
+                logging.info(f"Answer succesfuly generated: {answer}")
+                timing_placeholder.caption(
+                    f"Response time: {elapsed_s:.2f} s"
+                    + (
+                        f" • First token: {first_token_s:.2f} s"
+                        if first_token_s is not None
+                        else ""
+                    )
                 )
-                elapsed_s = time.perf_counter() - start_time
-                if result.get("error"):
-                    st.error(f"Request failed: {result['error']}")
-                    logging.error(f"Request failed: {result['error']}")
-                    if result.get("status_code"):
-                        st.code(
-                            f"Status: {result['status_code']}\nBody: {result.get('text','')}"
+            if citations:
+                with st.expander("Citations"):
+                    for c in citations:
+                        doc_id = c.get("document_id")
+                        page = c.get("page")
+                        score = c.get("score")
+                        snippet = c.get("snippet", "")
+                        st.markdown(
+                            f"- File: `{doc_id}` • Page: {page} • Score: {score}"
                         )
-                else:
-                    logging.info(f"Answer succesfuly generated: {result['answer']}")
-                    st.subheader("Answer:")
-                    st.write(result["answer"])
-                    st.caption(f"Response time: {elapsed_s:.2f} s")
-                    if result.get("references"):
-                        with st.expander(f"References"):
-                            st.write(result["references"])
-                    if result.get("citations"):
-                        with st.expander("Citations"):
-                            for c in result["citations"]:
-                                doc_id = c.get("document_id")
-                                page = c.get("page")
-                                score = c.get("score")
-                                snippet = c.get("snippet", "")
-                                st.markdown(
-                                    f"- File: `{doc_id}` • Page: {page} • Score: {score}"
-                                )
-                                if snippet:
-                                    st.caption(
-                                        snippet[:300]
-                                        + ("…" if len(snippet) > 300 else "")
-                                    )
+                        if snippet:
+                            st.caption(
+                                snippet[:300] + ("…" if len(snippet) > 300 else "")
+                            )
 
 st.caption("Developed by Leticia Bossatto Marchezi")
@@ -1,10 +1,13 @@
+import json
 import time
+from typing import Iterator
 
 import requests
 
 UPLOAD_FILE_ENDPOINT = "http://api:8000/documents"
 QUESTION_ENDPOINT = "http://api:8000/question"
 MODELS_ENDPOINT = "http://api:8000/models"
+JOBS_ENDPOINT = "http://api:8000/jobs"
 
 
 def upload_documents(files_bytes_and_names: list[tuple[str, bytes]]) -> dict:
@@ -14,7 +17,7 @@ def upload_documents(files_bytes_and_names: list[tuple[str, bytes]]) -> dict:
         files_bytes_and_names: List of tuples (filename, bytes)
 
     Returns:
-        Dict containing processing results
+        Dict containing the queued ingestion jobs (one per file)
     """
     files = []
     for idx, (filename, content) in enumerate(files_bytes_and_names):
@@ -23,6 +26,25 @@ def upload_documents(files_bytes_and_names: list[tuple[str, bytes]]) -> dict:
     return response.json()
 
 
+def get_job_status(job_id: str) -> dict:
+    """Get the status and per-stage progress of an ingestion job.
+
+    Args:
+        job_id: Job identifier returned by upload_documents
+
+    Returns:
+        Dict with status, stage, progress counters and, once finished, the result
+    """
+    response = requests.get(f"{JOBS_ENDPOINT}/{job_id}", timeout=10)
+    if response.status_code != 200:
+        return {
+            "error": "Job status unavailable",
+            "status_code": response.status_code,
+            "text": response.text,
+        }
+    return response.json()
+
+
 def ask_question(
     question: str,
     llm_provider: str = "openai",
@@ -50,6 +72,54 @@ def ask_question(
     return response.json()
 
 
+def ask_question_stream(
+    question: str,
+    llm_provider: str = "openai",
+    model: str | None = None,
+    document_ids: list[str] = [],
+) -> Iterator[tuple[str, dict]]:
+    """Send question to the API and yield Server-Sent Events as they arrive
+
+    Args:
+        question: User's question
+        llm_provider: The LLM provider to use
+        model: Optional model name for the selected provider
+        document_ids: Document directory stems to restrict retrieval to
+
+    Yields:
+        Tuples of (event, data): "citations" (list of retrieved snippets),
+        "token" ({"text"}), "done" ({"answer", "time_to_first_token_ms", ...})
+        or "error" ({"error"})
+    """
+    payload = {
+        "question": question,
+        "llm_provider": llm_provider,
+        "document_ids": document_ids,
+        "stream": True,
+    }
+    if model:
+        payload["model"] = model
+    with requests.post(QUESTION_ENDPOINT, json=payload, stream=True) as response:
+        if response.status_code != 200:
+            yield "error", {
+                "error": "Question request failed",
+                "status_code": response.status_code,
+                "text": response.text,
+            }
+            return
+        event = "message"
+        data_lines: list[str] = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:") :].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:") :].strip())
+            elif not line and data_lines:
+                # A blank line terminates the event
+                yield event, json.loads("\n".join(data_lines))
+                event, data_lines = "message", []
+
+
 def get_available_models(max_retries: int = 8, backoff_seconds: float = 0.5) -> dict:
     """Get model list with simple retry to tolerate API startup delays."""
     last_err: Exception | None = None
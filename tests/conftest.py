@@ -0,0 +1,107 @@
+"""Shared fixtures: the fake OpenAI server and API processes using it.
+
+The API reads its configuration from the environment at import time, so each
+`api_server` runs uvicorn in its own process and working directory (the vector
+store lives in `./vector_store`), pointed at an in-process fake OpenAI server
+from `benchmarks/fake_openai_server.py`.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Iterator, List
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "api")
+BENCHMARKS_DIR = os.path.join(ROOT, "benchmarks")
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_openai_server import FakeOpenAIState, serve  # noqa: E402
+
+EMBEDDING_DIMENSIONS = 64
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_openai() -> Iterator[FakeOpenAIState]:
+    """A fake OpenAI API without latency; its URL is `state.base_url`."""
+    state = FakeOpenAIState(
+        dimensions=EMBEDDING_DIMENSIONS,
+        latency=0.0,
+        chat_latency=0.0,
+        token_latency=0.0,
+    )
+    port = free_port()
+    server = serve(state, port=port)
+    state.base_url = f"http://127.0.0.1:{port}/v1"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api_server(tmp_path, fake_openai) -> Iterator[Callable[..., str]]:
+    """Start the API against `fake_openai`; call with extra env vars, get its URL."""
+    processes: List[subprocess.Popen] = []
+
+    def start(**env: str) -> str:
+        port = free_port()
+        workdir = tmp_path / f"api-{port}"
+        workdir.mkdir()
+        process_env: Dict[str, str] = {
+            **os.environ,
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": fake_openai.base_url,
+            "PYTHONPATH": API_DIR,
+            **env,
+        }
+        log = open(workdir / "api.log", "w")
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "main:app",
+                    "--app-dir",
+                    API_DIR,
+                    "--port",
+                    str(port),
+                    "--log-level",
+                    "warning",
+                ],
+                cwd=workdir,
+                env=process_env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        )
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                httpx.get(f"{url}/health").raise_for_status()
+                return url
+            except httpx.HTTPError:
+                if processes[-1].poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"API did not start:\n{(workdir / 'api.log').read_text()}"
+                    )
+                time.sleep(0.2)
+
+    yield start
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
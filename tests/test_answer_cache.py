@@ -0,0 +1,76 @@
+import httpx
+import numpy as np
+from services.answer_cache import AnswerCache
+from synthetic_pdf import make_pdf
+
+
+def put(cache: AnswerCache, scope, text: str) -> None:
+    cache.put(scope, text, None, {"answer": text}, cost_ms=10.0)
+
+
+def test_invalidate_documents_drops_only_scopes_with_the_documents():
+    cache = AnswerCache(ttl_seconds=0)
+    # A document id that is also a letter of the retrieval mode
+    dense = AnswerCache.scope("openai", "m", "json", "dense", {"e": 1})
+    other = AnswerCache.scope("openai", "m", "json", "dense", {"doc-1": 1, "doc-2": 3})
+    put(cache, dense, "a")
+    put(cache, other, "b")
+
+    assert cache.invalidate_documents(["doc-2"]) == 1
+    assert cache.lookup(other, "b", None) is None
+    assert cache.lookup(dense, "a", None) is not None
+    assert cache.invalidate_documents(["d"]) == 0
+
+
+def test_scope_includes_retrieval_mode():
+    versions = {"doc": 1}
+    lexical = AnswerCache.scope("openai", "m", "json", "lexical", versions)
+    hybrid = AnswerCache.scope("openai", "m", "json", "hybrid", versions)
+    assert lexical != hybrid
+    assert lexical.document_ids == ("doc",)
+
+
+def test_similar_question_hits_within_threshold():
+    cache = AnswerCache(threshold=0.9, ttl_seconds=0)
+    scope = AnswerCache.scope("openai", "m", "json", "dense", {"doc": 1})
+    vector = np.array([1.0, 0.0], dtype=np.float32)
+    cache.put(scope, "q", vector, {"answer": "a"}, cost_ms=10.0)
+    assert cache.lookup(scope, "other words", [0.99, 0.05]) is not None
+    assert cache.lookup(scope, "other words", [0.5, 0.5]) is None
+
+
+def ask(url: str, question: str, document_id: str) -> dict:
+    response = httpx.post(
+        f"{url}/question",
+        json={"question": question, "document_ids": [document_id]},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def upload(url: str, name: str, content: bytes) -> dict:
+    response = httpx.post(
+        f"{url}/documents",
+        params={"wait": "true"},
+        files={"files": (name, content, "application/pdf")},
+        timeout=60,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def test_reingested_document_is_not_answered_from_cache(api_server):
+    url = api_server(RETRIEVAL_MODE="dense")
+    question = "what does the maintenance clause say about the pump?"
+    assert upload(url, "ex_3.pdf", make_pdf(3, 20, seed=1))["processed"] == 1
+
+    assert not ask(url, question, "ex_3")["metadata"]["answer_cache"]["hit"]
+    assert ask(url, question, "ex_3")["metadata"]["answer_cache"]["hit"]
+
+    # Same document id, new content
+    assert upload(url, "ex_3.pdf", make_pdf(3, 20, seed=2))["processed"] == 1
+    cache = ask(url, question, "ex_3")["metadata"]["answer_cache"]
+    assert not cache["hit"]
+    # The stale answer was dropped on re-ingestion, not just left unreachable
+    assert cache["entries"] == 0
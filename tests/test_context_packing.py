@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+from conftest import API_DIR
+from services.context_packing import ContextPacker
+
+
+def result(snippet: str, page: int = 1, document_id: str = "doc") -> dict:
+    return {"snippet": snippet, "document_id": document_id, "page": page, "score": 0.1}
+
+
+def test_packing_does_not_import_the_retrieval_stack():
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, services.context_packing; "
+            "print(sorted(m for m in ('faiss', 'openai', 'langchain_core', "
+            "'services.embeddings', 'services.vector_store') if m in sys.modules))",
+        ],
+        cwd=API_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    assert loaded == "[]"
+
+
+def test_overlapping_chunks_of_a_page_are_merged():
+    first = "the pump must be inspected every month by a qualified technician"
+    second = "inspected every month by a qualified technician before restarting"
+    packed, stats = ContextPacker(max_tokens=0, min_overlap=16).pack(
+        [result(first), result(second)]
+    )
+    assert stats["merged"] == 1
+    assert [doc["snippet"] for doc in packed] == [
+        "the pump must be inspected every month by a qualified technician"
+        " before restarting"
+    ]
+
+
+def test_budget_keeps_best_ranked_snippets():
+    docs = [result(f"snippet {idx} " + "word " * 100, page=idx) for idx in range(5)]
+    packed, stats = ContextPacker(max_tokens=300).pack(docs)
+    assert [doc["page"] for doc in packed] == [0, 1]
+    assert stats["over_budget_dropped"] == 3
@@ -0,0 +1,63 @@
+import numpy as np
+from conftest import EMBEDDING_DIMENSIONS
+from fake_openai_server import fake_embedding
+from services.adaptive_concurrency import AdaptiveConcurrency
+from services.embeddings import OpenAIEmbeddingsDirect
+
+
+def test_limit_halves_on_throttling_and_grows_after_a_window_of_successes():
+    limiter = AdaptiveConcurrency(initial=8, minimum=2, maximum=10)
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2  # never below the minimum
+
+    # One more slot after `limit` consecutive successes
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 4
+    assert limiter.throttled == 3 and limiter.in_flight == 0
+
+
+def test_batches_back_off_on_429_honour_retry_after_and_keep_order(
+    fake_openai, monkeypatch
+):
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_openai.base_url)
+    monkeypatch.setenv("EMBEDDING_BATCH_MAX_ITEMS", "4")
+    monkeypatch.setenv("EMBEDDING_CONCURRENCY", "8")
+    # The provider accepts two requests at a time and answers 429 above that
+    fake_openai.max_concurrent = 2
+    fake_openai.latency = 0.05
+    embedder = OpenAIEmbeddingsDirect()
+
+    delays = []
+    retry_delay = embedder._retry_delay
+
+    def recording_retry_delay(exc, attempt):
+        delays.append(retry_delay(exc, attempt))
+        return delays[-1]
+
+    monkeypatch.setattr(embedder, "_retry_delay", recording_retry_delay)
+
+    texts = [f"chunk {idx}" for idx in range(64)]
+    embeddings = embedder.embed_documents(texts)
+
+    expected = np.stack([fake_embedding(t, EMBEDDING_DIMENSIONS) for t in texts])
+    np.testing.assert_allclose(np.array(embeddings), expected, rtol=1e-6)
+    assert fake_openai.rate_limited > 0
+    assert embedder.concurrency.throttled == fake_openai.rate_limited
+    assert embedder.concurrency.limit < 8
+    # Every retry waited the Retry-After the server sent
+    assert delays and set(delays) == {0.2}
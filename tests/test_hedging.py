@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+from services.hedging import HedgePolicy, LatencyTracker
+from services.llm import LLMService
+
+CONTEXT = [{"document_id": "manual", "page": 1, "score": 1.0, "snippet": "pumps"}]
+
+
+def test_hedge_delay_uses_the_fixed_delay_until_enough_samples():
+    tracker = LatencyTracker()
+    policy = HedgePolicy(
+        backup=("openai", "backup"),
+        delay=2.0,
+        percentile=95,
+        min_samples=10,
+        min_delay=0.25,
+        max_delay=5.0,
+    )
+    for _ in range(9):
+        tracker.observe("openai", "primary", 0.5)
+    assert policy.hedge_delay(tracker, "openai", "primary") == 2.0
+
+    tracker.observe("openai", "primary", 0.5)
+    assert policy.hedge_delay(tracker, "openai", "primary") == 0.5
+
+    for _ in range(10):
+        tracker.observe("openai", "fast", 0.01)
+        tracker.observe("openai", "slow", 60.0)
+    assert policy.hedge_delay(tracker, "openai", "fast") == 0.25
+    assert policy.hedge_delay(tracker, "openai", "slow") == 5.0
+
+
+def test_cancelled_calls_stay_in_the_latency_tail():
+    tracker = LatencyTracker(window=100)
+    for _ in range(90):
+        tracker.observe("openai", "primary", 0.2)
+    for _ in range(10):
+        tracker.observe("openai", "primary", 3.0, censored=True)
+
+    assert tracker.censored("openai", "primary") == 10
+    assert tracker.percentile("openai", "primary", 50) == 0.2
+    assert tracker.percentile("openai", "primary", 95) == 3.0
+    stats = tracker.stats()[("openai", "primary")]
+    assert stats["samples"] == 100 and stats["censored"] == 10
+
+
+@pytest.fixture
+def services(fake_openai, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_openai.base_url)
+    tracker = LatencyTracker()
+    return tracker, {
+        model: LLMService("openai", model, latency_tracker=tracker)
+        for model in ("primary-model", "backup-model")
+    }
+
+
+def test_slow_primary_is_hedged_and_the_loser_is_cancelled(fake_openai, services):
+    tracker, llm = services
+    fake_openai.model_latency = {"primary-model": 5.0}
+
+    started = time.perf_counter()
+    result, summary = asyncio.run(
+        llm["primary-model"].agenerate_hedged(
+            "what about the pump?", CONTEXT, llm["backup-model"], delay=0.2
+        )
+    )
+
+    assert time.perf_counter() - started < 3.0
+    assert result["answer"] == "Fake answer to: what about the pump?"
+    assert summary["hedged"] and summary["winner"] == "backup"
+    assert summary["model"] == "backup-model" and summary["delay_ms"] == 200.0
+    assert tracker.count("openai", "backup-model") == 1
+    # The cancelled primary call is kept as a censored sample of at least the delay
+    assert tracker.censored("openai", "primary-model") == 1
+    assert tracker.percentile("openai", "primary-model", 50) >= 0.2
+
+
+def test_fast_primary_answers_without_hedging(fake_openai, services):
+    tracker, llm = services
+    fake_openai.model_latency = {"backup-model": 5.0}
+
+    result, summary = asyncio.run(
+        llm["primary-model"].agenerate_hedged(
+            "what about the pump?", CONTEXT, llm["backup-model"], delay=2.0
+        )
+    )
+
+    assert result["answer"] == "Fake answer to: what about the pump?"
+    assert not summary["hedged"] and summary["winner"] == "primary"
+    assert tracker.count("openai", "primary-model") == 1
+    assert tracker.count("openai", "backup-model") == 0
@@ -0,0 +1,29 @@
+from services.index_cache import IndexCache
+from services.sharding import PartitionedVectorStore
+
+
+def test_entry_and_byte_budgets_evict_least_recently_used():
+    cache = IndexCache(max_entries=2, max_bytes=100)
+    cache.put("a", 1.0, "A", 40)
+    cache.put("b", 1.0, "B", 40)
+    assert cache.get_or_load("a", 1.0, lambda: "reloaded", len) == "A"
+    cache.put("c", 1.0, "C", 40)  # over 100 bytes: "b" is least recent
+    assert cache.stats()["entries"] == 2
+    assert cache.get_or_load("b", 1.0, lambda: "B2", lambda _: 10) == "B2"
+
+
+def test_stale_mtime_reloads():
+    cache = IndexCache(max_entries=4)
+    cache.put("a", 1.0, "old", 1)
+    assert cache.get_or_load("a", 2.0, lambda: "new", lambda _: 1) == "new"
+
+
+def test_partitions_share_one_process_budget(tmp_path, monkeypatch):
+    monkeypatch.setenv("INDEX_CACHE_MAX_ENTRIES", "64")
+    monkeypatch.setenv("INDEX_CACHE_MAX_MB", "400")
+    urls = [f"http://127.0.0.1:0/{shard}" for shard in range(4)]
+    store = PartitionedVectorStore.from_env(str(tmp_path), urls)
+
+    stats = store.cache_stats()
+    assert stats["max_entries"] == 64
+    assert stats["max_bytes"] == 400 * 1024 * 1024
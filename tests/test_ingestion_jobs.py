@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from conftest import API_DIR
+from services.ingestion_jobs import IngestionJobs
+
+# Submits a job that never finishes and prints its id
+WORKER = """
+import sys, threading
+from services.ingestion_jobs import IngestionJobs
+
+jobs = IngestionJobs(lambda *args: threading.Event().wait(), state_dir=sys.argv[1])
+print(jobs.submit("manual.pdf", "manual.pdf")["job_id"], flush=True)
+threading.Event().wait()
+"""
+
+
+def wait_for_status(jobs: IngestionJobs, job_id: str, status: str) -> dict:
+    deadline = time.monotonic() + 10
+    while True:
+        job = jobs.get(job_id)
+        if job is not None and job["status"] == status:
+            return job
+        assert time.monotonic() < deadline, job
+        time.sleep(0.05)
+
+
+def test_running_job_of_another_worker_fails_once_that_worker_exits(tmp_path):
+    state_dir = str(tmp_path / "jobs")
+    worker = subprocess.Popen(
+        [sys.executable, "-c", WORKER, state_dir],
+        env={**os.environ, "PYTHONPATH": API_DIR},
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        job_id = worker.stdout.readline().strip()
+        other = IngestionJobs(lambda *args: {}, state_dir=state_dir)
+        job = wait_for_status(other, job_id, "running")
+        assert job["worker_pid"] == worker.pid
+    finally:
+        worker.kill()
+        worker.wait()
+
+    job = other.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "Worker process exited during ingestion"
+
+
+def test_job_recorded_by_a_recycled_pid_is_reported_failed(tmp_path):
+    state_dir = str(tmp_path / "jobs")
+    release = threading.Event()
+    jobs = IngestionJobs(lambda *args: release.wait() and {}, state_dir=state_dir)
+    try:
+        job_id = jobs.submit("manual.pdf", "manual.pdf")["job_id"]
+        other = IngestionJobs(lambda *args: {}, state_dir=state_dir)
+        job = wait_for_status(other, job_id, "running")
+        assert job["worker_pid"] == os.getpid()
+
+        # Same PID, but a process started at another time: not the worker
+        path = os.path.join(state_dir, f"{job_id}.json")
+        with open(path, "r", encoding="utf-8") as fh:
+            record = json.load(fh)
+        record["worker_started"] -= 1
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(record, fh)
+        assert other.get(job_id)["status"] == "failed"
+    finally:
+        release.set()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from services.ann_index import IndexSettings
+from services.index_cache import IndexCache
+from services.lexical_index import (
+    LexicalIndex,
+    corpus_idf,
+    query_tokens,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from services.vector_store import SegmentedVectorStore
+
+
+@pytest.fixture
+def store(tmp_path) -> SegmentedVectorStore:
+    return SegmentedVectorStore(
+        str(tmp_path / "vector_store"),
+        IndexCache(max_entries=0),
+        background_merge=False,
+        preload=False,
+        index_settings=IndexSettings(index_type="flat"),
+    )
+
+
+def add(store: SegmentedVectorStore, document_id: str, texts) -> None:
+    """One document, one chunk per page, in its own segment."""
+    store.add_document(
+        document_id,
+        texts,
+        np.eye(len(texts), 4, dtype=np.float32),
+        [{"page": page + 1} for page in range(len(texts))],
+    )
+
+
+def test_tokenize_keeps_compounds_and_their_parts():
+    assert tokenize("Clause 12.3.1, PX-2200") == [
+        "clause",
+        "12.3.1",
+        "12",
+        "3",
+        "1",
+        "px-2200",
+        "px",
+        "2200",
+    ]
+
+
+def test_query_tokens_split_only_compounds_the_index_lacks():
+    index = LexicalIndex.build(["pump px-2200 valve"])
+    assert query_tokens("px-2200 12.3", index) == ["px-2200", "12.3", "12", "3"]
+    assert query_tokens("px-2200", None) == ["px-2200", "px", "2200"]
+
+
+def test_bm25_prefers_rare_terms_and_restricts_to_allowed_rows():
+    index = LexicalIndex.build(
+        ["pump pump valve", "valve valve valve", "pump motor", "schedule"]
+    )
+    tokens = ["pump", "motor"]
+    idf, avg_length = corpus_idf([index], tokens)
+    rows, scores = index.scores(tokens, idf, avg_length)
+    assert rows.tolist() == [0, 2]
+    assert scores[1] > scores[0]  # "motor" is rarer than "pump"
+
+    rows, _ = index.scores(tokens, idf, avg_length, allowed=np.array([0, 1]))
+    assert rows.tolist() == [0]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]], k=60)
+    assert [key for key, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_ties_at_the_cut_keep_the_first_rows(store):
+    add(store, "doc", ["pump valve"] * 5 + ["valve valve"])
+    hits, _ = store.lexical_search("valve", 2, ["doc"])
+    assert [doc.metadata["page"] for _, doc, _ in hits] == [6, 1]
+
+
+def test_compound_is_split_in_segments_that_lack_it(store):
+    add(store, "codes", ["order px-2200 today"])
+    add(store, "spaced", ["order px 2200 today", "unrelated schedule"])
+    hits, stats = store.lexical_search("px-2200", 5, ["codes", "spaced"])
+    assert stats["segments_searched"] == 2
+    assert {document_id for document_id, _, _ in hits} == {"codes", "spaced"}
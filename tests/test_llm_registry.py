@@ -0,0 +1,35 @@
+import asyncio
+
+import httpx
+from services.llm_registry import LLMRegistry
+from synthetic_pdf import make_pdf
+
+
+def test_warm_up_creates_clients_and_tolerates_unreachable_provider(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+    registry = LLMRegistry()
+
+    asyncio.run(registry.warm_up([("openai", "gpt-4.1-mini"), ("nope", None)]))
+    assert registry.stats()["clients"] == 1
+
+
+def test_first_question_reuses_the_warmed_up_connection(api_server, fake_openai):
+    url = api_server(LLM_WARMUP="true", RETRIEVAL_MODE="dense")
+    response = httpx.post(
+        f"{url}/documents",
+        params={"wait": "true"},
+        files={"files": ("warm.pdf", make_pdf(1, 10), "application/pdf")},
+        timeout=60,
+    )
+    assert response.json()["processed"] == 1
+    warmed = fake_openai.clients_by_path.get("/v1/models")
+    assert warmed
+
+    response = httpx.post(
+        f"{url}/question",
+        json={"question": "what about the pump?", "document_ids": ["warm"]},
+        timeout=30,
+    )
+    response.raise_for_status()
+    assert fake_openai.clients_by_path["/v1/chat/completions"] <= warmed
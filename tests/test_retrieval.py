@@ -0,0 +1,37 @@
+import httpx
+from synthetic_pdf import make_pdf
+
+
+def upload(url: str, name: str, content: bytes) -> None:
+    response = httpx.post(
+        f"{url}/documents",
+        params={"wait": "true"},
+        files={"files": (name, content, "application/pdf")},
+        timeout=60,
+    )
+    assert response.json()["processed"] == 1
+
+
+def retrieval(url: str, question: str, **fields) -> dict:
+    response = httpx.post(
+        f"{url}/question",
+        json={"question": question, "document_ids": ["manual"], **fields},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return response.json()["metadata"]["retrieval"]
+
+
+def test_short_questions_with_numbers_stay_dense_by_default(api_server, monkeypatch):
+    monkeypatch.delenv("RETRIEVAL_MODE", raising=False)
+    url = api_server()
+    upload(url, "manual.pdf", make_pdf(2, 20))
+
+    stats = retrieval(url, "revenue in 2023?")
+    assert stats["retrieval_mode"] == "dense"
+    assert stats["embedding_calls"] == 1
+
+    # auto stays available per request: identifier-like questions go to BM25
+    stats = retrieval(url, "p1l3", retrieval_mode="auto")
+    assert stats["retrieval_mode"] == "lexical"
+    assert stats["embedding_calls"] == 0
@@ -0,0 +1,168 @@
+import tracemalloc
+import zlib
+from typing import List
+
+import numpy as np
+import pytest
+from services.ann_index import IndexSettings
+from services.index_cache import IndexCache
+from services.vector_store import SegmentedVectorStore
+
+DIMENSIONS = 8
+
+
+@pytest.fixture
+def store(tmp_path) -> SegmentedVectorStore:
+    return SegmentedVectorStore(
+        str(tmp_path / "vector_store"),
+        IndexCache(max_entries=0),
+        background_merge=False,
+        preload=False,
+        index_settings=IndexSettings(index_type="flat"),
+    )
+
+
+def vectors(texts: List[str]) -> np.ndarray:
+    rng = np.random.default_rng(zlib.crc32("\n".join(texts).encode()))
+    matrix = rng.standard_normal((len(texts), DIMENSIONS)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def fingerprint(content: str, pages: int) -> dict:
+    return {
+        "content_hash": content,
+        "page_hashes": [f"{content}-{page}" for page in range(pages)],
+    }
+
+
+def writer_for(store: SegmentedVectorStore, document_id: str, texts: List[str]):
+    """A segment with one chunk per page."""
+    writer = store.begin_segment(document_id)
+    writer.add(
+        texts,
+        vectors(texts),
+        [{"document_id": document_id, "page": page + 1} for page in range(len(texts))],
+    )
+    return writer
+
+
+def test_concurrent_upload_with_new_content_replaces_the_document(store):
+    # Both uploads started before either was committed
+    first = writer_for(store, "doc", ["old one", "old two", "old three"])
+    second = writer_for(store, "doc", ["new one", "new two"])
+    store.commit_document("doc", first, fingerprint("a", 3))
+    store.commit_document("doc", second, fingerprint("b", 2))
+
+    texts, _, metadatas = store.export_document("doc")
+    assert texts == ["new one", "new two"]
+    assert [m["page"] for m in metadatas] == [1, 2]
+    info = store.document_info("doc")
+    assert info["content_hash"] == "b"
+    assert info["version"] == 2
+    assert info["chunks"] == 2
+
+
+def test_concurrent_upload_with_same_content_keeps_one_copy(store):
+    first = writer_for(store, "doc", ["one", "two"])
+    second = writer_for(store, "doc", ["one", "two"])
+    segment_id = store.commit_document("doc", first, fingerprint("a", 2))
+
+    assert store.commit_document("doc", second, fingerprint("a", 2)) == segment_id
+    assert store.export_document("doc")[0] == ["one", "two"]
+    assert store.segment_ids() == [segment_id]
+
+
+def test_concurrent_upload_without_fingerprint_fails(store):
+    first = writer_for(store, "doc", ["one"])
+    second = writer_for(store, "doc", ["other"])
+    store.commit_document("doc", first)
+
+    with pytest.raises(RuntimeError):
+        store.commit_document("doc", second)
+    assert store.export_document("doc")[0] == ["one"]
+
+
+def test_replaced_pages_are_tombstoned_and_dropped_by_merges(tmp_path):
+    store = SegmentedVectorStore(
+        str(tmp_path / "vector_store"),
+        IndexCache(max_entries=0),
+        merge_factor=2,
+        background_merge=False,
+        preload=False,
+        index_settings=IndexSettings(index_type="flat"),
+    )
+    store.commit_document(
+        "doc", writer_for(store, "doc", ["one", "two", "three"]), fingerprint("a", 3)
+    )
+    store.replace_pages(
+        "doc",
+        [2],
+        ["two revised"],
+        vectors(["two revised"]),
+        [{"page": 2}],
+        {"content_hash": "b", "page_hashes": ["a-0", "b-1", "a-2"]},
+        base_version=1,
+    )
+    info = store.document_info("doc")
+    assert info["version"] == 2
+    assert len(info["segments"]) == 2
+    assert store.export_document("doc")[0] == ["one", "two revised", "three"]
+
+    assert store.merge_once()
+    info = store.document_info("doc")
+    assert len(info["segments"]) == 1 and not info["tombstones"]
+    assert store.load_segment(info["segments"][0]).ntotal == 3
+    assert store.export_document("doc")[0] == ["one", "two revised", "three"]
+
+
+def test_document_export_streams_in_page_order_across_segments(store):
+    store.commit_document(
+        "doc", writer_for(store, "doc", ["p1", "p2", "p3", "p4"]), fingerprint("a", 4)
+    )
+    store.replace_pages(
+        "doc",
+        [1],
+        ["p1 revised"],
+        vectors(["p1 revised"]),
+        [{"page": 1}],
+        {"content_hash": "b", "page_hashes": ["b-0", "a-1", "a-2", "a-3"]},
+        base_version=1,
+    )
+    blocks = list(store.export_document_blocks("doc", block_rows=3))
+    assert [len(texts) for texts, _, _ in blocks] == [3, 1]
+    assert [t for texts, _, _ in blocks for t in texts] == [
+        "p1 revised",
+        "p2",
+        "p3",
+        "p4",
+    ]
+
+    store.copy_document("doc", "copy", fingerprint("b", 4))
+    texts, matrix, metadatas = store.export_document("copy")
+    assert texts == ["p1 revised", "p2", "p3", "p4"]
+    assert [m["page"] for m in metadatas] == [1, 2, 3, 4]
+    np.testing.assert_allclose(matrix, store.export_document("doc")[1])
+
+
+def test_copy_does_not_load_the_whole_document(store):
+    rows, dimensions = 60_000, 128
+    writer = store.begin_segment("big")
+    rng = np.random.default_rng(0)
+    for start in range(0, rows, 10_000):
+        writer.add(
+            [f"chunk {idx % 100}" for idx in range(start, start + 10_000)],
+            rng.standard_normal((10_000, dimensions), dtype=np.float32),
+            [
+                {"document_id": "big", "page": idx // 100 + 1}
+                for idx in range(start, start + 10_000)
+            ],
+        )
+    store.commit_document("big", writer, fingerprint("a", rows // 100))
+
+    tracemalloc.start()
+    store.copy_document("big", "copy", fingerprint("a", rows // 100))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert store.document_info("copy")["chunks"] == rows
+    # Loading the document at once holds several copies of its 30 MB of vectors
+    assert peak < rows * dimensions * 4